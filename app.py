@@ -1,52 +1,112 @@
 from aiogram import executor
 import asyncio
 import logging
+from data import config
+from utils.misc.logging import parse_levels, setup_logging
+
+# Logging handler'lar import qilinishidan oldin sozlanadi (ular import paytida ham log yozadi)
+setup_logging(
+    level=config.LOG_LEVEL,
+    module_levels=parse_levels(config.LOG_LEVELS),
+    json_format=config.LOG_JSON,
+    debug_limit=config.LOG_DEBUG_LIMIT,
+    debug_interval=config.LOG_DEBUG_INTERVAL,
+)
+
 import middlewares, filters, handlers, keyboards
 from utils.notify_admins import on_startup_notify
 from utils.set_bot_commands import set_default_commands
-from loader import dp, init_redis, close_redis
-
-# Debug darajadagi logging ni yoqish
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
-)
-
-# Aiogram debug loglarini yoqish
-# logging.getLogger('aiogram').setLevel(logging.DEBUG)
-# logging.getLogger('aiogram.event').setLevel(logging.DEBUG)
-#
-# # Boshqa kerakli loggerlarni yoqish
-# logging.getLogger('keyboards').setLevel(logging.DEBUG)
-# logging.getLogger('handlers').setLevel(logging.DEBUG)
-# logging.getLogger('data').setLevel(logging.DEBUG)
+from loader import dp, db, question_bank, category_tree, timer_wheel, outbound, broadcaster, local_cache, \
+    cache_invalidator, callback_router, throttler, leaderboard, write_behind, metrics_server, init_redis, close_redis
+from utils import webhook
 
 
 async def on_startup(dispatcher):
     # Bot haqida ma'lumot
     logging.info("Bot ishga tushirilmoqda...")
     bot_info = await dispatcher.bot.get_me()
-    logging.info(f"Bot ma'lumotlari: @{bot_info.username} ({bot_info.id})")
+    logging.info("Bot ma'lumotlari: @%s (%s)", bot_info.username, bot_info.id)
 
     # Redis initializatsiyasi
     logging.info("Redis initializatsiyasi boshlandi...")
     await init_redis()
     logging.info("Redis initializatsiyasi yakunlandi!")
 
-    # Birlamchi komandalar (/start va /help)
-    logging.info("Bot komandalarini o'rnatish...")
-    await set_default_commands(dispatcher)
-    logging.info("Bot komandalari o'rnatildi!")
+    # /metrics endpoint (har bir worker o'z portida)
+    if config.METRICS_PORT:
+        metrics_server.port = config.METRICS_PORT + webhook.WORKER_ID
+        await metrics_server.start()
+
+    # Chiquvchi xabarlar navbati
+    outbound.start()
+
+    # Natijalar va history guruhlab yoziladi (oldingi to'xtashdan qolgan yozuvlar ham)
+    write_behind.start()
+
+    # Quiz timeout'larini tiklash va rejalashtiruvchini ishga tushirish
+    await timer_wheel.restore()
+    timer_wheel.start()
+
+    # L1 keshdagi eskirgan yozuvlarni bitta fon task tozalaydi
+    asyncio.create_task(local_cache.run_sweeper(config.CACHE_SWEEP_INTERVAL))
+
+    # Admin paneldagi o'zgarishlar haqidagi xabarlarni tinglash (kerakli kalitlar darhol tozalanadi)
+    cache_invalidator.start()
+
+    # Savollar bankini xotiraga yuklash
+    logging.info("Savollar banki yuklanmoqda...")
+    await db.run_async(question_bank.load)
+    asyncio.create_task(question_bank.run_refresher(config.QUESTION_BANK_REFRESH_INTERVAL))
+    logging.info("Savollar banki yuklandi!")
 
-    # Bot ishga tushgani haqida adminga xabar berish
-    logging.info("Admin xabardor qilinmoqda...")
-    await on_startup_notify(dispatcher)
-    logging.info("Admin xabardor qilindi!")
+    # Kategoriya va bellashuv daraxtlari (menyular uchun)
+    await db.run_async(category_tree.load)
+    asyncio.create_task(category_tree.run_refresher(config.CATEGORY_TREE_REFRESH_INTERVAL))
+
+    # Quyidagilar bir nechta webhook worker bo'lsa ham faqat bir marta bajariladi
+    if webhook.is_primary_worker():
+        if config.USE_WEBHOOK:
+            await webhook.set_bot_webhook(dispatcher)
+
+        # Tugallanmagan broadcast bo'lsa, davom ettirish
+        if await broadcaster.resume():
+            logging.info("Tugallanmagan broadcast davom ettirildi")
+
+        # Birlamchi komandalar (/start va /help)
+        logging.info("Bot komandalarini o'rnatish...")
+        await set_default_commands(dispatcher)
+        logging.info("Bot komandalari o'rnatildi!")
+
+        # Bot ishga tushgani haqida adminga xabar berish
+        logging.info("Admin xabardor qilinmoqda...")
+        await on_startup_notify(dispatcher)
+        logging.info("Admin xabardor qilindi!")
 
     logging.info("Bot muvaffaqiyatli ishga tushdi!")
 
 
 async def on_shutdown(dispatcher):
+    # Kutilayotgan timeout'lar Redis ga yoziladi
+    await timer_wheel.stop()
+
+    # Broadcast to'xtatiladi, checkpoint keyingi ishga tushishda davom ettiriladi
+    await broadcaster.stop()
+
+    await cache_invalidator.stop()
+    await leaderboard.stop()
+
+    # Navbatdagi natijalarni bazaga yozib bo'lish (bo'lmasa spool faylga)
+    await write_behind.stop()
+    logging.info("Write-behind statistikasi: %s", write_behind.stats())
+
+    # Navbatda qolgan xabarlarni yuborib bo'lish
+    await outbound.stop()
+    logging.info("Outbound statistikasi: %s", outbound.stats())
+    logging.info("Callback router statistikasi: %s", callback_router.stats())
+    logging.info("Throttling statistikasi: %s", throttler.stats())
+
+    await metrics_server.stop()
+
     # Redis ulanishini yopish
     logging.info("Redis ulanishini yopish...")
     await close_redis()
@@ -58,6 +118,10 @@ async def on_shutdown(dispatcher):
     await dispatcher.storage.wait_closed()
     logging.info("FSM storage tozalandi!")
 
+    # Ma'lumotlar bazasi thread pool'ini yopish
+    db.close()
+    logging.info("Ma'lumotlar bazasi ulanishlari yopildi!")
+
     logging.info("Bot to'xtatildi!")
 
 
@@ -75,12 +139,16 @@ if __name__ == '__main__':
     except ImportError:
         logging.info("Uvloop topilmadi, standart asyncio event loop ishlatilmoqda")
 
-    # Start polling
-    executor.start_polling(
-        dp,
-        on_startup=on_startup,
-        on_shutdown=on_shutdown,
-        skip_updates=False,
-        timeout=20,
-        relax=0.1,
-    )
\ No newline at end of file
+    if config.USE_WEBHOOK:
+        # Webhook (aiohttp server, kerak bo'lsa bir nechta worker jarayon)
+        webhook.start_webhook(dp, on_startup=on_startup, on_shutdown=on_shutdown)
+    else:
+        # Start polling
+        executor.start_polling(
+            dp,
+            on_startup=on_startup,
+            on_shutdown=on_shutdown,
+            skip_updates=False,
+            timeout=20,
+            relax=0.1,
+        )
\ No newline at end of file
@@ -1,15 +1,18 @@
 
-from .models import User, Category, Battle, Test, History, Results, SetAdmin, SetBio
+from .models import User, Category, Battle, Test, History, Results, SetAdmin, SetBio, ImportJob
 from .models import Test
 from django.contrib import admin
+from django.http import HttpResponseRedirect
+from django.urls import reverse
+from .importer import progress_of, start_job
 from .models import SetAdmin, User
 from .forms import SetAdminForm
 
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('first_name', 'last_name',  'lang_id', 'chat_id')
+    list_display = ('first_name', 'last_name',  'lang_id', 'chat_id', 'is_blocked')
     list_display_links = ('first_name', 'last_name')  # Assuming you want both to be clickable
     search_fields = ['first_name', 'last_name', ]  # Enable search functionality
-    list_filter = ['lang_id']  # Enable filtering by language ID
+    list_filter = ['lang_id', 'is_blocked']  # Enable filtering by language ID
 
 admin.site.register(User, UserAdmin)
 
@@ -35,8 +38,45 @@ class TestAdmin(admin.ModelAdmin):
 
     # Specify any other admin options needed
 
+    def response_add(self, request, obj, post_url_continue=None):
+        # An uploaded workbook becomes an ImportJob: show its results page instead of the (unsaved) test
+        job = getattr(obj, 'import_job', None)
+        if job is not None:
+            self.message_user(request, f"{job} started, the questions are imported in the background")
+            return HttpResponseRedirect(reverse('admin:bot_app_importjob_change', args=[job.pk]))
+        return super().response_add(request, obj, post_url_continue)
+
 admin.site.register(Test, TestAdmin)
 
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'file', 'battle', 'category', 'status', 'progress', 'inserted_rows', 'updated_rows',
+                    'skipped_rows', 'created_at')
+    list_filter = ('status',)
+    readonly_fields = ('status', 'progress', 'total_rows', 'inserted_rows', 'updated_rows', 'skipped_rows', 'errors',
+                       'created_at', 'started_at', 'finished_at')
+
+    def get_readonly_fields(self, request, obj=None):
+        # A job is not edited after the upload, only its results are shown
+        if obj is not None:
+            return ('file', 'battle', 'category') + self.readonly_fields
+        return self.readonly_fields
+
+    def progress(self, obj):
+        if obj.status == ImportJob.RUNNING:
+            processed = progress_of(obj.pk)
+            return f"{processed} rows read" if processed is not None else "running"
+        if obj.status == ImportJob.DONE:
+            return f"{obj.inserted_rows} new, {obj.updated_rows} updated / {obj.total_rows}"
+        return '-'
+    progress.short_description = 'Progress'
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change:
+            start_job(obj)
+
 @admin.register(History)
 class HistoryAdmin(admin.ModelAdmin):
     list_display = ('user_id', 'quiz_id', 'unique_id', 'quiz_number', 'quiz_time', 'created_at')
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BotAppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "bot_app"
+
+    def ready(self):
+        # Admin paneldagi o'zgarishlar haqida botga xabar beruvchi signallar
+        from . import signals  # noqa: F401
@@ -0,0 +1,233 @@
+"""
+Streaming import of questions from an Excel workbook into bot_app_test.
+
+Rows are read one at a time with openpyxl in read-only mode, validated and
+written with `bulk_create` in batches, all inside a single transaction: an
+upload is imported completely or not at all. A row whose question_hash()
+already exists updates that question's other answers instead of adding a
+duplicate. Uploads from the admin run as an ImportJob in a background thread,
+so the admin request returns immediately.
+
+Since `bulk_create` sends no post_save signals, one invalidation event for the
+affected battle/category is published after the commit (see signals.py).
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from .models import ImportJob, Test, question_hash
+from .signals import publish
+
+logger = logging.getLogger('bot_app.importer')
+
+# Header in the workbook -> Test field
+COLUMNS = {
+    'Savol': 'question',
+    'Variant A': 'answer_a',
+    'Variant B': 'answer_b',
+    'Variant C': 'answer_c',
+    'Variant D': 'answer_d',
+}
+REQUIRED_COLUMNS = ('Savol', 'Variant A')
+ANSWER_MAX_LENGTH = Test._meta.get_field('answer_a').max_length
+# Only the first errors are kept on the job; the rest are counted
+MAX_REPORTED_ERRORS = 100
+
+# job id -> rows processed so far, for jobs running in this process
+_progress = {}
+
+
+class ImportFileError(ValueError):
+    """The workbook cannot be imported at all (unreadable file, missing columns)"""
+
+
+def _cell(value):
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = str(value).strip()
+    return value or None
+
+
+def read_rows(file):
+    """
+    Yield (row number, {field: value}) for every data row of the first sheet.
+
+    :raises ImportFileError: if the file is not a workbook or a required column is missing.
+    """
+    try:
+        workbook = load_workbook(file, read_only=True, data_only=True)
+    except Exception as e:
+        raise ImportFileError(f"Cannot read the workbook: {e}")
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [_cell(value) for value in next(rows, ())]
+        missing = [name for name in REQUIRED_COLUMNS if name not in header]
+        if missing:
+            raise ImportFileError(f"Missing columns: {', '.join(missing)}")
+        positions = {COLUMNS[name]: index for index, name in enumerate(header) if name in COLUMNS}
+
+        for number, row in enumerate(rows, start=2):
+            yield number, {field: _cell(row[index]) if index < len(row) else None
+                           for field, index in positions.items()}
+    finally:
+        workbook.close()
+
+
+def validate_row(values, max_length=ANSWER_MAX_LENGTH):
+    """Error message for an invalid row, or None"""
+    if not values.get('question'):
+        return "empty question"
+    if not values.get('answer_a'):
+        return "empty Variant A (correct answer)"
+    if max_length:
+        for field in ('answer_a', 'answer_b', 'answer_c', 'answer_d'):
+            if values.get(field) and len(values[field]) > max_length:
+                return f"{field} is longer than {max_length} characters"
+    return None
+
+
+class ImportResult:
+    def __init__(self):
+        self.total = 0
+        self.inserted = 0
+        # Rows matching an existing question: its other answers were overwritten
+        self.updated = 0
+        self.skipped = 0
+        self.errors = []
+
+    @property
+    def repeated(self):
+        """Rows repeating an earlier row of the same file"""
+        return self.total - self.inserted - self.updated - self.skipped
+
+    def skip(self, number, message):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"Row {number}: {message}")
+
+
+def import_workbook(file, battle_id=None, category_id=None, batch_size=None, progress=None) -> ImportResult:
+    """
+    Import every valid row of `file` as a Test of the given battle/category.
+
+    :param progress: optional callable receiving the number of rows processed after each batch.
+    :raises ImportFileError: nothing is imported if the file itself is invalid.
+    """
+    batch_size = batch_size or settings.TEST_IMPORT['BATCH_SIZE']
+    result = ImportResult()
+    batch = []
+
+    with transaction.atomic():
+        for number, values in read_rows(file):
+            if not any(values.values()):
+                # Trailing empty rows of the sheet
+                continue
+            result.total += 1
+            error = validate_row(values)
+            if error:
+                result.skip(number, error)
+                continue
+            content_hash = question_hash(values['question'], values['answer_a'], battle_id, category_id)
+            batch.append(Test(battle_id=battle_id, category_id=category_id, content_hash=content_hash, **values))
+            if len(batch) >= batch_size:
+                _bulk_upsert(batch, result)
+                batch = []
+                if progress:
+                    progress(result.total)
+
+        if batch:
+            _bulk_upsert(batch, result)
+        if progress:
+            progress(result.total)
+
+        if result.inserted or result.updated:
+            # bulk_create sends no post_save: tell the bot once which groups changed
+            publish_import(battle_id, category_id)
+
+    return result
+
+
+def _bulk_upsert(tests, result):
+    # A row repeated within the batch becomes one question, the last copy's answers win
+    unique = {test.content_hash: test for test in tests}
+    existing = set(Test.objects.filter(content_hash__in=unique).values_list('content_hash', flat=True))
+    Test.objects.bulk_create(
+        list(unique.values()),
+        update_conflicts=True,
+        unique_fields=['content_hash'],
+        update_fields=['answer_b', 'answer_c', 'answer_d'],
+    )
+    result.inserted += len(unique) - len(existing)
+    result.updated += len(existing)
+
+
+def publish_import(battle_id, category_id):
+    event = {
+        'model': 'test',
+        'action': 'import',
+        'battle_ids': [battle_id] if battle_id else [],
+        'category_ids': [category_id] if category_id else [],
+    }
+    transaction.on_commit(lambda: publish(event))
+
+
+def run_job(job_id):
+    """Run an ImportJob to completion and store its results"""
+    job = ImportJob.objects.get(pk=job_id)
+    ImportJob.objects.filter(pk=job_id).update(status=ImportJob.RUNNING, started_at=timezone.now())
+    _progress[job_id] = 0
+
+    def report(processed):
+        _progress[job_id] = processed
+
+    try:
+        with job.file.open('rb') as file:
+            result = import_workbook(file, job.battle_id, job.category_id, progress=report)
+    except Exception as e:
+        if not isinstance(e, ImportFileError):
+            logger.exception("Import job %s failed", job_id)
+        ImportJob.objects.filter(pk=job_id).update(
+            status=ImportJob.FAILED, errors=str(e), finished_at=timezone.now(),
+        )
+        return
+    finally:
+        _progress.pop(job_id, None)
+
+    ImportJob.objects.filter(pk=job_id).update(
+        status=ImportJob.DONE,
+        total_rows=result.total,
+        inserted_rows=result.inserted,
+        updated_rows=result.updated,
+        skipped_rows=result.skipped,
+        errors='\n'.join(result.errors),
+        finished_at=timezone.now(),
+    )
+    logger.info("Import job %s: %s inserted, %s updated, %s skipped",
+                job_id, result.inserted, result.updated, result.skipped)
+
+
+def _run_in_thread(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        # The thread got its own database connection
+        connection.close()
+
+
+def start_job(job):
+    """Run the job in a background thread once the transaction that created it commits"""
+    def start():
+        threading.Thread(target=_run_in_thread, args=(job.pk,), name=f"import-job-{job.pk}", daemon=True).start()
+
+    transaction.on_commit(start)
+
+
+def progress_of(job_id):
+    """Rows processed so far by a job running in this process, or None"""
+    return _progress.get(job_id)
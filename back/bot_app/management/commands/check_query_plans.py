@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from bot_app.query_plans import HOT_QUERIES, check_query_plans, explain, raw_cursor
+
+
+class Command(BaseCommand):
+    help = "Fail if a hot bot query falls back to a full table scan"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help="Print the plan of every query")
+
+    def handle(self, *args, **options):
+        if options['verbose_plans']:
+            cursor = raw_cursor(connection)
+            for name, sql in HOT_QUERIES.items():
+                self.stdout.write(f"{name}: {'; '.join(explain(cursor, sql))}")
+            cursor.close()
+
+        failures = check_query_plans(connection)
+        for name, plan in failures.items():
+            self.stderr.write(f"{name}: {'; '.join(plan)}")
+        if failures:
+            raise CommandError(f"{len(failures)} hot queries are not served by an index")
+        self.stdout.write(self.style.SUCCESS(f"All {len(HOT_QUERIES)} hot queries use an index"))
@@ -0,0 +1,37 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bot_app.question_io import FORMATS, detect_format, export_questions
+
+
+class Command(BaseCommand):
+    help = "Write questions to a CSV, XLSX or JSONL file with battle/category paths"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Output file, or '-' for stdout (csv/jsonl)")
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension")
+        parser.add_argument('--battle', help="Only questions under this battle path")
+        parser.add_argument('--category', help="Only questions under this category path")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        started = time.monotonic()
+        try:
+            fmt = detect_format(path if path != '-' else '', options['format'])
+            if path == '-':
+                if fmt == 'xlsx':
+                    raise CommandError("XLSX cannot be written to stdout")
+                count = export_questions(sys.stdout, fmt, options['battle'], options['category'])
+            elif fmt == 'xlsx':
+                count = export_questions(path, fmt, options['battle'], options['category'])
+            else:
+                with open(path, 'w', newline='', encoding='utf-8') as f:
+                    count = export_questions(f, fmt, options['battle'], options['category'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        if path != '-':
+            self.stdout.write(self.style.SUCCESS(f"{count} questions written to {path} in "
+                                                 f"{time.monotonic() - started:.1f}s"))
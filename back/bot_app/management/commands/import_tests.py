@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bot_app.question_io import FORMATS, import_questions
+
+
+class Command(BaseCommand):
+    help = "Upsert questions from a CSV, XLSX or JSONL file (battle/category given as paths like 'Lesson/Unit 3')"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension")
+        parser.add_argument('--battle', help="Battle path for rows that have no battle/category column")
+        parser.add_argument('--category', help="Category path for rows that have no battle/category column")
+        parser.add_argument('--create-paths', action='store_true', help="Create missing battles and categories")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true', help="Validate and count, write nothing")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def progress(stats):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{stats.read} rows read")
+
+        try:
+            stats = import_questions(
+                options['path'],
+                fmt=options['format'],
+                batch_size=options['batch_size'],
+                create_paths=options['create_paths'],
+                battle=options['battle'],
+                category=options['category'],
+                dry_run=options['dry_run'],
+                progress=progress,
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for error in stats.errors:
+            self.stderr.write(error)
+        summary = ', '.join(f"{value} {name}" for name, value in stats.as_dict().items())
+        prefix = "Dry run: " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(f"{prefix}{summary} in {time.monotonic() - started:.1f}s"))
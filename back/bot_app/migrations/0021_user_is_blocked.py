@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot_app', '0020_alter_history_options_alter_results_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='is_blocked',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:34
+
+from datetime import datetime
+
+from django.db import migrations, models
+from django.utils import timezone
+
+# Format the bot used for History.created_at (keyboards/inline/room.py)
+CREATED_AT_FORMAT = '%m-%d-%Y %H:%M'
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_datetime(value):
+    try:
+        return timezone.make_aware(datetime.strptime(value, CREATED_AT_FORMAT))
+    except (TypeError, ValueError):
+        return None
+
+
+def backfill_typed_columns(apps, schema_editor):
+    History = apps.get_model('bot_app', 'History')
+    last_pk = 0
+    while True:
+        # Keyset pages: rows are updated while we walk the table
+        batch = list(History.objects.filter(pk__gt=last_pk).order_by('pk')[:1000])
+        if not batch:
+            break
+        for history in batch:
+            history.started_at = _to_datetime(history.created_at)
+            history.question_count = _to_int(history.quiz_number)
+            history.seconds_per_question = _to_int(history.quiz_time)
+        History.objects.bulk_update(batch, ['started_at', 'question_count', 'seconds_per_question'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot_app', '0021_user_is_blocked'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='history',
+            name='question_count',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='history',
+            name='seconds_per_question',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='history',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='results',
+            index=models.Index(fields=['unique_id', '-true_answers', 'false_answers', 'user_name', 'user'], name='results_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='test',
+            index=models.Index(fields=['battle', 'category'], name='test_battle_category_idx'),
+        ),
+        migrations.RunPython(backfill_typed_columns, migrations.RunPython.noop),
+    ]
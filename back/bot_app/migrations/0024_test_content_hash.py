@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:41
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def _question_hash(question, answer_a, battle_id, category_id):
+    # Frozen copy of bot_app.models.question_hash
+    parts = [str(battle_id or ''), str(category_id or '')]
+    parts += [' '.join(str(value).split()) if value is not None else '' for value in (question, answer_a)]
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def backfill_content_hash(apps, schema_editor):
+    Test = apps.get_model('bot_app', 'Test')
+    seen = set()
+    last_pk = 0
+    while True:
+        batch = list(Test.objects.filter(pk__gt=last_pk).order_by('pk')[:1000])
+        if not batch:
+            break
+        for test in batch:
+            content_hash = _question_hash(test.question, test.answer_a, test.battle_id, test.category_id) \
+                if test.question else None
+            # Existing duplicates keep a NULL hash: only the first copy is matched by later imports
+            if content_hash in seen:
+                content_hash = None
+            elif content_hash:
+                seen.add(content_hash)
+            test.content_hash = content_hash
+        Test.objects.bulk_update(batch, ['content_hash'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot_app', '0023_import_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='test',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=40, null=True),
+        ),
+        migrations.RunPython(backfill_content_hash, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='test',
+            constraint=models.UniqueConstraint(fields=('content_hash',), name='test_content_hash_uniq'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot_app', '0024_test_content_hash'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='importjob',
+            old_name='imported_rows',
+            new_name='inserted_rows',
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='updated_rows',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,4 +1,6 @@
-import pandas as pd
+import hashlib
+
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.db.models.signals import post_save
 from django.dispatch import receiver
@@ -14,6 +16,7 @@ class User(models.Model):
     last_name = models.CharField(max_length=100, blank=True, null=True)
     lang_id = models.IntegerField(blank=True, null=True)  # Consider using choices for predefined languages
     chat_id = models.BigIntegerField(unique=True, blank=True, null=True)  # Consider using BigIntegerField if chat_id can be large
+    is_blocked = models.BooleanField(default=False)  # Set by the bot when a broadcast finds the user has blocked it
 
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.chat_id})" if self.first_name and self.last_name else str(self.chat_id)
@@ -49,6 +52,14 @@ class Battle(models.Model):
 
 
 
+def question_hash(question, answer_a, battle_id=None, category_id=None):
+    """Identity of a question inside its battle/category, used to upsert imports"""
+    parts = [str(battle_id or ''), str(category_id or '')]
+    # Whitespace differences between exports of the same sheet do not make a new question
+    parts += [' '.join(str(value).split()) if value is not None else '' for value in (question, answer_a)]
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
 class Test(models.Model):
     battle = models.ForeignKey(Battle, on_delete=models.CASCADE,blank=True,null=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE,blank=True,null=True)
@@ -58,27 +69,86 @@ class Test(models.Model):
     answer_c = models.CharField(max_length=255, blank=True, null=True)  # Optional answer C
     answer_d = models.CharField(max_length=255, blank=True, null=True)  # Optional answer D
     excel_file = models.FileField(upload_to='uploads/tests/', null=True, blank=True)  # For uploading associated Excel files
+    # question_hash() of the row; imports update the row with the same hash instead of adding a duplicate
+    content_hash = models.CharField(max_length=40, blank=True, null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Question bank reloads one (battle, category) group at a time
+            models.Index(fields=['battle', 'category'], name='test_battle_category_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['content_hash'], name='test_content_hash_uniq'),
+        ]
 
     def __str__(self):
         return self.question or "Unnamed Test"
 
+    def update_content_hash(self):
+        content_hash = question_hash(self.question, self.answer_a, self.battle_id, self.category_id) \
+            if self.question else None
+        if content_hash and self._is_old_duplicate(content_hash):
+            # Duplicates from before content_hash keep NULL (migration 0024), so they can still be edited
+            content_hash = None
+        self.content_hash = content_hash
+
+    def _is_old_duplicate(self, content_hash):
+        """Stored with a NULL hash, same question and answer as before, and another row already has the hash"""
+        if self.pk is None:
+            return False
+        stored = Test.objects.filter(pk=self.pk, content_hash__isnull=True) \
+            .values_list('question', 'answer_a', 'battle_id', 'category_id').first()
+        return stored is not None and question_hash(*stored) == content_hash \
+            and Test.objects.filter(content_hash=content_hash).exclude(pk=self.pk).exists()
+
+    def clean(self):
+        self.update_content_hash()
+        if self.content_hash and Test.objects.filter(content_hash=self.content_hash).exclude(pk=self.pk).exists():
+            raise ValidationError("This question with the same answer already exists in this battle/category")
+
     def save(self, *args, **kwargs):
         if self.question:
+            self.update_content_hash()
             super().save(*args, **kwargs)
 
         if self.excel_file:
-            df = pd.read_excel(self.excel_file)
-            for index, row in df.iterrows():
-                Test.objects.create(
-                    battle=self.battle,
-                    category=self.category,  # Add category ID here
-                    question=row['Savol'],
-                    answer_a=row['Variant A'],
-                )
-
-
+            # The rows are imported by a background ImportJob (bot_app/importer.py), not in the admin request
+            from .importer import start_job
+            self.import_job = ImportJob.objects.create(file=self.excel_file, battle=self.battle, category=self.category)
+            start_job(self.import_job)
+
+
+class ImportJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    file = models.FileField(upload_to='uploads/imports/')  # Workbook with Savol / Variant A..D columns
+    battle = models.ForeignKey(Battle, on_delete=models.SET_NULL, blank=True, null=True)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    total_rows = models.PositiveIntegerField(default=0)  # Non-empty data rows in the workbook
+    inserted_rows = models.PositiveIntegerField(default=0)  # New questions
+    updated_rows = models.PositiveIntegerField(default=0)  # Rows matching an existing question
+    skipped_rows = models.PositiveIntegerField(default=0)  # Rows that failed validation
+    errors = models.TextField(blank=True)  # Row errors, or why the whole file was rejected
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
 
+    def __str__(self):
+        return f"Import #{self.pk} ({self.get_status_display()})"
 
+    class Meta:
+        verbose_name_plural = 'Import jobs'
+        ordering = ['-created_at']
 
 
 class History(models.Model):
@@ -88,6 +158,11 @@ class History(models.Model):
     unique_id = models.CharField(max_length=150,  editable=False, unique=True)  # Text field for unique identifier
     user_id = models.CharField(max_length=150)  # Text field for user ID
     created_at = models.CharField(max_length=150, blank=True, null=True)  # Text field for preformatted quiz time
+    # Typed copies of the text fields above, backfilled by migration 0022. The bot writes both;
+    # the CharFields stay until every reader has moved to these columns.
+    started_at = models.DateTimeField(blank=True, null=True)  # Typed created_at
+    question_count = models.IntegerField(blank=True, null=True)  # Typed quiz_number
+    seconds_per_question = models.IntegerField(blank=True, null=True)  # Typed quiz_time
 
 
 
@@ -113,6 +188,11 @@ class Results(models.Model):
 
     class Meta:
         verbose_name_plural = 'Results'
+        indexes = [
+            # Covers the rating query: rows of one room, best first, without touching the table
+            models.Index(fields=['unique_id', '-true_answers', 'false_answers', 'user_name', 'user'],
+                         name='results_rating_idx'),
+        ]
 
 
 class SetAdmin(models.Model):
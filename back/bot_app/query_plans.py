@@ -0,0 +1,73 @@
+"""
+Hot queries of the bot (data/db_commands.py, data/question_bank.py, data/write_behind.py)
+and a check that SQLite answers each of them from an index.
+
+Keep the SQL here in sync with the bot when a lookup changes or a new one is added.
+"""
+
+HOT_QUERIES = {
+    'user_by_chat_id': "SELECT * FROM bot_app_user WHERE chat_id = ?",
+    'user_language': "SELECT lang_id FROM bot_app_user WHERE chat_id = ?",
+    'user_id_by_chat_id': "SELECT id FROM bot_app_user WHERE chat_id = ?",
+    'broadcast_page': """
+        SELECT id, chat_id FROM bot_app_user
+        WHERE id > ? AND chat_id IS NOT NULL AND is_blocked = 0
+        ORDER BY id LIMIT ?
+    """,
+    'root_categories': "SELECT * FROM bot_app_category WHERE parent_id IS NULL",
+    'child_categories': "SELECT * FROM bot_app_category WHERE parent_id = ?",
+    'category_node': "SELECT id, name_uz, name_ru, parent_id FROM bot_app_category WHERE id = ?",
+    'root_battles': "SELECT * FROM bot_app_battle WHERE parent_id IS NULL",
+    'child_battles': "SELECT * FROM bot_app_battle WHERE parent_id = ?",
+    'battle_node': "SELECT id, name_uz, name_ru, parent_id FROM bot_app_battle WHERE id = ?",
+    'questions_by_battle': """
+        SELECT question, answer_a, answer_b, answer_c, answer_d FROM bot_app_test WHERE battle_id = ?
+    """,
+    'questions_by_category': """
+        SELECT question, answer_a, answer_b, answer_c, answer_d FROM bot_app_test WHERE category_id = ?
+    """,
+    'question_bank_group': """
+        SELECT id, battle_id, category_id, question, answer_a, answer_b, answer_c, answer_d
+        FROM bot_app_test WHERE battle_id IS ? AND category_id IS ? ORDER BY id
+    """,
+    'history_by_unique_id': """
+        SELECT quiz_id, quiz_number, quiz_time, user_id, created_at FROM bot_app_history WHERE unique_id = ?
+    """,
+    'results_by_unique_id': """
+        SELECT r.id, r.user_name, r.true_answers, r.false_answers, r.user_id, r.unique_id
+        FROM bot_app_results r
+        WHERE r.unique_id = ?
+        ORDER BY r.true_answers DESC
+    """,
+}
+
+# Plan steps that mean the whole table (or index) is read, or rows are sorted afterwards
+_BAD_STEPS = ('SCAN ', 'USE TEMP B-TREE')
+
+
+def explain(cursor, sql):
+    """EXPLAIN QUERY PLAN details; every placeholder is bound to NULL"""
+    cursor.execute(f"EXPLAIN QUERY PLAN {sql}", [None] * sql.count('?'))
+    return [row[-1] for row in cursor.fetchall()]
+
+
+def raw_cursor(connection):
+    """sqlite3 cursor of a Django connection: the bot's SQL uses `?` placeholders"""
+    connection.ensure_connection()
+    return connection.connection.cursor()
+
+
+def check_query_plans(connection, queries=None) -> dict:
+    """
+    :return: {query name: plan} for every hot query that is not served by an index.
+    """
+    failures = {}
+    cursor = raw_cursor(connection)
+    try:
+        for name, sql in (queries or HOT_QUERIES).items():
+            plan = explain(cursor, sql)
+            if any(step.startswith(_BAD_STEPS) for step in plan):
+                failures[name] = plan
+    finally:
+        cursor.close()
+    return failures
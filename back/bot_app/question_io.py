@@ -0,0 +1,354 @@
+"""
+Bulk import and export of the question bank (bot_app_test) as CSV, XLSX or JSONL.
+
+Both directions stream: rows are read and written one at a time, so memory
+use does not depend on the number of questions.
+
+- Import upserts by `question_hash()`: a row whose question and correct answer
+  already exist in the same battle/category updates answers B-D, anything else
+  is inserted. Rows go to SQLite with batched `executemany`, all inside one
+  transaction.
+- Battles and categories are referenced by path of `name_uz`, e.g. "Lesson/Unit 3".
+
+    with open('questions.jsonl', 'w', encoding='utf-8') as f:
+        export_questions(f, 'jsonl')
+    stats = import_questions('questions.jsonl', create_paths=True)
+
+Used by the import_tests and export_tests management commands.
+"""
+import csv
+import json
+import os
+
+from django.db import connection, transaction
+from openpyxl import Workbook, load_workbook
+
+from .importer import MAX_REPORTED_ERRORS, validate_row
+from .models import Battle, Category, question_hash
+from .signals import publish
+
+FORMATS = ('csv', 'xlsx', 'jsonl')
+FIELDS = ('question', 'answer_a', 'answer_b', 'answer_c', 'answer_d', 'battle', 'category')
+# Headers of the admin Excel template are accepted too
+HEADER_ALIASES = {
+    'Savol': 'question',
+    'Variant A': 'answer_a',
+    'Variant B': 'answer_b',
+    'Variant C': 'answer_c',
+    'Variant D': 'answer_d',
+}
+PATH_SEPARATOR = '/'
+
+_UPSERT_SQL = """
+    INSERT INTO bot_app_test (question, answer_a, answer_b, answer_c, answer_d, battle_id, category_id, content_hash)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (content_hash) DO UPDATE SET
+        answer_b = excluded.answer_b, answer_c = excluded.answer_c, answer_d = excluded.answer_d
+    WHERE answer_b IS NOT excluded.answer_b OR answer_c IS NOT excluded.answer_c OR answer_d IS NOT excluded.answer_d
+"""
+_EXPORT_SQL = """
+    SELECT question, answer_a, answer_b, answer_c, answer_d, battle_id, category_id
+    FROM bot_app_test
+    {where}
+    ORDER BY id
+"""
+
+
+def detect_format(path, fmt=None):
+    fmt = (fmt or os.path.splitext(path)[1].lstrip('.')).lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}', expected one of: {', '.join(FORMATS)}")
+    return fmt
+
+
+def _text(value):
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = str(value).strip()
+    return value or None
+
+
+def _field(name):
+    name = _text(name)
+    return HEADER_ALIASES.get(name, name)
+
+
+# Readers: yield (line or row number, {field: value})
+
+def _read_csv(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = [_field(name) for name in next(reader, [])]
+        for row in reader:
+            yield reader.line_num, {name: _text(value) for name, value in zip(header, row) if name in FIELDS}
+
+
+def _read_jsonl(path):
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError:
+                yield number, None
+                continue
+            yield number, {_field(name): _text(value) for name, value in data.items() if _field(name) in FIELDS}
+
+
+def _read_xlsx(path):
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [_field(name) for name in next(rows, ())]
+        for number, row in enumerate(rows, start=2):
+            yield number, {name: _text(value) for name, value in zip(header, row) if name in FIELDS}
+    finally:
+        workbook.close()
+
+
+def read_rows(path, fmt=None):
+    return {'csv': _read_csv, 'xlsx': _read_xlsx, 'jsonl': _read_jsonl}[detect_format(path, fmt)](path)
+
+
+class TreePaths:
+    """"Lesson/Unit 3" <-> id for one hierarchy (Category or Battle), loaded once"""
+
+    def __init__(self, model):
+        self.model = model
+        rows = model.objects.values_list('id', 'name_uz', 'parent_id')
+        self.nodes = {pk: (name, parent_id) for pk, name, parent_id in rows}
+        self._ids = {}
+        self._paths = {}
+        # Same name twice under one parent: the older node wins
+        for pk in sorted(self.nodes):
+            self._ids.setdefault(self.path(pk), pk)
+
+    def path(self, pk):
+        if pk is None:
+            return None
+        path = self._paths.get(pk)
+        if path is None:
+            names = []
+            node_id = pk
+            while node_id in self.nodes and len(names) <= len(self.nodes):
+                name, node_id = self.nodes[node_id]
+                names.append(name)
+            path = self._paths[pk] = PATH_SEPARATOR.join(reversed(names))
+        return path
+
+    def resolve(self, path, create: bool = False):
+        """id of the node at `path`; missing nodes are created if `create`, otherwise None"""
+        if not path:
+            return None
+        path = PATH_SEPARATOR.join(part.strip() for part in path.split(PATH_SEPARATOR))
+        pk = self._ids.get(path)
+        if pk is not None or not create:
+            return pk
+
+        parent_path, _, name = path.rpartition(PATH_SEPARATOR)
+        parent_id = self.resolve(parent_path, create=True) if parent_path else None
+        node = self.model.objects.create(name_uz=name, name_ru=name, parent_id=parent_id)
+        self.nodes[node.pk] = (name, parent_id)
+        self._ids[path] = node.pk
+        self._paths[node.pk] = path
+        return node.pk
+
+    def subtree(self, pk):
+        """Ids of `pk` and all its descendants"""
+        children = {}
+        for node_id, (_, parent_id) in self.nodes.items():
+            children.setdefault(parent_id, []).append(node_id)
+        ids = []
+        stack = [pk]
+        while stack:
+            node_id = stack.pop()
+            ids.append(node_id)
+            stack.extend(children.get(node_id, ()))
+        return ids
+
+
+class ImportStats:
+    def __init__(self):
+        self.read = 0
+        self.inserted = 0
+        self.updated = 0
+        self.skipped = 0
+        self.errors = []
+
+    @property
+    def unchanged(self):
+        return self.read - self.inserted - self.updated - self.skipped
+
+    def skip(self, number, message):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"Row {number}: {message}")
+
+    def as_dict(self):
+        return {'read': self.read, 'inserted': self.inserted, 'updated': self.updated,
+                'unchanged': self.unchanged, 'skipped': self.skipped}
+
+
+def _count_tests(cursor):
+    cursor.execute("SELECT COUNT(*) FROM bot_app_test")
+    return cursor.fetchone()[0]
+
+
+def import_questions(path, fmt=None, batch_size=5000, create_paths=False, battle=None, category=None,
+                     dry_run=False, progress=None) -> ImportStats:
+    """
+    Upsert every valid row of `path` into bot_app_test.
+
+    :param create_paths: create battles/categories whose path does not exist yet (otherwise the row is skipped).
+    :param battle: path used for rows without a battle/category column.
+    :param category: path used for rows without a battle/category column.
+    :param dry_run: validate and count, then roll everything back.
+    :param progress: optional callable receiving ImportStats after each batch.
+    """
+    stats = ImportStats()
+    battle_ids = set()
+    category_ids = set()
+
+    with transaction.atomic():
+        battles = TreePaths(Battle)
+        categories = TreePaths(Category)
+        cursor = connection.cursor()
+        before = _count_tests(cursor)
+        batch = []
+
+        def flush():
+            cursor.executemany(_UPSERT_SQL, batch)
+            # rowcount: inserted rows plus rows whose answers changed
+            changed = cursor.rowcount
+            batch.clear()
+            return changed
+
+        changed = 0
+        for number, values in read_rows(path, fmt):
+            if values is None:
+                stats.read += 1
+                stats.skip(number, "not a JSON object")
+                continue
+            if not any(values.values()):
+                continue
+            stats.read += 1
+            # No length limit: SQLite does not enforce max_length and the bank already has longer answers,
+            # so an export must import back unchanged
+            error = validate_row(values, max_length=None)
+            if error:
+                stats.skip(number, error)
+                continue
+
+            battle_path = values.get('battle')
+            category_path = values.get('category')
+            if not battle_path and not category_path:
+                battle_path, category_path = battle, category
+            battle_id = battles.resolve(battle_path, create=create_paths)
+            category_id = categories.resolve(category_path, create=create_paths)
+            if battle_path and battle_id is None:
+                stats.skip(number, f"unknown battle '{battle_path}'")
+                continue
+            if category_path and category_id is None:
+                stats.skip(number, f"unknown category '{category_path}'")
+                continue
+            if battle_id is None and category_id is None:
+                stats.skip(number, "no battle or category")
+                continue
+
+            battle_ids.add(battle_id)
+            category_ids.add(category_id)
+            batch.append((
+                values['question'], values['answer_a'], values.get('answer_b'), values.get('answer_c'),
+                values.get('answer_d'), battle_id, category_id,
+                question_hash(values['question'], values['answer_a'], battle_id, category_id),
+            ))
+            if len(batch) >= batch_size:
+                changed += flush()
+                if progress:
+                    progress(stats)
+        if batch:
+            changed += flush()
+
+        stats.inserted = _count_tests(cursor) - before
+        stats.updated = changed - stats.inserted
+        cursor.close()
+        if progress:
+            progress(stats)
+
+        if dry_run:
+            transaction.set_rollback(True)
+        elif stats.inserted or stats.updated:
+            # Raw SQL sends no signals: tell the bot once which question groups changed
+            event = {
+                'model': 'test',
+                'action': 'import',
+                'battle_ids': sorted(battle_ids - {None}),
+                'category_ids': sorted(category_ids - {None}),
+            }
+            transaction.on_commit(lambda: publish(event))
+
+    return stats
+
+
+# Export
+
+def _export_rows(battle=None, category=None, batch_size=5000):
+    """(question, answer_a..d, battle path, category path) in id order"""
+    battles = TreePaths(Battle)
+    categories = TreePaths(Category)
+    where, params = [], []
+    for column, paths, path in (('battle_id', battles, battle), ('category_id', categories, category)):
+        if path:
+            pk = paths.resolve(path)
+            if pk is None:
+                raise ValueError(f"Unknown path '{path}'")
+            ids = paths.subtree(pk)
+            where.append(f"{column} IN ({', '.join(['%s'] * len(ids))})")
+            params.extend(ids)
+
+    sql = _EXPORT_SQL.format(where=f"WHERE {' AND '.join(where)}" if where else '')
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for *answers, battle_id, category_id in rows:
+                yield (*answers, battles.path(battle_id), categories.path(category_id))
+
+
+def export_questions(output, fmt, battle=None, category=None) -> int:
+    """
+    Write questions to `output` (a text file for csv/jsonl, a path or binary file for xlsx).
+
+    :param battle: only questions under this battle path.
+    :param category: only questions under this category path.
+    :return: Number of exported questions.
+    """
+    fmt = detect_format('', fmt)
+    rows = _export_rows(battle, category)
+    count = 0
+
+    if fmt == 'csv':
+        writer = csv.writer(output)
+        writer.writerow(FIELDS)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    elif fmt == 'jsonl':
+        for row in rows:
+            output.write(json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False) + '\n')
+            count += 1
+    else:
+        # write_only: rows go to a temporary file instead of staying in memory
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(FIELDS)
+        for row in rows:
+            sheet.append(row)
+            count += 1
+        workbook.save(output)
+    return count
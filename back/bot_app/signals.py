@@ -0,0 +1,171 @@
+"""
+Admin panelda Category, Battle, Test, SetAdmin va SetBio o'zgarganda botga xabar berish.
+
+Bot bu yozuvlarni soatlab keshlaydi, shuning uchun har bir o'zgarishdan keyin
+(tranzaksiya commit bo'lgach) qaysi yozuv o'zgargani haqida JSON xabar
+yuboriladi. Bot xabarni olib, faqat tegishli kesh kalitlarini o'chiradi
+(utils/invalidation.py).
+
+Xabar Redis pub/sub kanaliga yuboriladi; Redis o'chirilgan yoki ishlamayotgan
+bo'lsa, bot kuzatib turadigan spool faylga bir qator qilib yoziladi.
+"""
+import json
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Battle, Category, SetAdmin, SetBio, Test
+
+logger = logging.getLogger('bot_app.invalidation')
+
+_redis_client = None
+_spool_lock = threading.Lock()
+
+
+def _config():
+    return settings.BOT_CACHE_INVALIDATION
+
+
+def _get_redis():
+    global _redis_client
+    if _redis_client is None:
+        import redis
+        config = _config()
+        _redis_client = redis.Redis(
+            host=config['REDIS_HOST'],
+            port=config['REDIS_PORT'],
+            password=config['REDIS_PASSWORD'],
+            db=config['REDIS_DB'],
+            socket_timeout=2,
+            socket_connect_timeout=2,
+        )
+    return _redis_client
+
+
+def _write_spool(raw):
+    path = _config()['SPOOL_PATH']
+    with _spool_lock:
+        # Fayl cheksiz o'smasligi uchun chegaradan oshsa boshidan yoziladi;
+        # bot fayl qisqarganini ko'rib, o'qishni boshidan boshlaydi
+        mode = 'a'
+        if os.path.exists(path) and os.path.getsize(path) > _config()['SPOOL_MAX_BYTES']:
+            mode = 'w'
+        with open(path, mode, encoding='utf-8') as f:
+            f.write(raw + '\n')
+
+
+def publish(event: dict):
+    """O'zgarish haqidagi xabarni botga yuborish"""
+    raw = json.dumps(event)
+    if _config()['USE_REDIS']:
+        try:
+            _get_redis().publish(_config()['CHANNEL'], raw)
+            return
+        except Exception as e:
+            logger.error("Invalidatsiya xabarini Redis ga yuborib bo'lmadi, spool faylga yoziladi: %s", e)
+    try:
+        _write_spool(raw)
+    except Exception as e:
+        logger.error("Invalidatsiya xabarini spool faylga yozib bo'lmadi: %s", e)
+
+
+def _publish_on_commit(event: dict):
+    # Bot yangi qiymatni o'qishi uchun xabar commit'dan keyin yuboriladi
+    transaction.on_commit(lambda: publish(event))
+
+
+def _remember_old(sender, instance, *fields):
+    """Saqlashdan oldingi qiymatlarni eslab qolish (masalan, parent o'zgarsa eski ro'yxat ham tozalanadi)"""
+    old = None
+    if instance.pk is not None:
+        old = sender.objects.filter(pk=instance.pk).values(*fields).first()
+    instance._invalidation_old = old or {}
+
+
+# Kategoriya va bellashuvlar daraxti
+
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=Battle)
+def remember_tree_parent(sender, instance, **kwargs):
+    _remember_old(sender, instance, 'parent_id')
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Battle)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Battle)
+def publish_tree_change(sender, instance, **kwargs):
+    old = getattr(instance, '_invalidation_old', {})
+    parent_ids = {instance.parent_id}
+    if 'parent_id' in old:
+        parent_ids.add(old['parent_id'])
+    _publish_on_commit({
+        'model': sender._meta.model_name,
+        'action': 'save' if 'created' in kwargs else 'delete',
+        'id': instance.pk,
+        'parent_ids': list(parent_ids),
+    })
+
+
+# Savollar
+
+@receiver(pre_save, sender=Test)
+def remember_test_groups(sender, instance, **kwargs):
+    _remember_old(sender, instance, 'battle_id', 'category_id')
+
+
+@receiver(post_save, sender=Test)
+@receiver(post_delete, sender=Test)
+def publish_test_change(sender, instance, **kwargs):
+    old = getattr(instance, '_invalidation_old', {})
+    battle_ids = {instance.battle_id, old.get('battle_id')} - {None}
+    category_ids = {instance.category_id, old.get('category_id')} - {None}
+    _publish_on_commit({
+        'model': 'test',
+        'action': 'save' if 'created' in kwargs else 'delete',
+        'id': instance.pk,
+        'battle_ids': list(battle_ids),
+        'category_ids': list(category_ids),
+    })
+
+
+# Adminlar
+
+@receiver(pre_save, sender=SetAdmin)
+def remember_admin_user(sender, instance, **kwargs):
+    _remember_old(sender, instance, 'user__chat_id')
+
+
+@receiver(post_save, sender=SetAdmin)
+@receiver(post_delete, sender=SetAdmin)
+def publish_admin_change(sender, instance, **kwargs):
+    old = getattr(instance, '_invalidation_old', {})
+    chat_ids = {old.get('user__chat_id')}
+    try:
+        chat_ids.add(instance.user.chat_id)
+    except Exception:
+        # Foydalanuvchi bilan birga o'chirilayotgan bo'lishi mumkin
+        pass
+    _publish_on_commit({
+        'model': 'setadmin',
+        'action': 'save' if 'created' in kwargs else 'delete',
+        'id': instance.pk,
+        'chat_ids': list(chat_ids - {None}),
+    })
+
+
+# "Biz haqimizda" matni
+
+@receiver(post_save, sender=SetBio)
+@receiver(post_delete, sender=SetBio)
+def publish_bio_change(sender, instance, **kwargs):
+    _publish_on_commit({
+        'model': 'setbio',
+        'action': 'save' if 'created' in kwargs else 'delete',
+        'id': instance.pk,
+    })
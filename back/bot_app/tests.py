@@ -1,3 +1,259 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from openpyxl import Workbook
+
+from bot_app.importer import ImportFileError, import_workbook, run_job
+from bot_app.models import Battle, Category, ImportJob, SetAdmin, Test, User
+from bot_app.question_io import export_questions, import_questions
+from bot_app.query_plans import HOT_QUERIES, check_query_plans, explain, raw_cursor
+from bot_app.signals import publish
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_queries_use_indexes(self):
+        failures = check_query_plans(connection)
+        self.assertEqual(failures, {}, f"Full scans in hot queries: {failures}")
+
+    def test_check_detects_full_scan(self):
+        failures = check_query_plans(connection, {'by_name': "SELECT * FROM bot_app_user WHERE first_name = ?"})
+        self.assertIn('by_name', failures)
+
+    def test_rating_query_is_covered(self):
+        plan = ' '.join(explain(raw_cursor(connection), HOT_QUERIES['results_by_unique_id']))
+        self.assertIn('COVERING INDEX results_rating_idx', plan)
+
+
+def _workbook(rows, header=('Savol', 'Variant A', 'Variant B', 'Variant C', 'Variant D')):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        self.battle = Battle.objects.create(name_uz='B', name_ru='B')
+
+    def test_imports_all_answers_in_batches(self):
+        file = _workbook([(f'q{i}', 'a', 'b', 'c', 'd') for i in range(25)])
+        with mock.patch('bot_app.importer.publish') as publish, \
+                self.captureOnCommitCallbacks(execute=True):
+            result = import_workbook(file, battle_id=self.battle.pk, batch_size=10)
+
+        self.assertEqual((result.total, result.inserted, result.updated, result.skipped), (25, 25, 0, 0))
+        self.assertEqual(Test.objects.filter(battle=self.battle).count(), 25)
+        test = Test.objects.get(question='q7')
+        self.assertEqual((test.answer_b, test.answer_c, test.answer_d), ('b', 'c', 'd'))
+        # One event for the whole upload instead of a post_save per row
+        publish.assert_called_once()
+        self.assertEqual(publish.call_args[0][0]['battle_ids'], [self.battle.pk])
+
+    def test_invalid_rows_are_skipped_and_reported(self):
+        file = _workbook([('q1', 'a', None, None, None), (None, 'a', 'b', 'c', 'd'), ('q3', None, 'b', 'c', 'd'),
+                          (None, None, None, None, None)])
+        result = import_workbook(file, battle_id=self.battle.pk)
+
+        self.assertEqual((result.total, result.inserted, result.skipped), (3, 1, 2))
+        self.assertEqual(result.errors, ["Row 3: empty question", "Row 4: empty Variant A (correct answer)"])
+
+    def test_counts_new_updated_and_repeated_rows(self):
+        Test.objects.create(question='q0', answer_a='a', answer_b='old', battle=self.battle)
+        # q1 twice in one batch, q0 already in the database, q2 repeated in a later batch
+        file = _workbook([('q1', 'a', 'b', None, None), ('q1', 'a', 'c', None, None), ('q0', 'a', 'new', None, None),
+                          ('q2', 'a', 'b', None, None), ('q2', 'a', 'b', None, None)])
+        with mock.patch('bot_app.importer.publish'), self.captureOnCommitCallbacks(execute=True):
+            result = import_workbook(file, battle_id=self.battle.pk, batch_size=4)
+
+        self.assertEqual((result.total, result.inserted, result.updated, result.repeated), (5, 2, 2, 1))
+        self.assertEqual(Test.objects.filter(battle=self.battle).count(), 3)
+        self.assertEqual(Test.objects.get(question='q1').answer_b, 'c')
+        self.assertEqual(Test.objects.get(question='q0').answer_b, 'new')
+
+    def test_missing_column_imports_nothing(self):
+        file = _workbook([('q1', 'a')], header=('Savol', 'Javob'))
+        with self.assertRaises(ImportFileError):
+            import_workbook(file, battle_id=self.battle.pk)
+        self.assertFalse(Test.objects.exists())
+
+    def test_job_stores_results(self):
+        job = ImportJob.objects.create(
+            file=SimpleUploadedFile('tests.xlsx', _workbook([('q1', 'a', 'b', 'c', 'd'), (None, 'a')]).read()),
+            battle=self.battle,
+        )
+        self.addCleanup(job.file.delete, save=False)
+        with mock.patch('bot_app.importer.publish'):
+            run_job(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.DONE)
+        self.assertEqual((job.total_rows, job.inserted_rows, job.updated_rows, job.skipped_rows), (2, 1, 0, 1))
+        self.assertIn("Row 3", job.errors)
+
+
+class QuestionIOTests(TestCase):
+    def setUp(self):
+        self.lesson = Battle.objects.create(name_uz='Lesson', name_ru='Lesson')
+        self.unit = Battle.objects.create(name_uz='Unit 3', name_ru='Unit 3', parent=self.lesson)
+        self.book = Category.objects.create(name_uz='Book', name_ru='Book')
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def _file(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def test_upsert_by_content_hash(self):
+        path = self._file('q.csv', "question,answer_a,answer_b,battle\nq1,a,b,Lesson/Unit 3\nq2,a,b,Lesson/Unit 3\n")
+        with mock.patch('bot_app.question_io.publish'), self.captureOnCommitCallbacks(execute=True):
+            stats = import_questions(path)
+        self.assertEqual((stats.inserted, stats.updated), (2, 0))
+
+        # Same question and answer, other wrong answer: updated in place
+        path = self._file('q.csv', "question,answer_a,answer_b,battle\nq1,a,c,Lesson/Unit 3\nq2, a ,b,Lesson/Unit 3\n")
+        with mock.patch('bot_app.question_io.publish') as publish, self.captureOnCommitCallbacks(execute=True):
+            stats = import_questions(path)
+        self.assertEqual((stats.inserted, stats.updated, stats.unchanged), (0, 1, 1))
+        self.assertEqual(Test.objects.get(question='q1').answer_b, 'c')
+        self.assertEqual(Test.objects.filter(battle=self.unit).count(), 2)
+        publish.assert_called_once()
+        self.assertEqual(publish.call_args[0][0]['battle_ids'], [self.unit.pk])
+
+    def test_old_duplicate_stays_editable(self):
+        original = Test.objects.create(question='q1', answer_a='a', answer_b='b', battle=self.unit)
+        # A copy left from before content_hash: migration 0024 gave it a NULL hash
+        Test.objects.bulk_create([Test(question='q1', answer_a='a', answer_b='b', battle=self.unit)])
+        duplicate = Test.objects.exclude(pk=original.pk).get()
+        self.assertIsNone(duplicate.content_hash)
+
+        duplicate.answer_b = 'c'
+        duplicate.full_clean()
+        duplicate.save()
+        duplicate.refresh_from_db()
+        self.assertEqual(duplicate.answer_b, 'c')
+        self.assertIsNone(duplicate.content_hash)
+
+        # Turning another question into a copy is still rejected
+        other = Test.objects.create(question='q2', answer_a='a', battle=self.unit)
+        other.question = 'q1'
+        with self.assertRaises(ValidationError):
+            other.full_clean()
+
+    def test_unknown_path_is_skipped_unless_created(self):
+        path = self._file('q.jsonl', '{"question": "q1", "answer_a": "a", "battle": "Lesson/Unit 4"}\n')
+        self.assertEqual(import_questions(path).skipped, 1)
+
+        stats = import_questions(path, create_paths=True)
+        self.assertEqual(stats.inserted, 1)
+        self.assertEqual(Battle.objects.get(name_uz='Unit 4').parent, self.lesson)
+
+    def test_export_round_trip(self):
+        Test.objects.create(question='q1', answer_a='a', answer_b='b', battle=self.unit)
+        Test.objects.create(question='q2', answer_a='a', category=self.book)
+
+        for fmt in ('csv', 'jsonl', 'xlsx'):
+            path = os.path.join(self.directory.name, f'export.{fmt}')
+            if fmt == 'xlsx':
+                self.assertEqual(export_questions(path, fmt), 2)
+            else:
+                with open(path, 'w', newline='', encoding='utf-8') as f:
+                    self.assertEqual(export_questions(f, fmt), 2)
+            stats = import_questions(path, dry_run=True)
+            self.assertEqual((stats.read, stats.inserted, stats.unchanged), (2, 0, 2), fmt)
+
+    def test_export_filters_by_subtree(self):
+        Test.objects.create(question='q1', answer_a='a', battle=self.unit)
+        Test.objects.create(question='q2', answer_a='a', category=self.book)
+        output = io.StringIO()
+        self.assertEqual(export_questions(output, 'jsonl', battle='Lesson'), 1)
+        self.assertIn('"battle": "Lesson/Unit 3"', output.getvalue())
+
+
+class InvalidationSignalTests(TestCase):
+    def setUp(self):
+        self.lesson = Battle.objects.create(name_uz='Lesson', name_ru='Lesson')
+        self.exam = Battle.objects.create(name_uz='Exam', name_ru='Exam')
+        self.book = Category.objects.create(name_uz='Book', name_ru='Book')
+        self.workbook = Category.objects.create(name_uz='Workbook', name_ru='Workbook')
+
+    def _events(self, action):
+        """Events published after `action()` commits"""
+        with mock.patch('bot_app.signals.publish') as publish, self.captureOnCommitCallbacks(execute=True):
+            action()
+        return [call.args[0] for call in publish.call_args_list]
+
+    def test_moving_a_node_invalidates_old_and_new_parent(self):
+        unit = Battle.objects.create(name_uz='Unit 1', name_ru='Unit 1', parent=self.lesson)
+        unit.parent = self.exam
+
+        [event] = self._events(unit.save)
+        self.assertEqual((event['model'], event['action'], event['id']), ('battle', 'save', unit.pk))
+        self.assertEqual(sorted(event['parent_ids']), sorted([self.lesson.pk, self.exam.pk]))
+
+    def test_new_and_deleted_nodes(self):
+        [created] = self._events(lambda: Category.objects.create(name_uz='Ch', name_ru='Ch', parent=self.book))
+        self.assertEqual((created['model'], created['action'], created['parent_ids']),
+                         ('category', 'save', [self.book.pk]))
+
+        chapter = Category.objects.get(pk=created['id'])
+        [deleted] = self._events(chapter.delete)
+        self.assertEqual((deleted['action'], deleted['id'], deleted['parent_ids']),
+                         ('delete', created['id'], [self.book.pk]))
+
+    def test_moving_a_question_reloads_both_groups(self):
+        test = Test.objects.create(question='q1', answer_a='a', battle=self.lesson)
+        test.battle = self.exam
+
+        [event] = self._events(test.save)
+        self.assertEqual((event['model'], event['action']), ('test', 'save'))
+        self.assertEqual(sorted(event['battle_ids']), sorted([self.lesson.pk, self.exam.pk]))
+        self.assertEqual(event['category_ids'], [])
+
+        test.battle, test.category = None, self.workbook
+        [event] = self._events(test.save)
+        self.assertEqual((event['battle_ids'], event['category_ids']), ([self.exam.pk], [self.workbook.pk]))
+
+    def test_deleted_question(self):
+        test = Test.objects.create(question='q1', answer_a='a', category=self.book)
+        [event] = self._events(test.delete)
+        self.assertEqual((event['action'], event['battle_ids'], event['category_ids']), ('delete', [], [self.book.pk]))
+
+    def test_admin_change_lists_old_and_new_chat(self):
+        first = User.objects.create(chat_id=1001)
+        second = User.objects.create(chat_id=1002)
+        admin = SetAdmin.objects.create(user=first)
+        admin.user = second
+
+        [event] = self._events(admin.save)
+        self.assertEqual((event['model'], event['action']), ('setadmin', 'save'))
+        self.assertEqual(sorted(event['chat_ids']), [1001, 1002])
+
+    def test_nothing_is_published_on_rollback(self):
+        with mock.patch('bot_app.signals.publish') as publish, self.captureOnCommitCallbacks(execute=False):
+            Battle.objects.create(name_uz='Unit 2', name_ru='Unit 2', parent=self.lesson)
+        publish.assert_not_called()
+
+    def test_publish_falls_back_to_spool_without_redis(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'spool.jsonl')
+        config = {'USE_REDIS': False, 'SPOOL_PATH': path, 'SPOOL_MAX_BYTES': 1024 * 1024}
+        with override_settings(BOT_CACHE_INVALIDATION=config):
+            publish({'model': 'setbio', 'action': 'save', 'id': 1})
+            publish({'model': 'setbio', 'action': 'delete', 'id': 1})
+        with open(path, encoding='utf-8') as f:
+            self.assertEqual([json.loads(line)['action'] for line in f], ['save', 'delete'])
@@ -76,10 +76,11 @@ WSGI_APPLICATION = "config.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# Bot bilan bitta DATABASE_PATH (nisbiy yo'l loyiha ildiziga nisbatan, bot kabi)
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'NAME': os.path.join(BASE_DIR.parent, os.getenv('DATABASE_PATH', 'back/db.sqlite3')),
         'OPTIONS': {
             'timeout': 30,  # Value in seconds
         },
@@ -87,6 +88,32 @@ DATABASES = {
 }
 
 
+# Admin paneldagi o'zgarishlar haqida botga xabar berish (bot keshini tozalash).
+# Redis sozlamalari bot bilan umumiy .env faylidan o'qiladi; Redis o'chirilgan
+# bo'lsa, xabarlar bot kuzatib turadigan spool faylga yoziladi.
+try:
+    from dotenv import load_dotenv
+    load_dotenv(os.path.join(BASE_DIR.parent, '.env'))
+except ImportError:
+    pass
+
+BOT_CACHE_INVALIDATION = {
+    'USE_REDIS': os.getenv("USE_REDIS", "false").lower() in ['true', 't', '1', 'yes', 'y'],
+    'REDIS_HOST': os.getenv("REDIS_HOST", "localhost"),
+    'REDIS_PORT': int(os.getenv("REDIS_PORT", "6379")),
+    'REDIS_PASSWORD': os.getenv("REDIS_PASSWORD", None),
+    'REDIS_DB': int(os.getenv("REDIS_CACHE_DB", "0")),
+    'CHANNEL': os.getenv("CACHE_INVALIDATION_CHANNEL", "bot:invalidate"),
+    'SPOOL_PATH': os.getenv("CACHE_INVALIDATION_SPOOL", os.path.join(BASE_DIR, 'cache_invalidation.jsonl')),
+    'SPOOL_MAX_BYTES': 1024 * 1024,
+}
+
+# Excel dan savollarni import qilish (bot_app/importer.py): bitta bulk_create dagi qatorlar soni
+TEST_IMPORT = {
+    'BATCH_SIZE': int(os.getenv("TEST_IMPORT_BATCH_SIZE", "1000")),
+}
+
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -0,0 +1,17 @@
+"""
+Load-testing harness.
+
+Synthetic Telegram updates are pushed through the real Dispatcher (all
+middlewares, filters and handlers) while the bot talks to a local fake Bot API.
+Each scenario runs in its own process on a freshly generated database:
+
+- browse: users open the book/battle menus and click through categories;
+- room_quiz: a room quiz with hundreds of participants, answers and timeouts;
+- broadcast: the admin sends a message to every user, some of whom blocked the bot.
+
+The report has throughput, p50/p99 update latency, SQL queries per update and
+memory. Runs are kept in benchmarks/results/ and each new run is compared with
+the previous one that had the same parameters, so regressions stand out:
+
+    python -m benchmarks [browse room_quiz broadcast] [--check]
+"""
@@ -0,0 +1,107 @@
+"""
+    python -m benchmarks                      # all scenarios with default sizes
+    python -m benchmarks browse --users 200   # one scenario, smaller
+    python -m benchmarks --check              # exit 1 if a run regressed
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import dataset, results
+
+DEFAULT_PARAMS = {
+    'browse': {'users': 1000, 'steps': 8, 'concurrency': 100},
+    'room_quiz': {'participants': 500, 'questions': 5, 'quiz_time': 3, 'answer_rate': 0.8, 'correct_rate': 0.7},
+    'broadcast': {'blocked_every': 20},
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description="Replay synthetic Telegram load")
+    parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                        help=f"scenarios to run: {', '.join(DEFAULT_PARAMS)} (default: all)")
+    parser.add_argument('--users', type=int, help="browse: simulated users")
+    parser.add_argument('--steps', type=int, help="browse: menu clicks per user")
+    parser.add_argument('--participants', type=int, help="room_quiz: room size")
+    parser.add_argument('--questions', type=int, help="room_quiz: questions per quiz")
+    parser.add_argument('--quiz-time', type=int, help="room_quiz: seconds per question")
+    parser.add_argument('--seed', type=int, default=1, help="dataset and scenario random seed")
+    parser.add_argument('--db-users', type=int, default=2000,
+                        help="users generated in the database (broadcast recipients)")
+    parser.add_argument('--retry-after-every', type=int, default=0,
+                        help="fake API answers every N-th send with 429 (0 - never)")
+    parser.add_argument('--latency', type=float, default=0.0, help="fake API response delay, seconds")
+    parser.add_argument('--production-limits', action='store_true',
+                        help="keep the configured outbound and throttling rates")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed relative change before a regression")
+    parser.add_argument('--check', action='store_true', help="exit with status 1 if any scenario regressed")
+    parser.add_argument('--no-store', action='store_true', help="do not append the results to the history")
+    parser.add_argument('--results-dir', default=results.RESULTS_DIR)
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(DEFAULT_PARAMS)
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(sorted(unknown))}")
+    return args
+
+
+def scenario_params(name, args):
+    params = dict(DEFAULT_PARAMS[name])
+    overrides = {
+        'browse': {'users': args.users, 'steps': args.steps},
+        'room_quiz': {'participants': args.participants, 'questions': args.questions, 'quiz_time': args.quiz_time},
+        'broadcast': {},
+    }[name]
+    params.update({key: value for key, value in overrides.items() if value is not None})
+    params['seed'] = args.seed
+    return params
+
+
+def run_worker(name, template_db, options):
+    """One scenario per process, so module-level state and memory peaks do not leak between them"""
+    completed = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.runner', name, template_db, json.dumps(options)],
+        cwd=dataset.ROOT, stdout=subprocess.PIPE, text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{name} failed with exit code {completed.returncode}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    names = args.scenarios or list(DEFAULT_PARAMS)
+    # Simulated users are existing users, so the database has at least as many
+    users = max(args.db_users, args.users or 0, args.participants or 0)
+
+    regressed = False
+    with tempfile.TemporaryDirectory(prefix='bench-data-') as tmp:
+        template_db = os.path.join(tmp, 'template.sqlite3')
+        dataset.migrate(template_db)
+        data = dataset.seed(template_db, users=users, seed=args.seed)
+
+        for name in names:
+            params = scenario_params(name, args)
+            options = {
+                'params': params,
+                'production_limits': args.production_limits,
+                'api': {'retry_after_every': args.retry_after_every, 'latency': args.latency},
+            }
+            result = run_worker(name, template_db, options)
+            result.update(params=dict(options, params=params), dataset=data)
+
+            baseline = results.previous(name, result['params'], data, args.results_dir)
+            rows = results.compare(result, baseline, args.tolerance) if baseline else []
+            print(results.format_report(result, rows, baseline), flush=True)
+            regressed |= any(row[-1] for row in rows)
+            if not args.no_store:
+                results.store(result, args.results_dir)
+
+    if args.check and regressed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Synthetic database for the benchmarks.
+
+The schema comes from the Django migrations, so it always matches the code
+under test. The data is generated from a fixed seed: a run only compares
+with earlier runs on exactly the same dataset.
+"""
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACK_DIR = os.path.join(ROOT, 'back')
+
+# handlers/users/admin.py only accepts this chat as the broadcast admin
+ADMIN_CHAT_ID = 624301767
+FIRST_USER_CHAT_ID = 1_000_000
+
+
+def migrate(path):
+    """Create an empty database at `path` with every Django migration applied"""
+    env = dict(os.environ, DATABASE_PATH=os.path.abspath(path))
+    subprocess.run(
+        [sys.executable, 'manage.py', 'migrate', '--noinput', '-v', '0'],
+        cwd=BACK_DIR, env=env, check=True,
+    )
+
+
+def _tree(rng, roots, branching, leaf_name):
+    """(id, name, parent_id) rows of a two-level tree, like the bot menus (root -> leaf)"""
+    rows = []
+    for i in range(roots):
+        rows.append((len(rows) + 1, f"Root {i + 1}", None))
+        root_id = len(rows)
+        for n in range(rng.randint(max(1, branching - 1), branching + 1)):
+            rows.append((len(rows) + 1, leaf_name(n), root_id))
+    return rows
+
+
+def _leaves(rows):
+    parents = {parent_id for _, _, parent_id in rows if parent_id is not None}
+    return [node_id for node_id, _, _ in rows if node_id not in parents]
+
+
+def seed(path, users=2000, questions_per_leaf=40, seed=1):
+    """
+    Fill a migrated database with categories, battles, questions and users.
+
+    :return: Summary of what was generated (stored with the results).
+    """
+    rng = random.Random(seed)
+    # Leaf categories are question ranges ("1-20"), as the product handler expects
+    categories = _tree(rng, roots=8, branching=4,
+                       leaf_name=lambda n: f"{n * questions_per_leaf + 1}-{(n + 1) * questions_per_leaf}")
+    battles = _tree(rng, roots=6, branching=4, leaf_name=lambda n: f"Unit {n + 1}")
+
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO bot_app_category (id, name_uz, name_ru, name_en, parent_id) VALUES (?, ?, ?, ?, ?)",
+            [(node_id, name, f"{name} (ru)", None, parent_id) for node_id, name, parent_id in categories],
+        )
+        conn.executemany(
+            "INSERT INTO bot_app_battle (id, name_uz, name_ru, name_en, parent_id) VALUES (?, ?, ?, ?, ?)",
+            [(node_id, name, f"{name} (ru)", None, parent_id) for node_id, name, parent_id in battles],
+        )
+
+        tests = []
+        for column, leaves in (('battle_id', _leaves(battles)), ('category_id', _leaves(categories))):
+            for leaf_id in leaves:
+                for n in range(questions_per_leaf):
+                    answers = [f"answer {leaf_id}-{n}-{k}" for k in range(4)]
+                    tests.append((
+                        f"Question {n + 1} of {column[:-3]} {leaf_id}?", *answers,
+                        leaf_id if column == 'battle_id' else None,
+                        leaf_id if column == 'category_id' else None,
+                    ))
+        conn.executemany(
+            "INSERT INTO bot_app_test (question, answer_a, answer_b, answer_c, answer_d, battle_id, category_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            tests,
+        )
+
+        conn.executemany(
+            "INSERT INTO bot_app_user (first_name, last_name, lang_id, chat_id, is_blocked) VALUES (?, ?, ?, ?, 0)",
+            [(f"User {i}", None, 1 if i % 4 else 2, FIRST_USER_CHAT_ID + i) for i in range(users)]
+            + [("Admin", None, 1, ADMIN_CHAT_ID)],
+        )
+        conn.execute(
+            "INSERT INTO bot_app_setadmin (user_id) SELECT id FROM bot_app_user WHERE chat_id = ?",
+            (ADMIN_CHAT_ID,),
+        )
+    conn.close()
+    return {
+        'seed': seed,
+        'categories': len(categories),
+        'battles': len(battles),
+        'questions': len(tests),
+        'users': users + 1,
+    }
+
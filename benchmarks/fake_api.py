@@ -0,0 +1,147 @@
+"""
+Local stand-in for the Telegram Bot API.
+
+Answers every method the bot uses with a plausible result, records each call
+and can inject failures: a 429 "retry after" every N sends, and 403 "bot was
+blocked" for chosen chats. Listeners registered with `on_message` see every
+message the bot sends, which is how simulated users notice a new question.
+"""
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+
+from aiohttp import web
+
+BOT_USER = {'id': 100000, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+SEND_METHODS = {'sendMessage', 'copyMessage', 'sendPhoto', 'sendDocument', 'sendVideo'}
+
+
+class FakeBotAPI:
+    def __init__(self, retry_after_every: int = 0, retry_after: int = 1, blocked_chats=None, latency: float = 0.0):
+        """
+        :param retry_after_every: answer every N-th send with 429 (0 - never).
+        :param retry_after: seconds reported in the injected 429.
+        :param blocked_chats: callable(chat_id) -> bool, chats answered with 403 "bot was blocked".
+        :param latency: seconds to wait before answering, to imitate the network.
+        """
+        self.retry_after_every = retry_after_every
+        self.retry_after = retry_after
+        self.blocked_chats = blocked_chats or (lambda chat_id: False)
+        self.latency = latency
+        self.calls = Counter()
+        self.injected = Counter()
+        # chat id -> callback_data / urls of the last inline keyboard sent there
+        self.buttons = {}
+        self.links = {}
+        self._listeners = {}
+        self._message_ids = itertools.count(1)
+        self._sends = 0
+        self._runner = None
+        self.url = None
+
+    # Server
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0):
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f'http://{host}:{port}'
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def on_message(self, chat_id: int, callback):
+        """Call `callback(text)` whenever the bot sends something to `chat_id`"""
+        self._listeners[chat_id] = callback
+
+    def reset(self):
+        self.calls.clear()
+        self.injected.clear()
+        self.buttons.clear()
+        self.links.clear()
+        self._sends = 0
+
+    # Requests
+
+    async def _handle(self, request):
+        method = request.match_info['method']
+        data = dict(await request.post())
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        chat_id = int(data['chat_id']) if str(data.get('chat_id', '')).lstrip('-').isdigit() else None
+        if method in SEND_METHODS:
+            self._sends += 1
+            if self.retry_after_every and self._sends % self.retry_after_every == 0:
+                self.injected['retry_after'] += 1
+                return self._error(429, f"Too Many Requests: retry after {self.retry_after}",
+                                   {'retry_after': self.retry_after})
+            if chat_id is not None and self.blocked_chats(chat_id):
+                self.injected['blocked'] += 1
+                return self._error(403, "Forbidden: bot was blocked by the user")
+
+        return web.json_response({'ok': True, 'result': self._result(method, chat_id, data)})
+
+    @staticmethod
+    def _error(code, description, parameters=None):
+        body = {'ok': False, 'error_code': code, 'description': description}
+        if parameters:
+            body['parameters'] = parameters
+        return web.json_response(body, status=code)
+
+    def _message(self, chat_id, text):
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id or 0, 'type': 'private' if (chat_id or 0) > 0 else 'group'},
+            'from': BOT_USER,
+            'text': text,
+        }
+
+    def _result(self, method, chat_id, data):
+        if method == 'getMe':
+            return BOT_USER
+        if method in ('sendMessage', 'editMessageText', 'editMessageReplyMarkup') or method in SEND_METHODS:
+            text = data.get('text', '')
+            keyboard = _inline_keyboard(data.get('reply_markup'))
+            if chat_id is not None and keyboard is not None:
+                self.buttons[chat_id] = [button['callback_data'] for button in keyboard if button.get('callback_data')]
+                self.links[chat_id] = [button['url'] for button in keyboard if button.get('url')]
+            if chat_id is not None and method != 'editMessageReplyMarkup':
+                listener = self._listeners.get(chat_id)
+                if listener is not None:
+                    listener(text)
+            if method == 'copyMessage':
+                return {'message_id': next(self._message_ids)}
+            return self._message(chat_id, text)
+        if method == 'getChat':
+            return {'id': chat_id or 0, 'type': 'private'}
+        if method in ('getMyCommands', 'getUpdates'):
+            return []
+        return True
+
+    def stats(self) -> dict:
+        return {
+            'calls': dict(self.calls),
+            'total_calls': sum(self.calls.values()),
+            'injected': dict(self.injected),
+        }
+
+
+def _inline_keyboard(markup):
+    """Buttons of an inline keyboard as a flat list (None if the message has none)"""
+    if isinstance(markup, str):
+        markup = json.loads(markup)
+    if not markup or 'inline_keyboard' not in markup:
+        return None
+    return [button for row in markup['inline_keyboard'] for button in row]
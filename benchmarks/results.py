@@ -0,0 +1,105 @@
+"""
+Result history: every run is appended to benchmarks/results/<scenario>.jsonl
+and compared with the last run that used the same parameters and dataset.
+"""
+import json
+import os
+import subprocess
+import time
+
+from benchmarks.dataset import ROOT
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+# (path in the result, True if bigger is better)
+COMPARED = (
+    (('throughput',), True),
+    (('latency_ms', 'p50'), False),
+    (('latency_ms', 'p99'), False),
+    (('db_queries_per_update',), False),
+    (('memory_mb', 'peak'), False),
+)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _path(scenario, results_dir):
+    return os.path.join(results_dir, f"{scenario}.jsonl")
+
+
+def previous(scenario, params, dataset, results_dir=RESULTS_DIR):
+    """The latest stored run of `scenario` with identical params and dataset (None if there is none)"""
+    try:
+        with open(_path(scenario, results_dir), encoding='utf-8') as history:
+            runs = [json.loads(line) for line in history if line.strip()]
+    except FileNotFoundError:
+        return None
+    for run in reversed(runs):
+        if run.get('params') == params and run.get('dataset') == dataset:
+            return run
+    return None
+
+
+def store(result, results_dir=RESULTS_DIR):
+    os.makedirs(results_dir, exist_ok=True)
+    record = dict(result, timestamp=time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), commit=git_commit())
+    with open(_path(result['scenario'], results_dir), 'a', encoding='utf-8') as history:
+        history.write(json.dumps(record, ensure_ascii=False) + '\n')
+    return record
+
+
+def _get(result, path):
+    for key in path:
+        result = (result or {}).get(key)
+    return result
+
+
+def compare(current, baseline, tolerance=0.2):
+    """
+    Compare the headline numbers of two runs.
+
+    :return: [(metric, baseline, current, change, regressed)], change is relative (+0.1 = 10% more).
+    """
+    rows = []
+    for path, higher_is_better in COMPARED:
+        old, new = _get(baseline, path), _get(current, path)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        regressed = change < -tolerance if higher_is_better else change > tolerance
+        rows.append(('.'.join(path), old, new, change, regressed))
+    return rows
+
+
+def format_report(result, rows, baseline):
+    latency = result['latency_ms']
+    lines = [
+        f"== {result['scenario']} ==",
+        f"updates: {result['updates']} in {result['elapsed']}s -> {result['throughput']} updates/s"
+        f" (failures: {result['failures']})",
+        f"latency ms: p50 {latency['p50']}  p90 {latency['p90']}  p99 {latency['p99']}  max {latency['max']}",
+        f"db queries: {result['db_queries']} ({result['db_queries_per_update']} per update,"
+        f" {result['db_seconds']}s)",
+        f"api calls: {result['api']['total_calls']} {result['api']['calls']}",
+        f"memory MB: rss {result['memory_mb']['rss_start']} -> {result['memory_mb']['rss_end']},"
+        f" peak {result['memory_mb']['peak']}",
+    ]
+    if result['handler_errors']:
+        lines.append(f"handler errors: {result['handler_errors']}")
+    if result['scenario_stats']:
+        lines.append(f"scenario: {result['scenario_stats']}")
+    if baseline is None:
+        lines.append("no earlier run with the same params and dataset to compare with")
+    else:
+        lines.append(f"compared with {baseline.get('timestamp')} ({baseline.get('commit')}):")
+        for metric, old, new, change, regressed in rows:
+            mark = '  REGRESSION' if regressed else ''
+            lines.append(f"  {metric:<24} {old:>10} -> {new:<10} {change:+.1%}{mark}")
+    return '\n'.join(lines)
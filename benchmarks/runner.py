@@ -0,0 +1,240 @@
+"""
+Runs one scenario in a fresh process: configures the bot through the
+environment, starts it exactly like app.py does (against the fake API), feeds
+the scenario's updates through the Dispatcher and prints the measurements as a
+single JSON line on stdout.
+
+    python -m benchmarks.runner <scenario> <template db> '<json params>'
+"""
+import asyncio
+import itertools
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.dataset import ROOT
+
+# Production rate limits would make every scenario measure the limiter, not the code
+UNTHROTTLED = {
+    'OUTBOUND_GLOBAL_RATE': '100000',
+    'OUTBOUND_CHAT_RATE': '100000',
+    'OUTBOUND_GROUP_RATE': '100000',
+    'THROTTLE_RATE': '100000',
+    'THROTTLE_BURST': '100000',
+}
+
+
+def configure(workdir, template_db, production_limits=False):
+    """Environment for data/config.py; must run before anything imports it"""
+    db_path = os.path.join(workdir, 'bench.sqlite3')
+    shutil.copy(template_db, db_path)
+    os.environ.update({
+        'BOT_TOKEN': '123456:BENCHMARK-TOKEN',
+        'ADMINS': '',
+        'USE_REDIS': 'false',
+        'USE_WEBHOOK': 'false',
+        'DATABASE_PATH': db_path,
+        'WRITE_BEHIND_SPOOL_PATH': os.path.join(workdir, 'write_behind.jsonl'),
+        'BROADCAST_CHECKPOINT_PATH': os.path.join(workdir, 'broadcast_job.json'),
+        'CACHE_INVALIDATION_SPOOL': os.path.join(workdir, 'cache_invalidation.jsonl'),
+        'METRICS_PORT': '0',
+        'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'WARNING'),
+    })
+    if not production_limits:
+        for name, value in UNTHROTTLED.items():
+            os.environ.setdefault(name, value)
+    return db_path
+
+
+class Driver:
+    """Builds Telegram updates and pushes them through `dp.process_update`, timing each one"""
+
+    def __init__(self, dp, bot):
+        self.dp = dp
+        self.bot = bot
+        self.latencies = []
+        self.failures = 0
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1_000_000)
+
+    @staticmethod
+    def _user(chat_id):
+        return {'id': chat_id, 'is_bot': False, 'first_name': f"User {chat_id}", 'language_code': 'uz'}
+
+    def message(self, chat_id, text):
+        from aiogram import types
+        return types.Update(**{
+            'update_id': next(self._update_ids),
+            'message': {
+                'message_id': next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': self._user(chat_id),
+                'text': text,
+            },
+        })
+
+    def callback(self, chat_id, data):
+        from aiogram import types
+        from benchmarks.fake_api import BOT_USER
+        return types.Update(**{
+            'update_id': next(self._update_ids),
+            'callback_query': {
+                'id': str(next(self._update_ids)),
+                'chat_instance': str(chat_id),
+                'from': self._user(chat_id),
+                'data': data,
+                'message': {
+                    'message_id': next(self._message_ids),
+                    'date': int(time.time()),
+                    'chat': {'id': chat_id, 'type': 'private'},
+                    'from': BOT_USER,
+                    'text': '...',
+                },
+            },
+        })
+
+    async def feed(self, update):
+        """Process one update the way the poller does: in its own task, with the bot and dispatcher current"""
+        from aiogram import Bot, Dispatcher
+
+        async def process():
+            Bot.set_current(self.bot)
+            Dispatcher.set_current(self.dp)
+            await self.dp.process_update(update)
+
+        started = time.perf_counter()
+        try:
+            await asyncio.create_task(process())
+        except Exception:
+            self.failures += 1
+        self.latencies.append(time.perf_counter() - started)
+
+
+class Context:
+    def __init__(self, driver, api, seed):
+        self.driver = driver
+        self.api = api
+        self.seed = seed
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _rss_mb():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+def _delta(after, before):
+    """What a histogram recorded since `before`: {first label: (count, sum)}"""
+    delta = {}
+    for labels, (count, total) in after.items():
+        old_count, old_total = before.get(labels, (0, 0.0))
+        if count > old_count:
+            delta[labels[0] if labels else ''] = (count - old_count, total - old_total)
+    return delta
+
+
+async def run(scenario, template_db, params, production_limits=False, api_options=None):
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    configure(workdir, template_db, production_limits)
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+
+    import app
+    from aiogram.bot.api import TelegramAPIServer
+    from benchmarks.fake_api import FakeBotAPI
+    from benchmarks.scenarios import SCENARIOS
+    from loader import bot, dp, outbound
+    from utils.metrics import DB_QUERY_SECONDS, HANDLER_ERRORS, HANDLER_SECONDS
+
+    api = FakeBotAPI(**(api_options or {}))
+    bot.server = TelegramAPIServer.from_base(await api.start())
+    await app.on_startup(dp)
+    api.reset()
+
+    params = dict(params)
+    seed = params.pop('seed', 1)
+    driver = Driver(dp, bot)
+    rss_before = _rss_mb()
+    db_before, handlers_before = DB_QUERY_SECONDS.totals(), HANDLER_SECONDS.totals()
+    errors_before = HANDLER_ERRORS.totals()
+
+    started = time.perf_counter()
+    extra = await SCENARIOS[scenario](Context(driver, api, seed), **params)
+    # Queued replies are part of the work an update caused
+    while sum(outbound.stats()['queued'].values()):
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+
+    rss_after = _rss_mb()
+    db = _delta(DB_QUERY_SECONDS.totals(), db_before)
+    handlers = _delta(HANDLER_SECONDS.totals(), handlers_before)
+    errors = {labels[0]: value - errors_before.get(labels, 0)
+              for labels, value in HANDLER_ERRORS.totals().items() if value > errors_before.get(labels, 0)}
+    outbound_stats = outbound.stats()
+    api_stats = api.stats()
+
+    await app.on_shutdown(dp)
+    await (await bot.get_session()).close()
+    await api.stop()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    updates = len(driver.latencies)
+    db_queries = sum(count for count, _ in db.values())
+    return {
+        'scenario': scenario,
+        'updates': updates,
+        'failures': driver.failures,
+        'elapsed': round(elapsed, 3),
+        'throughput': round(updates / elapsed, 1) if elapsed else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(driver.latencies, 0.5) * 1000, 3),
+            'p90': round(percentile(driver.latencies, 0.9) * 1000, 3),
+            'p99': round(percentile(driver.latencies, 0.99) * 1000, 3),
+            'max': round(max(driver.latencies, default=0.0) * 1000, 3),
+            'mean': round(sum(driver.latencies) / updates * 1000, 3) if updates else 0.0,
+        },
+        'handlers': {name: {'count': count, 'mean_ms': round(total / count * 1000, 3)}
+                     for name, (count, total) in sorted(handlers.items())},
+        'handler_errors': errors,
+        'db_queries': db_queries,
+        'db_queries_per_update': round(db_queries / updates, 3) if updates else 0.0,
+        'db_seconds': round(sum(total for _, total in db.values()), 3),
+        'db_top': {statement: count for statement, (count, _) in
+                   sorted(db.items(), key=lambda item: -item[1][0])[:5]},
+        'api': api_stats,
+        'outbound': {key: outbound_stats[key] for key in ('sent', 'failed', 'blocked', 'retries', 'retry_after')},
+        'memory_mb': {
+            'rss_start': round(rss_before, 1),
+            'rss_end': round(rss_after, 1),
+            # ru_maxrss is in kilobytes on Linux
+            'peak': round(max(rss_after, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024), 1),
+        },
+        'scenario_stats': extra,
+    }
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    scenario, template_db, options = argv[0], argv[1], json.loads(argv[2]) if len(argv) > 2 else {}
+    result = asyncio.run(run(
+        scenario, os.path.abspath(template_db), options.get('params', {}),
+        production_limits=options.get('production_limits', False),
+        api_options=options.get('api', {}),
+    ))
+    # The result is the last line, so stray prints from the bot cannot break parsing
+    sys.stdout.write('\n' + json.dumps(result) + '\n')
+
+
+if __name__ == '__main__':
+    main()
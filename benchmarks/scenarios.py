@@ -0,0 +1,162 @@
+"""
+Load scenarios. Each one drives the bot only through updates (and the fake
+API), the way real users would, and returns scenario-specific numbers to
+add to the report.
+"""
+import asyncio
+import random
+import time
+
+from benchmarks.dataset import ADMIN_CHAT_ID, FIRST_USER_CHAT_ID
+
+
+def _lang_id(chat_id):
+    # dataset.seed(): every fourth user has Russian selected
+    return 2 if (chat_id - FIRST_USER_CHAT_ID) % 4 == 0 else 1
+
+
+async def browse(ctx, users=1000, steps=8, concurrency=100):
+    """`users` people open the book/battle menus and click through them `steps` times"""
+    from handlers.users.texts import BTN_BATTLE, BTN_BOOK
+    from utils.callback_codec import decode
+
+    rng = random.Random(ctx.seed)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    def browsable(data):
+        # Leaf buttons start a quiz; browsing stays in the menus
+        if data in ('back_to_root', 'back_to_battle'):
+            return True
+        callback = decode(data)
+        return callback is not None and callback.action in ('category', 'battle')
+
+    async def session(chat_id, session_rng):
+        lang_id = _lang_id(chat_id)
+        async with semaphore:
+            for _ in range(steps):
+                buttons = [data for data in ctx.api.buttons.get(chat_id, ()) if browsable(data)]
+                if not buttons or session_rng.random() < 0.2:
+                    text = session_rng.choice((BTN_BOOK[lang_id], BTN_BATTLE[lang_id]))
+                    await ctx.driver.feed(ctx.driver.message(chat_id, text))
+                else:
+                    await ctx.driver.feed(ctx.driver.callback(chat_id, session_rng.choice(buttons)))
+
+    await asyncio.gather(*(
+        session(FIRST_USER_CHAT_ID + i, random.Random(rng.random())) for i in range(users)
+    ))
+    return {}
+
+
+async def room_quiz(ctx, participants=500, questions=5, quiz_time=3, answer_rate=0.8, correct_rate=0.7,
+                    concurrency=100):
+    """
+    A room quiz: the admin creates a room, participants join through the deep
+    link, the admin starts the quiz, and everyone answers (some correctly, some
+    not, some let it time out).
+    """
+    from keyboards.inline.room import GroupQuizStates
+    from loader import category_tree, dp, timer_wheel
+
+    rng = random.Random(ctx.seed)
+    battle = next(node for node in category_tree.battles.nodes.values() if node.has_tests)
+    root = category_tree.battles.parent(battle.id)
+
+    # Room creation, the same clicks and answers the owner makes
+    admin = ADMIN_CHAT_ID
+    await ctx.driver.feed(ctx.driver.callback(admin, 'start_quiz'))
+    await ctx.driver.feed(ctx.driver.callback(admin, f"select_{root.id}"))
+    await ctx.driver.feed(ctx.driver.callback(admin, f"quiz_battle_{battle.id}"))
+    await ctx.driver.feed(ctx.driver.message(admin, str(questions)))
+    await ctx.driver.feed(ctx.driver.message(admin, str(quiz_time)))
+    deep_link = ctx.api.links[admin][-1].split('start=', 1)[1]
+    unique_id = deep_link.split('_')[3]
+    chat_ids = [FIRST_USER_CHAT_ID + i for i in range(participants)]
+
+    # Joining: /start with the room link, then the participant's name
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def join(chat_id):
+        async with semaphore:
+            await ctx.driver.feed(ctx.driver.message(chat_id, f"/start {deep_link}"))
+            await ctx.driver.feed(ctx.driver.message(chat_id, f"Player {chat_id}"))
+
+    await asyncio.gather(*(join(chat_id) for chat_id in chat_ids))
+    joined = time.perf_counter()
+
+    results = {'finished': 0, 'stalled': 0, 'answers': 0, 'skipped': 0}
+    waiting = GroupQuizStates.waiting_for_answer.state
+    ended = GroupQuizStates.quiz_ended.state
+
+    async def participant(chat_id, player_rng, event):
+        state = dp.current_state(chat=chat_id, user=chat_id)
+        last_index = None
+        deadline = time.monotonic() + (questions + 2) * (quiz_time + 2) + 30
+        while time.monotonic() < deadline:
+            try:
+                await asyncio.wait_for(event.wait(), quiz_time + 1)
+            except asyncio.TimeoutError:
+                pass
+            event.clear()
+            current = await state.get_state()
+            if current is None or current == ended:
+                results['finished'] += 1
+                return
+            if current != waiting:
+                continue
+            data = await state.get_data()
+            index = data.get('current_question_index')
+            if index == last_index:
+                continue
+            last_index = index
+            if player_rng.random() >= answer_rate:
+                results['skipped'] += 1
+                continue
+            await asyncio.sleep(player_rng.uniform(0, quiz_time / 2))
+            answer = data.get('true_answer', '') if player_rng.random() < correct_rate else 'wrong answer'
+            results['answers'] += 1
+            await ctx.driver.feed(ctx.driver.message(chat_id, answer))
+        results['stalled'] += 1
+
+    players = []
+    for chat_id in chat_ids:
+        event = asyncio.Event()
+        ctx.api.on_message(chat_id, lambda text, event=event: event.set())
+        players.append(participant(chat_id, random.Random(rng.random()), event))
+    tasks = [asyncio.create_task(player) for player in players]
+
+    await ctx.driver.feed(ctx.driver.callback(admin, f"start_room_quiz_{unique_id}"))
+    await asyncio.gather(*tasks)
+
+    results['quiz_seconds'] = round(time.perf_counter() - joined, 2)
+    results['timeouts_fired'] = timer_wheel.stats()['fired']
+    return results
+
+
+async def broadcast(ctx, blocked_every=20):
+    """The admin broadcasts a message to every user; every `blocked_every`-th chat has blocked the bot"""
+    from loader import broadcaster, db
+
+    if blocked_every:
+        ctx.api.blocked_chats = lambda chat_id: chat_id % blocked_every == 0
+    started = time.perf_counter()
+    await ctx.driver.feed(ctx.driver.message(ADMIN_CHAT_ID, 'Broadcast'))
+    await ctx.driver.feed(ctx.driver.message(ADMIN_CHAT_ID, 'Benchmark announcement'))
+    while broadcaster.running:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+
+    copies = ctx.api.calls['copyMessage']
+    blocked = await db.run_async(db.execute, "SELECT COUNT(*) FROM bot_app_user WHERE is_blocked = 1", fetchone=True)
+    return {
+        'broadcast_seconds': round(elapsed, 2),
+        'copies': copies,
+        'copies_per_second': round(copies / elapsed, 1) if elapsed else 0.0,
+        'marked_blocked': blocked[0] if blocked else 0,
+    }
+
+
+SCENARIOS = {
+    'browse': browse,
+    'room_quiz': room_quiz,
+    'broadcast': broadcast,
+}
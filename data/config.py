@@ -1,4 +1,5 @@
 import os
+import secrets
 from dotenv import load_dotenv
 
 # .env faylini yuklash
@@ -8,7 +9,98 @@ load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")  # Bot token
 ADMINS = os.getenv("ADMINS", "").split(",") if os.getenv("ADMINS") else []  # adminlar ro'yxati
 
-DATABASE_PATH = 'back/db.sqlite3'
+# Loyiha ildiziga nisbatan (Django ham shu o'zgaruvchini o'qiydi)
+DATABASE_PATH = os.getenv("DATABASE_PATH", 'back/db.sqlite3')
+
+# SQLite so'rovlari bajariladigan thread pool o'lchami va navbatdagi so'rovlar chegarasi
+DB_MAX_WORKERS = int(os.getenv("DB_MAX_WORKERS", "4"))
+DB_MAX_PENDING = int(os.getenv("DB_MAX_PENDING", "64"))
+
+# SQLite connection pool sozlamalari
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))
+DB_PRAGMAS = {
+    'synchronous': os.getenv("DB_SYNCHRONOUS", "NORMAL"),
+    'mmap_size': int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024))),
+    'cache_size': int(os.getenv("DB_CACHE_SIZE", "-16000")),
+}
+
+# Savollar banki o'zgarishlarni tekshirish oralig'i (soniya)
+QUESTION_BANK_REFRESH_INTERVAL = float(os.getenv("QUESTION_BANK_REFRESH_INTERVAL", "60"))
+CATEGORY_TREE_REFRESH_INTERVAL = float(os.getenv("CATEGORY_TREE_REFRESH_INTERVAL", "60"))
+
+# Room quiz boshlanganda bir vaqtda ishlanadigan ishtirokchilar soni
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", "30"))
+
+# Chiquvchi xabarlar navbati (Telegram limitlari: ~30 xabar/s umumiy, ~1 xabar/s chatga, ~20 xabar/min guruhga)
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))
+OUTBOUND_GROUP_RATE = float(os.getenv("OUTBOUND_GROUP_RATE", str(20 / 60)))
+OUTBOUND_WORKERS = int(os.getenv("OUTBOUND_WORKERS", "30"))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))
+
+# Kiruvchi update'lar limiti (foydalanuvchi + handler bo'yicha): sekundiga so'rovlar va portlash hajmi.
+# Handler'lar uchun alohida qiymatlar utils/misc/throttling.py dagi rate_limit bilan beriladi
+THROTTLE_RATE = float(os.getenv("THROTTLE_RATE", "10"))
+THROTTLE_BURST = float(os.getenv("THROTTLE_BURST", "1"))
+
+# Room quiz jonli reytingi: egasining xabari necha soniyada bir yangilanadi va nechta o'rin ko'rsatiladi
+LEADERBOARD_REFRESH_INTERVAL = float(os.getenv("LEADERBOARD_REFRESH_INTERVAL", "3"))
+LEADERBOARD_TOP_N = int(os.getenv("LEADERBOARD_TOP_N", "10"))
+
+# Natijalar, history va foydalanuvchi maydonlarini guruhlab yozish: to'plam hajmi, oraliq (soniya),
+# navbat chegarasi (back-pressure) va to'xtashda yozib bo'lmagan yozuvlar fayli
+WRITE_BEHIND_BATCH = int(os.getenv("WRITE_BEHIND_BATCH", "500"))
+WRITE_BEHIND_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", "0.5"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+WRITE_BEHIND_SPOOL_PATH = os.getenv("WRITE_BEHIND_SPOOL_PATH", "data/write_behind.jsonl")
+
+# Admin broadcast: sahifa o'lchami, parallel yuborishlar soni va Redis bo'lmaganda checkpoint fayli
+BROADCAST_PAGE_SIZE = int(os.getenv("BROADCAST_PAGE_SIZE", "500"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "30"))
+BROADCAST_CHECKPOINT_PATH = os.getenv("BROADCAST_CHECKPOINT_PATH", "data/broadcast_job.json")
+
+# Webhook rejimi (o'chirilgan bo'lsa long polling ishlatiladi)
+USE_WEBHOOK = os.getenv("USE_WEBHOOK", "false").lower() in ['true', 't', '1', 'yes', 'y']
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "")  # Tashqi manzil, masalan https://bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook/bot")
+# Telegram har bir so'rovda X-Telegram-Bot-Api-Secret-Token sarlavhasida yuboradi
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+# Update'ni fonda qayta ishlab, Telegram'ga darhol javob qaytarish
+WEBHOOK_ACK_EARLY = os.getenv("WEBHOOK_ACK_EARLY", "true").lower() in ['true', 't', '1', 'yes', 'y']
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "1"))
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", "8080"))
+
+# Logging: umumiy daraja, alohida modullar ("aiogram=WARNING,room_handler=DEBUG"), JSON format
+# va bir joydan LOG_DEBUG_INTERVAL soniyada ko'pi bilan LOG_DEBUG_LIMIT ta debug yozuv (0 - cheklovsiz)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "aiogram=INFO,aiohttp.access=WARNING")
+LOG_JSON = os.getenv("LOG_JSON", "false").lower() in ['true', 't', '1', 'yes', 'y']
+LOG_DEBUG_LIMIT = int(os.getenv("LOG_DEBUG_LIMIT", "20"))
+LOG_DEBUG_INTERVAL = float(os.getenv("LOG_DEBUG_INTERVAL", "60"))
+
+# Prometheus metrikalari: http://METRICS_HOST:METRICS_PORT/metrics (0 - o'chirilgan).
+# Bir nechta webhook worker bo'lsa, har biri METRICS_PORT + worker raqami portida
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9101"))
+
+# Jarayon ichidagi (L1) kesh: maksimal yozuvlar soni va eskirganlarni tozalash oralig'i (soniya)
+CACHE_MAX_SIZE = int(os.getenv("CACHE_MAX_SIZE", "10000"))
+CACHE_SWEEP_INTERVAL = float(os.getenv("CACHE_SWEEP_INTERVAL", "60"))
+# get_or_set_cache(stale_ttl=...): muddat tugagach yana shuncha soniya eski qiymat beriladi (fonda yangilanadi)
+CACHE_STALE_TTL = float(os.getenv("CACHE_STALE_TTL", "300"))
+# Admin paneldan o'zgarganda darhol tozalanadigan kalitlar (kategoriyalar, bellashuvlar, adminlar) muddati
+CACHE_INVALIDATED_TTL = float(os.getenv("CACHE_INVALIDATED_TTL", str(6 * 3600)))
+# Tayyor inline klaviaturalar soni (menu, parent, til, admin bo'yicha)
+KEYBOARD_CACHE_SIZE = int(os.getenv("KEYBOARD_CACHE_SIZE", "2048"))
+
+# Admin paneldagi o'zgarishlar haqidagi xabarlar: Redis kanali yoki (Redis o'chirilgan bo'lsa) spool fayl
+CACHE_INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "bot:invalidate")
+CACHE_INVALIDATION_SPOOL = os.getenv("CACHE_INVALIDATION_SPOOL", "back/cache_invalidation.jsonl")
+CACHE_INVALIDATION_POLL_INTERVAL = float(os.getenv("CACHE_INVALIDATION_POLL_INTERVAL", "2"))
 
 # Redis ishlatish yoki yo'q
 USE_REDIS = os.getenv("USE_REDIS", "false").lower() in ['true', 't', '1', 'yes', 'y']
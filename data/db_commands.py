@@ -1,12 +1,19 @@
 import sqlite3
 import traceback
 import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import List, Tuple, Dict, Any, Optional
 from uuid import uuid4
 import asyncio
 import json
 import os
+import time
+
+from data.db_pool import ConnectionPool
+from data.question_bank import QUESTION_COLUMNS
+from utils.metrics import DB_QUERY_ERRORS, DB_QUERY_SECONDS, statement_label
 
 # Django ORM-ni faqat mavjud bo'lsa ishlaydigan qilamiz
 USE_DJANGO_ORM = False
@@ -19,10 +26,10 @@ try:
     USE_DJANGO_ORM = True
     logging.info("Django ORM muvaffaqiyatli yuklandi")
 except ImportError as e:
-    logging.warning(f"Django ORM ni yuklashda xatolik yuz berdi: {e}")
+    logging.warning("Django ORM ni yuklashda xatolik yuz berdi: %s", e)
     logging.warning("SQLite to'g'ridan-to'g'ri ishlatiladi")
 except Exception as e:
-    logging.warning(f"Django ORM ni yuklashda xatolik yuz berdi: {e}")
+    logging.warning("Django ORM ni yuklashda xatolik yuz berdi: %s", e)
     logging.warning("SQLite to'g'ridan-to'g'ri ishlatiladi")
 
 # Loader va kesh funksiyalarini keyinroq import qilamiz
@@ -32,66 +39,78 @@ except Exception as e:
 # Loader va kesh funksiyalarini keyinroq import qilamiz
 # Circular import xatosidan qochish uchun
 
-def logger(statement):
-    print(f"""
---------------------------------------------------------
-Executing:
- {statement}
---------------------------------------------------------
-""")
-
-
 class DataBase:
     order_id_counter = 1010
 
-    def __init__(self, path_to_db='back/db.sqlite3'):
+    def __init__(self, path_to_db='back/db.sqlite3', max_workers: int = 4, max_pending: int = 64,
+                 pool_size: int = 8, pool_timeout: float = 30.0, pool_idle_timeout: float = 300.0,
+                 pragmas: dict = None):
         self.path_to_db = path_to_db
-        self._connection_cache = {}
+        # Barcha so'rovlar shu pool orqali o'tadi
+        self.pool = ConnectionPool(
+            path_to_db,
+            size=pool_size,
+            timeout=pool_timeout,
+            idle_timeout=pool_idle_timeout,
+            pragmas=pragmas,
+        )
 
-    # SQLite bilan ishlash metodlari
+        # Event loop'ni bloklamaslik uchun so'rovlar alohida thread pool'da bajariladi
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db')
+        self._max_pending = max_pending
+        self._semaphore = None
+
+    async def run_async(self, func, *args, **kwargs):
+        """
+        Sinxron funksiyani DataBase thread pool'ida bajarish.
+
+        Bir vaqtda max_pending tadan ortiq so'rov navbatga qo'yilmaydi,
+        qolganlari bo'sh joy paydo bo'lguncha kutadi.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_pending)
 
-    @property
-    def connection(self):
-        return sqlite3.connect(self.path_to_db)
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
 
-    def get_connection(self):
-        """Get a database connection from the connection pool"""
-        import threading
-        thread_id = threading.get_ident()
+    def pool_stats(self) -> dict:
+        """Connection pool statistikasi (kutish vaqti, bandlik va h.k.)"""
+        return self.pool.stats()
 
-        if thread_id not in self._connection_cache:
-            conn = sqlite3.connect(self.path_to_db)
-            # Enable WAL mode for better concurrency
-            conn.execute('PRAGMA journal_mode = WAL')
-            # Optimize for speed with reasonable safety
-            conn.execute('PRAGMA synchronous = NORMAL')
-            self._connection_cache[thread_id] = conn
+    def close(self):
+        """Thread pool va ochiq ulanishlarni yopish"""
+        self._executor.shutdown(wait=True)
+        self.pool.close()
 
-        return self._connection_cache[thread_id]
+    # SQLite bilan ishlash metodlari
 
     def execute(self, sql: str, parameters: tuple = None, fetchone=False, fetchall=False, commit=False):
         """Execute SQL with better error handling and connection management"""
         if not parameters:
             parameters = ()
 
+        started = time.perf_counter()
         try:
-            connection = self.get_connection()
-            cursor = connection.cursor()
-            cursor.execute(sql, parameters)
-
-            data = None
-            if commit:
-                connection.commit()
-            if fetchall:
-                data = cursor.fetchall()
-            if fetchone:
-                data = cursor.fetchone()
-
-            return data
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                cursor.execute(sql, parameters)
+
+                data = None
+                if commit:
+                    connection.commit()
+                if fetchall:
+                    data = cursor.fetchall()
+                if fetchone:
+                    data = cursor.fetchone()
+
+                DB_QUERY_SECONDS.observe(time.perf_counter() - started, statement_label(sql))
+                return data
         except sqlite3.Error as e:
-            logging.error(f"Database error: {e}")
-            logging.error(f"SQL: {sql}")
-            logging.error(f"Parameters: {parameters}")
+            DB_QUERY_ERRORS.inc(statement_label(sql))
+            logging.error("Database error: %s", e)
+            logging.error("SQL: %s", sql)
+            logging.error("Parameters: %s", parameters)
             raise
 
     # Sinxron (oddiy) metodlar
@@ -128,6 +147,61 @@ class DataBase:
         users_data = self.execute(sql, fetchall=True)
         return users_data
 
+    def count_users(self) -> int:
+        """
+        Count all users in the bot_app_user table.
+
+        :return: Number of users.
+        """
+        sql = "SELECT COUNT(*) FROM bot_app_user"
+        return self.execute(sql, fetchone=True)[0]
+
+    def count_broadcast_users(self) -> int:
+        """
+        Count users that can receive a broadcast (have a chat_id and have not blocked the bot).
+
+        :return: Number of reachable users.
+        """
+        sql = "SELECT COUNT(*) FROM bot_app_user WHERE chat_id IS NOT NULL AND is_blocked = 0"
+        return self.execute(sql, fetchone=True)[0]
+
+    def get_broadcast_page(self, after_id: int = 0, limit: int = 500):
+        """
+        Retrieve the next page of broadcast recipients ordered by primary key.
+
+        :param after_id: Last user id of the previous page (keyset pagination).
+        :param limit: Maximum number of rows to return.
+        :return: List of (id, chat_id) tuples.
+        """
+        sql = """
+            SELECT id, chat_id FROM bot_app_user
+            WHERE id > ? AND chat_id IS NOT NULL AND is_blocked = 0
+            ORDER BY id
+            LIMIT ?
+        """
+        return self.execute(sql, (after_id, limit), fetchall=True)
+
+    def mark_users_blocked(self, chat_ids: list):
+        """
+        Mark users who blocked the bot or deleted their account so broadcasts skip them.
+
+        :param chat_ids: List of chat_ids to mark.
+        """
+        if not chat_ids:
+            return
+        placeholders = ",".join("?" * len(chat_ids))
+        sql = f"UPDATE bot_app_user SET is_blocked = 1 WHERE chat_id IN ({placeholders})"
+        self.execute(sql, tuple(chat_ids), commit=True)
+
+    def unblock_user(self, chat_id: int):
+        """
+        Clear the blocked flag when a user talks to the bot again.
+
+        :param chat_id: The chat_id of the user.
+        """
+        sql = "UPDATE bot_app_user SET is_blocked = 0 WHERE chat_id = ? AND is_blocked = 1"
+        self.execute(sql, (chat_id,), commit=True)
+
     def get_root_categories(self):
         """
         Retrieve root categories from the bot_app_category table where parent_id is NULL.
@@ -170,17 +244,6 @@ class DataBase:
         categories_data = self.execute(sql, (parent_id,), fetchall=True)
         return categories_data
 
-    def get_full_subcategory_name(self, id):
-        """
-        Retrieve the subcategory name from the bot_app_battle table based on the provided id.
-
-        :param id: The id to filter categories.
-        :return: The subcategory name as a string.
-        """
-        sql = "SELECT name_uz FROM bot_app_battle WHERE id = ?"
-        result = self.execute(sql, (id,), fetchone=True)
-        return result[0] if result else None
-
     def get_test_by_battle_id(self, battle_id):
         """
         Retrieve categories from the bot_app_battle table based on the provided parent_id.
@@ -217,19 +280,8 @@ class DataBase:
             FROM bot_app_test
             WHERE battle_id = ?
         """
-        connection = self.connection
-        cursor = connection.cursor()
-        cursor.execute(sql, (battle_id,))
-        data = cursor.fetchall()
-
-        # Fetching column names from the cursor
-        columns = [column[0] for column in cursor.description]
-
-        connection.close()
-
-        # Zipping column names with data to create a list of dictionaries
-        questions = [dict(zip(columns, row)) for row in data]
-        return questions
+        data = self.execute(sql, (battle_id,), fetchall=True) or []
+        return [dict(zip(QUESTION_COLUMNS, row)) for row in data]
 
     def get_questions_by_category_id(self, category_id: int):
         """
@@ -245,19 +297,8 @@ class DataBase:
             FROM bot_app_test
             WHERE category_id = ?
         """
-        connection = self.connection
-        cursor = connection.cursor()
-        cursor.execute(sql, (category_id,))
-        data = cursor.fetchall()
-
-        # Fetching column names from the cursor
-        columns = [column[0] for column in cursor.description]
-
-        connection.close()
-
-        # Zipping column names with data to create a list of dictionaries
-        questions = [dict(zip(columns, row)) for row in data]
-        return questions
+        data = self.execute(sql, (category_id,), fetchall=True) or []
+        return [dict(zip(QUESTION_COLUMNS, row)) for row in data]
 
     def update_user_field(self, chat_id: int, key: str, value: str):
         """
@@ -270,17 +311,19 @@ class DataBase:
         sql = f"UPDATE bot_app_user SET {key} = ? WHERE chat_id = ?"
         self.execute(sql, (value, chat_id), commit=True)
 
-    def add_user(self, chat_id: int):
+    def add_user(self, chat_id: int, lang_id: int = None, first_name: str = None):
         """
         Add a new user to the bot_app_user table with the specified chat_id.
 
         :param chat_id: The chat_id of the user.
+        :param lang_id: Language of the user, if already known.
+        :param first_name: Name of the user, if already known.
         """
         sql = """
-            INSERT INTO bot_app_user(chat_id)
-            VALUES (?)
+            INSERT INTO bot_app_user(chat_id, lang_id, first_name)
+            VALUES (?, ?, ?)
         """
-        self.execute(sql, (chat_id,), commit=True)
+        self.execute(sql, (chat_id, lang_id, first_name), commit=True)
 
     def add_test_question(self, question: str, answer_a: str, answer_b: str, answer_c: str, answer_d: str,
                           battle_id: int = 2):
@@ -311,12 +354,15 @@ class DataBase:
         :param unique_id: The unique ID associated with the history entry.
         :param quiz_number: The quiz number associated with the history entry.
         :param quiz_time: The time taken for the quiz in seconds.
+        :param created_at: Preformatted creation time; started_at gets the current UTC time.
         """
         sql = """
-            INSERT INTO bot_app_history(user_id, quiz_id, unique_id, quiz_number, quiz_time, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
+            INSERT INTO bot_app_history(user_id, quiz_id, unique_id, quiz_number, quiz_time, created_at,
+                                        question_count, seconds_per_question, started_at)
+            VALUES (?, ?, ?, ?, ?, ?, CAST(? AS INTEGER), CAST(? AS INTEGER), datetime('now'))
         """
-        self.execute(sql, (user_id, quiz_id, unique_id, quiz_number, quiz_time, created_at), commit=True)
+        self.execute(sql, (user_id, quiz_id, unique_id, quiz_number, quiz_time, created_at, quiz_number, quiz_time),
+                     commit=True)
 
     def get_quiz_number_by_unique_id(self, unique_id: str):
         sql = "SELECT quiz_number FROM bot_app_history WHERE unique_id = ?"
@@ -375,6 +421,7 @@ class DataBase:
                 SELECT r.id, r.user_name, r.true_answers, r.false_answers, r.user_id, r.unique_id
                 FROM bot_app_results r
                 WHERE r.unique_id = ?
+                ORDER BY r.true_answers DESC
             """
             rows = self.execute(sql, (unique_id,), fetchall=True)
 
@@ -388,7 +435,7 @@ class DataBase:
             results = [dict(zip(column_names, row)) for row in rows]
             return results
         except Exception as e:
-            print(f"Error in get_results_by_unique_id: {e}")
+            logging.error("Error in get_results_by_unique_id: %s", e)
             return []
 
     # def get_results_by_unique_id(self, unique_id: str) -> list:
@@ -467,115 +514,65 @@ class DataBase:
 
         return None
 
+    def get_admin_chat_ids(self):
+        """
+        Retrieve chat_ids of all users listed in bot_app_setadmin.
+
+        :return: List of chat_id values.
+        """
+        sql = """
+            SELECT u.chat_id FROM bot_app_setadmin a
+            JOIN bot_app_user u ON u.id = a.user_id
+            WHERE u.chat_id IS NOT NULL
+        """
+        return [row[0] for row in self.execute(sql, fetchall=True)]
+
     # Asinxron wrapper metodlar - loader.py dagi get_cache, set_cache funksiyalarini ishlatish uchun
 
     async def get_user_by_chat_id_cached(self, chat_id: int):
         """Keshlashtirish bilan foydalanuvchini olish"""
         # loader.py dan kesh funksiyalarini import qilish
-        from loader import get_cache, set_cache, delete_cache
+        from loader import get_or_set_cache
 
-        cache_key = f"user:data:{chat_id}"
-        cached_data = await get_cache(cache_key)
-
-        if cached_data is not None:
-            return cached_data
-
-        user_data = self.get_user_by_chat_id(chat_id)
-
-        if user_data:
-            await set_cache(cache_key, user_data, ttl=600)
-
-        return user_data
+        return await get_or_set_cache(
+            f"user:data:{chat_id}",
+            functools.partial(self.run_async, self.get_user_by_chat_id, chat_id),
+            ttl=600,
+        )
 
     async def get_user_language_id_cached(self, chat_id: int):
         """Keshlashtirish bilan til ID-sini olish"""
-        # loader.py dan kesh funksiyalarini import qilish
-        from loader import get_cache, set_cache, delete_cache
-
-        cache_key = f"user:lang:{chat_id}"
-        cached_lang = await get_cache(cache_key)
-
-        if cached_lang is not None:
-            return cached_lang
-
-        lang_id = self.get_user_language_id(chat_id)
-
-        if lang_id is not None:
-            await set_cache(cache_key, lang_id, ttl=3600)
-
-        return lang_id
-
-    async def get_root_categories_cached(self):
-        """Keshlashtirish bilan ildiz kategoriyalarni olish"""
-        # loader.py dan kesh funksiyalarini import qilish
-        from loader import get_cache, set_cache, delete_cache
-
-        cache_key = "categories:root"
-        cached_categories = await get_cache(cache_key)
-
-        if cached_categories is not None:
-            return cached_categories
-
-        categories = self.get_root_categories()
-
-        if categories:
-            await set_cache(cache_key, categories, ttl=3600)
-
-        return categories
-
-    async def get_root_battle_cached(self):
-        """Keshlashtirish bilan ildiz bellashuvlarni olish"""
-        # loader.py dan kesh funksiyalarini import qilish
-        from loader import get_cache, set_cache, delete_cache
-
-        cache_key = "battles:root"
-        cached_battles = await get_cache(cache_key)
-
-        if cached_battles is not None:
-            return cached_battles
-
-        battles = self.get_root_battle()
-
-        if battles:
-            await set_cache(cache_key, battles, ttl=3600)
-
-        return battles
-
-    async def get_categories_by_parent_id_cached(self, parent_id):
-        """Keshlashtirish bilan kategoriyalarni olish"""
-        # loader.py dan kesh funksiyalarini import qilish
-        from loader import get_cache, set_cache, delete_cache
-
-        cache_key = f"categories:parent:{parent_id}"
-        cached_categories = await get_cache(cache_key)
-
-        if cached_categories is not None:
-            return cached_categories
-
-        categories = self.get_categories_by_parent_id(parent_id)
-
-        if categories:
-            await set_cache(cache_key, categories, ttl=1800)
-
-        return categories
-
-    async def get_battle_by_parent_id_cached(self, parent_id):
-        """Keshlashtirish bilan bellashuvlarni olish"""
-        # loader.py dan kesh funksiyalarini import qilish
-        from loader import get_cache, set_cache, delete_cache
-
-        cache_key = f"battles:parent:{parent_id}"
-        cached_battles = await get_cache(cache_key)
-
-        if cached_battles is not None:
-            return cached_battles
-
-        battles = self.get_battle_by_parent_id(parent_id)
-
-        if battles:
-            await set_cache(cache_key, battles, ttl=1800)
-
-        return battles
+        from loader import get_or_set_cache
+
+        return await get_or_set_cache(
+            f"user:lang:{chat_id}",
+            functools.partial(self.run_async, self.get_user_language_id, chat_id),
+            ttl=3600,
+        )
+
+    async def get_admin_chat_ids_cached(self):
+        """Keshlashtirish bilan adminlarning chat_id larini olish"""
+        from loader import get_or_set_cache
+        from data.config import CACHE_INVALIDATED_TTL
+
+        return await get_or_set_cache(
+            "admin:user_ids",
+            functools.partial(self.run_async, self.get_admin_chat_ids),
+            ttl=CACHE_INVALIDATED_TTL,
+            cache_empty=True,
+        )
+
+    async def fetch_all_setbio_data_cached(self):
+        """Keshlashtirish bilan "Biz haqimizda" matnlarini olish"""
+        from loader import get_or_set_cache
+        from data.config import CACHE_INVALIDATED_TTL, CACHE_STALE_TTL
+
+        return await get_or_set_cache(
+            "bio:all",
+            functools.partial(self.run_async, self.fetch_all_setbio_data),
+            ttl=CACHE_INVALIDATED_TTL,
+            stale_ttl=CACHE_STALE_TTL,
+        )
 
     async def update_user_field_cached(self, chat_id: int, key: str, value: str):
         """Keshni yangilash bilan foydalanuvchi maydonini yangilash"""
@@ -583,7 +580,7 @@ class DataBase:
         from loader import get_cache, set_cache, delete_cache
 
         # Bazada yangilash
-        self.update_user_field(chat_id, key, value)
+        await self.run_async(self.update_user_field, chat_id, key, value)
 
         # Keshni tozalash
         await delete_cache(f"user:data:{chat_id}")
@@ -621,7 +618,7 @@ class DataBase:
                 }
             return None
         except Exception as e:
-            print(f"Error in get_history_by_unique_id: {e}")
+            logging.error("Error in get_history_by_unique_id: %s", e)
             return None
 
     def get_quiz_id_by_unique_id(self, unique_id: str):
@@ -635,3 +632,31 @@ class DataBase:
         result = self.execute(sql, (unique_id,), fetchone=True)
         return result[0] if result else None
 
+
+class AsyncDataBase:
+    """
+    DataBase API'ning asinxron varianti.
+
+    Har bir sinxron metod DataBase thread pool'ida bajariladi, shuning uchun
+    sekin so'rov yoki WAL yozish qulfi event loop'ni to'xtatib qo'ymaydi:
+
+        lang_id = await adb.get_user_language_id(chat_id)
+
+    *_cached kabi asinxron metodlar o'zgarishsiz qaytariladi.
+    """
+
+    def __init__(self, database: DataBase):
+        self.database = database
+
+    def __getattr__(self, name):
+        attr = getattr(self.database, name)
+        if not callable(attr) or asyncio.iscoroutinefunction(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def wrapper(*args, **kwargs):
+            return await self.database.run_async(attr, *args, **kwargs)
+
+        # Keyingi murojaatlarda __getattr__ qayta ishlamasligi uchun
+        setattr(self, name, wrapper)
+        return wrapper
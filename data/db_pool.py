@@ -0,0 +1,235 @@
+import sqlite3
+import logging
+import threading
+import time
+import zlib
+from collections import deque
+from contextlib import contextmanager
+
+# Har bir yangi ulanishda bajariladigan PRAGMA sozlamalari
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',  # O'qish va yozish bir-birini bloklamasligi uchun
+    'synchronous': 'NORMAL',  # WAL bilan xavfsiz va tez
+    'busy_timeout': 5000,  # Yozish qulfi bo'shashini 5 soniya kutish
+    'mmap_size': 268435456,  # 256 MB
+    'cache_size': -16000,  # ~16 MB (manfiy qiymat = KB)
+    'temp_store': 'MEMORY',
+}
+
+
+
+def _crc32(*values):
+    """SQL: crc32(a, b, ...) - qiymatlarning nazorat yig'indisi (jadval o'zgarganini aniqlash uchun)"""
+    text = '\x1f'.join('' if value is None else str(value) for value in values)
+    return zlib.crc32(text.encode('utf-8'))
+
+
+# Har bir yangi ulanishda ro'yxatdan o'tkaziladigan SQL funksiyalari: nom -> (argumentlar soni, funksiya)
+DEFAULT_FUNCTIONS = {
+    'crc32': (-1, _crc32),
+}
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """Belgilangan vaqt ichida bo'sh ulanish topilmadi"""
+
+
+class ConnectionPool:
+    """
+    SQLite ulanishlari uchun chegaralangan pool.
+
+    - bir vaqtda `size` tadan ko'p ulanish ochilmaydi, qolganlar kutadi;
+    - `idle_timeout` dan ko'p ishlatilmagan ulanishlar yopiladi;
+    - `health_check_interval` dan keyin ulanish `SELECT 1` bilan tekshiriladi;
+    - har bir yangi ulanishga PRAGMA sozlamalari va SQL funksiyalari qo'llanadi.
+
+    Ishlatish:
+
+        with pool.connection() as conn:
+            conn.execute(...)
+    """
+
+    def __init__(self, path_to_db: str, size: int = 8, timeout: float = 30.0, idle_timeout: float = 300.0,
+                 health_check_interval: float = 30.0, pragmas: dict = None):
+        self.path_to_db = path_to_db
+        self.size = size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.pragmas = dict(DEFAULT_PRAGMAS, **(pragmas or {}))
+
+        self._lock = threading.Condition()
+        # (connection, last_used) - oxirgi ishlatilgani o'ngda
+        self._idle = deque()
+        # Ulanish oxirgi marta qachon tekshirilgani
+        self._last_checked = {}
+        self._total = 0
+        self._in_use = 0
+        self._closed = False
+
+        # Pool o'lchamini to'g'ri tanlash uchun statistika
+        self._acquired = 0
+        self._waited = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._evicted = 0
+        self._health_failures = 0
+        self._peak_in_use = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path_to_db, timeout=self.timeout, check_same_thread=False)
+        for key, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {key} = {value}")
+        for name, (arity, function) in DEFAULT_FUNCTIONS.items():
+            conn.create_function(name, arity, function, deterministic=True)
+        return conn
+
+    @staticmethod
+    def _is_healthy(conn) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _evict_idle(self, now):
+        """Uzoq vaqt ishlatilmagan ulanishlarni yopish (lock ichida chaqiriladi)"""
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            conn, _ = self._idle.popleft()
+            self._last_checked.pop(conn, None)
+            self._total -= 1
+            self._evicted += 1
+            conn.close()
+
+    def acquire(self, timeout: float = None):
+        """Pooldan ulanish olish; bo'sh ulanish bo'lmasa `timeout` soniya kutadi"""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
+
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("Connection pool is closed")
+
+                now = time.monotonic()
+                self._evict_idle(now)
+
+                if self._idle:
+                    conn, _ = self._idle.pop()
+                    last_checked = self._last_checked.get(conn, 0.0)
+                    break
+                if self._total < self.size:
+                    # Joyni band qilib, ulanishni lock'dan tashqarida ochamiz
+                    self._total += 1
+                    conn, last_checked = None, now
+                    break
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"No free connection in pool after {timeout:.1f}s (size={self.size})")
+                waited = True
+                self._lock.wait(remaining)
+
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+
+        try:
+            if conn is not None and time.monotonic() - last_checked > self.health_check_interval:
+                if self._is_healthy(conn):
+                    last_checked = time.monotonic()
+                else:
+                    with self._lock:
+                        self._health_failures += 1
+                        self._last_checked.pop(conn, None)
+                    conn.close()
+                    conn = None
+            if conn is None:
+                conn = self._connect()
+                last_checked = time.monotonic()
+                with self._lock:
+                    self._created += 1
+        except Exception:
+            with self._lock:
+                self._total -= 1
+                self._in_use -= 1
+                self._lock.notify()
+            raise
+
+        wait_time = time.monotonic() - started
+        with self._lock:
+            self._last_checked[conn] = last_checked
+            self._acquired += 1
+            self._wait_time_total += wait_time
+            self._wait_time_max = max(self._wait_time_max, wait_time)
+            if waited:
+                self._waited += 1
+
+        return conn
+
+    def release(self, conn, discard: bool = False):
+        """Ulanishni poolga qaytarish; `discard=True` bo'lsa ulanish yopiladi"""
+        if not discard and conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                discard = True
+
+        with self._lock:
+            self._in_use -= 1
+            if discard or self._closed:
+                self._last_checked.pop(conn, None)
+                self._total -= 1
+                conn.close()
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self, timeout: float = None):
+        conn = self.acquire(timeout)
+        discard = False
+        try:
+            yield conn
+        except sqlite3.DatabaseError as e:
+            # Buzilgan ulanishni qayta ishlatmaymiz (qulf yoki constraint xatolari bundan mustasno)
+            discard = not isinstance(e, (sqlite3.OperationalError, sqlite3.IntegrityError))
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def stats(self) -> dict:
+        """Pool holati va kutish vaqtlari statistikasi"""
+        with self._lock:
+            return {
+                'size': self.size,
+                'open': self._total,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'peak_in_use': self._peak_in_use,
+                'utilisation': self._in_use / self.size if self.size else 0.0,
+                'acquired': self._acquired,
+                'waited': self._waited,
+                'timeouts': self._timeouts,
+                'wait_time_avg': self._wait_time_total / self._acquired if self._acquired else 0.0,
+                'wait_time_max': self._wait_time_max,
+                'created': self._created,
+                'evicted': self._evicted,
+                'health_failures': self._health_failures,
+            }
+
+    def close(self):
+        """Barcha bo'sh ulanishlarni yopish; band ulanishlar qaytarilganda yopiladi"""
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.popleft()
+                self._last_checked.pop(conn, None)
+                self._total -= 1
+                conn.close()
+            self._lock.notify_all()
+        logging.info("SQLite connection pool yopildi")
@@ -0,0 +1,221 @@
+import asyncio
+import logging
+import random
+import sys
+import threading
+from array import array
+from collections import defaultdict
+
+# Savol matni ustunlari (bot_app_test dagi tartibda)
+QUESTION_COLUMNS = ('question', 'answer_a', 'answer_b', 'answer_c', 'answer_d')
+
+_SELECT_ROWS = """
+    SELECT id, battle_id, category_id, question, answer_a, answer_b, answer_c, answer_d
+    FROM bot_app_test
+"""
+
+# Guruh (battle_id, category_id) bo'yicha o'zgarishni aniqlash uchun "barmoq izi". Qator matnining
+# nazorat yig'indisi (id bilan) uzunligi o'zgarmagan tahrirni ham, javoblar almashtirilishini ham sezadi
+_SELECT_FINGERPRINTS = """
+    SELECT battle_id, category_id, COUNT(*), MAX(id),
+           TOTAL(crc32(id, question, answer_a, answer_b, answer_c, answer_d))
+    FROM bot_app_test
+    GROUP BY battle_id, category_id
+"""
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class _Snapshot:
+    """Savollar bankining o'zgarmas holati; yangilanganda butunlay almashtiriladi"""
+
+    __slots__ = ('rows', 'groups', 'by_battle', 'by_category', 'fingerprints')
+
+    def __init__(self, rows, groups, fingerprints):
+        self.rows = rows  # id -> (question, answer_a, answer_b, answer_c, answer_d)
+        self.groups = groups  # (battle_id, category_id) -> array('q') id lar
+        self.fingerprints = fingerprints
+        self.by_battle = {}
+        self.by_category = {}
+        self._index(set(b for b, _ in groups), set(c for _, c in groups))
+
+    def _index(self, battle_ids, category_ids):
+        by_battle = defaultdict(list)
+        by_category = defaultdict(list)
+        for (battle_id, category_id), ids in self.groups.items():
+            if battle_id in battle_ids:
+                by_battle[battle_id].append(ids)
+            if category_id in category_ids:
+                by_category[category_id].append(ids)
+
+        for battle_id in battle_ids:
+            self.by_battle.pop(battle_id, None)
+        for category_id in category_ids:
+            self.by_category.pop(category_id, None)
+
+        for battle_id, parts in by_battle.items():
+            if battle_id is not None:
+                self.by_battle[battle_id] = parts[0] if len(parts) == 1 else array('q', [i for p in parts for i in p])
+        for category_id, parts in by_category.items():
+            if category_id is not None:
+                self.by_category[category_id] = parts[0] if len(parts) == 1 else array('q', [i for p in parts for i in p])
+
+
+class QuestionBank:
+    """
+    bot_app_test jadvalining xotiradagi nusxasi.
+
+    Savollar battle_id va category_id bo'yicha indekslanadi, shuning uchun
+    quiz boshlanganda jadvalga so'rov yuborilmaydi va k ta savolni tanlash
+    jadval hajmiga emas, k ga bog'liq bo'ladi.
+
+    Bank bir marta yuklanadi, keyin `refresh()` faqat o'zgargan
+    (battle_id, category_id) guruhlarini qayta o'qiydi. Admin panelda
+    qilingan o'zgarishlar uchun `invalidate()` chaqirish ham mumkin.
+    """
+
+    def __init__(self, database):
+        self.database = database
+        self._snapshot = None
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    def _read_fingerprints(self):
+        rows = self.database.execute(_SELECT_FINGERPRINTS, fetchall=True) or []
+        return {(battle_id, category_id): tuple(rest) for battle_id, category_id, *rest in rows}
+
+    @staticmethod
+    def _build_groups(rows):
+        data = {}
+        groups = defaultdict(lambda: array('q'))
+        for row_id, battle_id, category_id, *columns in rows:
+            data[row_id] = tuple(_intern(value) for value in columns)
+            groups[(battle_id, category_id)].append(row_id)
+        return data, dict(groups)
+
+    def load(self):
+        """Butun jadvalni o'qib, bankni noldan qurish"""
+        with self._refresh_lock:
+            fingerprints = self._read_fingerprints()
+            rows = self.database.execute(_SELECT_ROWS + " ORDER BY id", fetchall=True) or []
+            data, groups = self._build_groups(rows)
+            self._snapshot = _Snapshot(data, groups, fingerprints)
+        logging.info("Savollar banki yuklandi: %s ta savol, %s ta guruh", len(data), len(groups))
+
+    def ensure_loaded(self):
+        if self._snapshot is None:
+            self.load()
+
+    def _reload_groups(self, keys):
+        """Berilgan (battle_id, category_id) guruhlarini bazadan qayta o'qib, yangi snapshot yaratish"""
+        old = self._snapshot
+        fingerprints = self._read_fingerprints()
+
+        rows = []
+        for battle_id, category_id in keys:
+            rows.extend(self.database.execute(
+                _SELECT_ROWS + " WHERE battle_id IS ? AND category_id IS ? ORDER BY id",
+                (battle_id, category_id),
+                fetchall=True,
+            ) or [])
+        fresh_data, fresh_groups = self._build_groups(rows)
+
+        data = dict(old.rows)
+        groups = dict(old.groups)
+        for key in keys:
+            for row_id in groups.pop(key, ()):
+                data.pop(row_id, None)
+        data.update(fresh_data)
+        groups.update(fresh_groups)
+
+        snapshot = _Snapshot.__new__(_Snapshot)
+        snapshot.rows = data
+        snapshot.groups = groups
+        snapshot.fingerprints = fingerprints
+        snapshot.by_battle = dict(old.by_battle)
+        snapshot.by_category = dict(old.by_category)
+        snapshot._index(set(b for b, _ in keys), set(c for _, c in keys))
+        self._snapshot = snapshot
+
+    def refresh(self) -> int:
+        """
+        O'zgargan guruhlarni topib, faqat ularni qayta yuklash.
+
+        :return: Qayta yuklangan guruhlar soni.
+        """
+        if self._snapshot is None:
+            self.load()
+            return 0
+
+        with self._refresh_lock:
+            current = self._read_fingerprints()
+            old = self._snapshot.fingerprints
+            changed = [key for key in set(current) | set(old) if current.get(key) != old.get(key)]
+            if changed:
+                self._reload_groups(changed)
+                logging.info("Savollar banki yangilandi: %s ta guruh", len(changed))
+        return len(changed)
+
+    def invalidate(self, battle_id=None, category_id=None):
+        """Berilgan bellashuv yoki kategoriyaga tegishli guruhlarni darhol qayta yuklash"""
+        if self._snapshot is None:
+            return
+        with self._refresh_lock:
+            keys = set(key for key in self._snapshot.groups
+                       if (battle_id is not None and key[0] == battle_id)
+                       or (category_id is not None and key[1] == category_id))
+            # Yangi qo'shilgan guruhlar fingerprint orqali topiladi
+            for key in self._read_fingerprints():
+                if (battle_id is not None and key[0] == battle_id) or \
+                        (category_id is not None and key[1] == category_id):
+                    keys.add(key)
+            if keys:
+                self._reload_groups(keys)
+
+    async def run_refresher(self, interval: float = 60.0):
+        """Bankni fon rejimida vaqti-vaqti bilan yangilab turish"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.database.run_async(self.refresh)
+            except Exception as e:
+                logging.error("Savollar bankini yangilashda xato: %s", e)
+
+    def _ids(self, battle_id=None, category_id=None):
+        self.ensure_loaded()
+        snapshot = self._snapshot
+        if battle_id is not None:
+            return snapshot, snapshot.by_battle.get(int(battle_id), ())
+        return snapshot, snapshot.by_category.get(int(category_id), ())
+
+    def count(self, battle_id=None, category_id=None) -> int:
+        return len(self._ids(battle_id, category_id)[1])
+
+    def ids(self, battle_id=None, category_id=None) -> list:
+        """Bellashuv yoki kategoriyadagi barcha savol ID lari (bazadagi tartibda)"""
+        return sorted(self._ids(battle_id, category_id)[1])
+
+    def sample_ids(self, k: int, battle_id=None, category_id=None) -> list:
+        """k ta tasodifiy savol ID si (tartibi ham tasodifiy)"""
+        _, ids = self._ids(battle_id, category_id)
+        return random.sample(ids, min(k, len(ids)))
+
+    def get(self, question_id: int):
+        """Savolni {'question': ..., 'answer_a': ...} ko'rinishida olish"""
+        self.ensure_loaded()
+        row = self._snapshot.rows.get(question_id)
+        return dict(zip(QUESTION_COLUMNS, row)) if row is not None else None
+
+    def get_many(self, question_ids) -> list:
+        self.ensure_loaded()
+        rows = self._snapshot.rows
+        return [dict(zip(QUESTION_COLUMNS, rows[qid])) for qid in question_ids if qid in rows]
+
+    def sample(self, k: int, battle_id=None, category_id=None) -> list:
+        """k ta tasodifiy savol (get_questions_by_battle_id bilan bir xil formatda)"""
+        return self.get_many(self.sample_ids(k, battle_id=battle_id, category_id=category_id))
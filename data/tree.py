@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import threading
+
+# Jadval qatorlari `SELECT *` tartibida qaytariladi (menyular va eski kod shu shaklni kutadi)
+_SELECT_NODES = "SELECT id, name_uz, name_ru, name_en, parent_id FROM {table} ORDER BY id"
+# Savoli bor tugunlar (test_battle_category_idx va category_id indeksi bo'yicha)
+_SELECT_WITH_TESTS = "SELECT DISTINCT {column} FROM bot_app_test WHERE {column} IS NOT NULL"
+# Daraxt o'zgarganini aniqlash uchun "barmoq izi": nomlar uzunligi saqlangan tahrir ham seziladi
+_SELECT_FINGERPRINT = """
+    SELECT COUNT(*), MAX(id), TOTAL(crc32(id, parent_id, name_uz, name_ru, name_en))
+    FROM {table}
+"""
+_SELECT_TESTS_FINGERPRINT = "SELECT COUNT(*), MAX(id), TOTAL(battle_id), TOTAL(category_id) FROM bot_app_test"
+
+
+class Node:
+    """Daraxtning bitta tuguni"""
+
+    __slots__ = ('id', 'name_uz', 'name_ru', 'name_en', 'parent_id', 'depth', 'has_tests', 'row', 'children')
+
+    def __init__(self, row, has_tests):
+        self.id, self.name_uz, self.name_ru, self.name_en, self.parent_id = row
+        self.row = tuple(row)
+        self.has_tests = has_tests
+        self.depth = 0
+        # Bolalar qatorlari; bitta snapshot ichida shu ro'yxat obyekti o'zgarmaydi
+        self.children = ()
+
+    @property
+    def is_leaf(self) -> bool:
+        return not self.children
+
+    def name(self, lang_id: int = 1):
+        return self.name_uz if lang_id == 1 or not self.name_ru else self.name_ru
+
+
+class Tree:
+    """
+    Bitta ierarxiyaning (bot_app_category yoki bot_app_battle) o'zgarmas nusxasi.
+
+    `roots()` va `children()` SELECT * qatorlari ko'rinishidagi kortejlarni
+    qaytaradi - bitta snapshot ichida har doim o'sha obyekt, shuning uchun
+    keyboard_cache klaviaturani faqat daraxt almashtirilganda qayta quradi.
+    """
+
+    __slots__ = ('nodes', 'roots_rows')
+
+    def __init__(self, rows, with_tests):
+        self.nodes = {row[0]: Node(row, row[0] in with_tests) for row in rows}
+
+        children = {}
+        roots = []
+        for node in self.nodes.values():
+            parent = self.nodes.get(node.parent_id)
+            if parent is None:
+                # parent_id NULL (yoki ota o'chirilgan) - ildiz
+                roots.append(node.row)
+            else:
+                children.setdefault(parent.id, []).append(node.row)
+        for parent_id, rows in children.items():
+            self.nodes[parent_id].children = tuple(rows)
+        self.roots_rows = tuple(roots)
+
+        # Chuqurlik ildizdan pastga qarab bir marta hisoblanadi
+        stack = [(row[0], 0) for row in roots]
+        while stack:
+            node_id, depth = stack.pop()
+            node = self.nodes[node_id]
+            node.depth = depth
+            stack.extend((row[0], depth + 1) for row in node.children)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def node(self, node_id):
+        return self.nodes.get(node_id)
+
+    def roots(self):
+        return self.roots_rows
+
+    def children(self, parent_id):
+        node = self.nodes.get(parent_id)
+        return node.children if node is not None else ()
+
+    def parent(self, node_id):
+        node = self.nodes.get(node_id)
+        return self.nodes.get(node.parent_id) if node is not None else None
+
+    def path(self, node_id) -> list:
+        """Ildizdan tugungacha bo'lgan tugunlar"""
+        path = []
+        node = self.nodes.get(node_id)
+        while node is not None:
+            path.append(node)
+            node = self.nodes.get(node.parent_id)
+        path.reverse()
+        return path
+
+
+class _Snapshot:
+    __slots__ = ('categories', 'battles', 'fingerprint')
+
+    def __init__(self, categories, battles, fingerprint):
+        self.categories = categories
+        self.battles = battles
+        self.fingerprint = fingerprint
+
+
+class CategoryTree:
+    """
+    Kategoriya va bellashuv daraxtlarining xotiradagi nusxasi.
+
+    Ishga tushishda bir marta yuklanadi: bolalar ro'yxatlari, ota tugun,
+    chuqurlik, nomlar va "savoli bor" belgisi tayyor holda saqlanadi, shuning
+    uchun menyu handler'lari bazaga murojaat qilmaydi. Admin paneldagi
+    o'zgarishda (`reload()`) yoki barmoq izi o'zgarganda (`run_refresher`)
+    yangi snapshot quriladi va bitta o'zlashtirish bilan almashtiriladi -
+    o'qiyotgan handler eski yoki yangi daraxtni to'liq ko'radi.
+
+        category_tree.battles.children(parent_id)
+    """
+
+    def __init__(self, database):
+        self.database = database
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def categories(self) -> Tree:
+        self.ensure_loaded()
+        return self._snapshot.categories
+
+    @property
+    def battles(self) -> Tree:
+        self.ensure_loaded()
+        return self._snapshot.battles
+
+    def _read_fingerprint(self):
+        execute = self.database.execute
+        return (
+            execute(_SELECT_FINGERPRINT.format(table='bot_app_category'), fetchone=True),
+            execute(_SELECT_FINGERPRINT.format(table='bot_app_battle'), fetchone=True),
+            execute(_SELECT_TESTS_FINGERPRINT, fetchone=True),
+        )
+
+    def _build(self, table, column):
+        rows = self.database.execute(_SELECT_NODES.format(table=table), fetchall=True) or []
+        with_tests = self.database.execute(_SELECT_WITH_TESTS.format(column=column), fetchall=True) or []
+        return Tree(rows, {row[0] for row in with_tests})
+
+    def load(self):
+        """Ikkala daraxtni bazadan o'qib, snapshot'ni almashtirish"""
+        with self._lock:
+            fingerprint = self._read_fingerprint()
+            snapshot = _Snapshot(
+                self._build('bot_app_category', 'category_id'),
+                self._build('bot_app_battle', 'battle_id'),
+                fingerprint,
+            )
+            self._snapshot = snapshot
+            self.reloads += 1
+        logging.info("Kategoriyalar daraxti yuklandi: %s ta kategoriya, %s ta bellashuv",
+                     len(snapshot.categories), len(snapshot.battles))
+
+    def ensure_loaded(self):
+        if self._snapshot is None:
+            self.load()
+
+    def refresh(self) -> bool:
+        """Barmoq izi o'zgargan bo'lsa daraxtni qayta yuklash"""
+        if self._snapshot is None:
+            self.load()
+            return True
+        if self._read_fingerprint() == self._snapshot.fingerprint:
+            return False
+        self.load()
+        return True
+
+    async def reload(self):
+        """Admin paneldagi o'zgarishdan keyin daraxtni qayta yuklash (CacheInvalidator chaqiradi)"""
+        await self.database.run_async(self.load)
+
+    async def run_refresher(self, interval: float = 60.0):
+        """Daraxtni fon rejimida vaqti-vaqti bilan tekshirib turish"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.database.run_async(self.refresh)
+            except Exception as e:
+                logging.error("Kategoriyalar daraxtini yangilashda xato: %s", e)
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            'categories': len(snapshot.categories) if snapshot else 0,
+            'battles': len(snapshot.battles) if snapshot else 0,
+            'reloads': self.reloads,
+        }
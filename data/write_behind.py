@@ -0,0 +1,309 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import deque
+
+from data.db_pool import PoolTimeout
+from utils.metrics import (
+    DB_QUERY_ERRORS, DB_QUERY_SECONDS, WRITE_BEHIND_DROPPED, WRITE_BEHIND_FULL_WAIT_SECONDS, WRITE_BEHIND_RETRIES,
+    WRITE_BEHIND_SPOOLED, statement_label,
+)
+
+logger = logging.getLogger('write_behind')
+
+# Navbatdagi yozuv turlari. History qatorlari darhol o'qiladi (taklif havolasi tekshiruvi),
+# shuning uchun ular navbatga qo'yilmaydi - DataBase.add_history_entry bilan yoziladi
+RESULT = 'result'
+USER_FIELD = 'user_field'
+
+# Natija foydalanuvchi id si bilan yoziladi: chat_id bo'yicha topish INSERT ichida
+# (bazada yo'q foydalanuvchi uchun qator qo'shilmaydi - avvalgi add_results_entry kabi)
+_RESULT_SQL = """
+    INSERT INTO bot_app_results (user_id, unique_id, true_answers, false_answers, user_name)
+    SELECT id, ?, ?, ?, ? FROM bot_app_user WHERE chat_id = ?
+"""
+
+
+def _executemany(connection, sql, rows):
+    """executemany, DataBase.execute kabi bot_db_query_seconds ga yoziladi (bitta to'plam - bitta so'rov)"""
+    label = statement_label(sql)
+    started = time.perf_counter()
+    try:
+        connection.executemany(sql, rows)
+    except sqlite3.Error:
+        DB_QUERY_ERRORS.inc(label)
+        raise
+    DB_QUERY_SECONDS.observe(time.perf_counter() - started, label)
+
+
+def _is_busy(error) -> bool:
+    """Baza vaqtincha band (qayta urinish mumkin), yozuvning o'zida xato emas"""
+    if isinstance(error, PoolTimeout):
+        return True
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+
+class WriteBehindQueue:
+    """
+    Quiz natijalari va foydalanuvchi maydonlarini guruhlab yozish.
+
+    Faqat darhol qayta o'qilmaydigan yozuvlar uchun: navbatdagi yozuv keyingi
+    flush'gacha (yoki baza band bo'lsa undan ham keyin) bazada ko'rinmaydi.
+
+    Har bir yozuv uchun alohida tranzaksiya (va fsync) o'rniga yozuvlar
+    navbatga qo'yiladi va `max_batch` taga yetganda yoki har `flush_interval`
+    soniyada bitta tranzaksiyada `executemany` bilan yoziladi. 300 kishilik
+    xona bir vaqtda tugasa ham SQLite yozish qulfi bir necha marta olinadi.
+
+    - navbatda `max_pending` tadan ko'p yozuv bo'lsa, yozuvchi joy bo'shashini
+      kutadi (back-pressure, `stats()` da hisoblanadi);
+    - bitta foydalanuvchi maydoniga bir nechta yangilash bo'lsa, oxirgisi yoziladi;
+    - baza band bo'lsa (`database is locked`) to'plam navbatga qaytariladi,
+      boshqa xatoda yozuvlar birma-bir yoziladi va buzilganlari tashlab yuboriladi;
+    - `stop()` navbatni oxirigacha yozadi; yozib bo'lmaganlari `spool_path`
+      fayliga tushadi va keyingi `start()` da qayta yoziladi.
+
+    Jarayon to'satdan o'ldirilsa, oxirgi `flush_interval` ichidagi yozuvlar yo'qolishi mumkin.
+    Navbat ishga tushirilmagan bo'lsa (`start()` chaqirilmagan), yozuvlar darhol yoziladi.
+    """
+
+    def __init__(self, db, max_batch: int = 500, flush_interval: float = 0.5, max_pending: int = 10000,
+                 spool_path: str = 'data/write_behind.jsonl'):
+        self.db = db
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.spool_path = spool_path
+
+        self._items = deque()
+        self._task = None
+        self._wakeup = None
+        self._space = None
+        self._flush_lock = None
+
+        self._enqueued = 0
+        self._written = 0
+        self._batches = 0
+        self._max_batch_seen = 0
+        self._flush_time_total = 0.0
+        self._flush_time_max = 0.0
+        self._full_waits = 0
+        self._full_wait_time = 0.0
+        self._retries = 0
+        self._dropped = 0
+        self._spooled = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    # Navbatga qo'yish
+
+    async def add_result(self, chat_id, unique_id, true_answers, false_answers, user_name):
+        """bot_app_results ga yozuv (DataBase.add_results_entry kabi)"""
+        await self._put(RESULT, (unique_id, true_answers, false_answers, user_name or "unknown", chat_id))
+
+    async def update_user_field(self, chat_id, key, value):
+        """bot_app_user maydonini yangilash (DataBase.update_user_field kabi)"""
+        if not key.isidentifier():
+            raise ValueError(f"Noto'g'ri maydon nomi: {key!r}")
+        await self._put(USER_FIELD, (chat_id, key, value))
+
+    async def _put(self, kind, params):
+        self._enqueued += 1
+        if not self.running:
+            await self.db.run_async(self._write, [(kind, params)])
+            return
+
+        if len(self._items) >= self.max_pending:
+            self._full_waits += 1
+            started = time.monotonic()
+            async with self._space:
+                await self._space.wait_for(lambda: len(self._items) < self.max_pending)
+            waited = time.monotonic() - started
+            self._full_wait_time += waited
+            WRITE_BEHIND_FULL_WAIT_SECONDS.observe(waited)
+
+        self._items.append((kind, params))
+        if len(self._items) >= self.max_batch:
+            self._wakeup.set()
+
+    # Yozish (DataBase thread pool'ida)
+
+    def _write(self, batch):
+        results, fields = [], {}
+        for kind, params in batch:
+            if kind == RESULT:
+                results.append(params)
+            elif kind == USER_FIELD:
+                chat_id, key, value = params
+                # Bir foydalanuvchi maydoniga oxirgi qiymat yoziladi
+                fields.setdefault(key, {})[chat_id] = value
+
+        with self.db.pool.connection() as connection:
+            try:
+                if results:
+                    _executemany(connection, _RESULT_SQL, results)
+                for key, values in fields.items():
+                    _executemany(
+                        connection,
+                        f"UPDATE bot_app_user SET {key} = ? WHERE chat_id = ?",
+                        [(value, chat_id) for chat_id, value in values.items()],
+                    )
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+
+    def _write_one_by_one(self, batch):
+        """
+        Buzilgan yozuvni ajratish uchun to'plamni birma-bir yozish.
+
+        :return: (yozilganlar soni, baza band bo'lgani uchun yozilmay qolganlar)
+        """
+        written = 0
+        for index, item in enumerate(batch):
+            try:
+                self._write([item])
+                written += 1
+            except Exception as e:
+                if _is_busy(e):
+                    return written, batch[index:]
+                self._dropped += 1
+                WRITE_BEHIND_DROPPED.inc()
+                logger.error("Yozuv tashlab yuborildi %s: %s", item, e)
+        return written, []
+
+    async def flush(self):
+        """Navbatdagi barcha yozuvlarni yozish"""
+        async with self._flush_lock:
+            while self._items:
+                batch = [self._items.popleft() for _ in range(min(self.max_batch, len(self._items)))]
+                started = time.monotonic()
+                remaining = []
+                try:
+                    await self.db.run_async(self._write, batch)
+                    written = len(batch)
+                except Exception as e:
+                    if _is_busy(e):
+                        written, remaining = 0, batch
+                    else:
+                        logger.error("Write-behind to'plami yozilmadi, birma-bir yozilmoqda: %s", e)
+                        written, remaining = await self.db.run_async(self._write_one_by_one, batch)
+
+                if remaining:
+                    # Baza band - qolgan yozuvlar navbat boshiga qaytadi va keyingi safar yoziladi
+                    self._items.extendleft(reversed(remaining))
+                    self._retries += 1
+                    WRITE_BEHIND_RETRIES.inc()
+                    logger.warning("Write-behind: baza band, %s ta yozuv keyinroq yoziladi", len(remaining))
+
+                elapsed = time.monotonic() - started
+                self._batches += 1
+                self._written += written
+                self._max_batch_seen = max(self._max_batch_seen, len(batch))
+                self._flush_time_total += elapsed
+                self._flush_time_max = max(self._flush_time_max, elapsed)
+                async with self._space:
+                    self._space.notify_all()
+                if remaining:
+                    raise sqlite3.OperationalError("database is locked")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                await asyncio.sleep(self.flush_interval)
+
+    # Ishga tushirish va to'xtatish
+
+    def _load_spool(self):
+        if not os.path.exists(self.spool_path):
+            return []
+        items = []
+        with open(self.spool_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    kind, params = json.loads(line)
+                    items.append((kind, tuple(params)))
+                except (TypeError, ValueError):
+                    logger.warning("Write-behind spool faylidagi buzilgan qator: %r", line)
+        os.remove(self.spool_path)
+        return items
+
+    def _save_spool(self, items):
+        with open(self.spool_path, 'a', encoding='utf-8') as f:
+            for kind, params in items:
+                f.write(json.dumps([kind, list(params)], ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def start(self):
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Condition()
+        self._flush_lock = asyncio.Lock()
+
+        # Oldingi ishga tushishda yozib bo'lmagan yozuvlar
+        spooled = self._load_spool()
+        if spooled:
+            logger.info("Write-behind: spool fayldan %s ta yozuv tiklandi", len(spooled))
+            self._items.extendleft(reversed(spooled))
+            self._wakeup.set()
+
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Navbatni oxirigacha yozish; yozib bo'lmagan yozuvlarni spool faylga saqlash"""
+        if self._task is None:
+            return
+        # Yozilayotgan to'plam tugashi kutiladi: flush() o'rtasida bekor qilinsa, navbatdan
+        # olingan to'plam hech qayerda qolmaydi (na qayta urinish, na spool)
+        async with self._flush_lock:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error("Write-behind navbatini yozib bo'lmadi: %s", e)
+        if self._items:
+            self._spooled += len(self._items)
+            WRITE_BEHIND_SPOOLED.inc(amount=len(self._items))
+            self._save_spool(list(self._items))
+            logger.warning("Write-behind: %s ta yozuv '%s' fayliga saqlandi", len(self._items), self.spool_path)
+            self._items.clear()
+
+    def stats(self) -> dict:
+        return {
+            'pending': len(self._items),
+            'enqueued': self._enqueued,
+            'written': self._written,
+            'batches': self._batches,
+            'avg_batch': round(self._written / self._batches, 1) if self._batches else 0,
+            'max_batch': self._max_batch_seen,
+            'flush_time_avg': round(self._flush_time_total / self._batches, 4) if self._batches else 0,
+            'flush_time_max': round(self._flush_time_max, 4),
+            'full_waits': self._full_waits,
+            'full_wait_time': round(self._full_wait_time, 3),
+            'retries': self._retries,
+            'dropped': self._dropped,
+            'spooled': self._spooled,
+        }
@@ -38,21 +38,21 @@ async def errors_handler(update, exception):
         return True
 
     if isinstance(exception, Unauthorized):
-        logging.exception(f'Unauthorized: {exception}')
+        logging.exception("Unauthorized: %s", exception)
         return True
 
     if isinstance(exception, InvalidQueryID):
-        logging.exception(f'InvalidQueryID: {exception} \nUpdate: {update}')
+        logging.exception("InvalidQueryID: %s \nUpdate: %s", exception, update)
         return True
 
     if isinstance(exception, TelegramAPIError):
-        logging.exception(f'TelegramAPIError: {exception} \nUpdate: {update}')
+        logging.exception("TelegramAPIError: %s \nUpdate: %s", exception, update)
         return True
     if isinstance(exception, RetryAfter):
-        logging.exception(f'RetryAfter: {exception} \nUpdate: {update}')
+        logging.exception("RetryAfter: %s \nUpdate: %s", exception, update)
         return True
     if isinstance(exception, CantParseEntities):
-        logging.exception(f'CantParseEntities: {exception} \nUpdate: {update}')
+        logging.exception("CantParseEntities: %s \nUpdate: %s", exception, update)
         return True
     
-    logging.exception(f'Update: {update} \n{exception}')
+    logging.exception("Update: %s \n%s", update, exception)
@@ -1,6 +1,6 @@
 from aiogram import types
 from aiogram.dispatcher import FSMContext
-from loader import bot, db, dp
+from loader import adb, dp, broadcaster
 from states.userStates import AdminBroadcast
 
 @dp.message_handler(text='All users')
@@ -9,11 +9,8 @@ async def cmd_all_users(message: types.Message):
     is_admin = await check_admin(message.from_user.id)
 
     if is_admin:
-        # Get all users from the database
-        all_users = db.get_all_users()
-
-        # Calculate the count of users
-        users_count = len(all_users)
+        # Count users without loading the whole table
+        users_count = await adb.count_users()
 
         # Send the user count to the admin
         await message.answer(f"Userlar soni: {users_count}")
@@ -38,28 +35,18 @@ async def cmd_broadcast(message: types.Message):
         await message.answer("Siz admin huquqlariga ega emasiz")
 
 
-@dp.message_handler(state=AdminBroadcast.BROADCAST)
+@dp.message_handler(state=AdminBroadcast.BROADCAST, content_types=types.ContentType.ANY)
 async def process_broadcast(message: types.Message, state: FSMContext):
-    # Get the broadcast message from the admin
-    broadcast_message = message.text
-
-    # Get all users from the database
-    all_users = db.get_all_users()
-
-    # Send the broadcast message to all users
-    for user in all_users:
-
-        try:
-            # Send the message to each user
-            await bot.send_message(user[3], broadcast_message)
-        except Exception as e:
-            # Handle errors (e.g., log the error)
-            print(f"Error sending broadcast message to user {user[3]}: {e}")
-
-    # Notify the admin that the broadcast is complete
-    await message.answer("Habaringiz barcha userlarga bordi!")
-
-    # Reset the state
+    # The message is copied as is, so text, photos, videos and documents all work
+    started = await broadcaster.start(
+        admin_id=message.from_user.id,
+        from_chat_id=message.chat.id,
+        message_id=message.message_id,
+    )
+    if not started:
+        await message.answer("Oldingi xabar hali tarqatilmoqda, iltimos kuting.")
+
+    # Reset the state; the broadcast keeps running in the background
     await state.finish()
 
 
@@ -8,7 +8,8 @@ import logging
 from handlers.users import texts
 from handlers.users.texts import BTN_ABOUT_US, BTN_SETTINGS, TEXT_MAIN_MENU, \
     KORZINKA, BTN_BOOK, BTN_BATTLE, BTN_INFO
-from loader import dp, db, bot, get_cache, set_cache, delete_cache
+from data.config import CACHE_INVALIDATED_TTL
+from loader import dp, adb, bot, outbound, write_behind, get_cache, set_cache, delete_cache
 from states.userStates import UserStates, QuizStates
 import asyncio
 
@@ -23,13 +24,13 @@ async def cmd_start(message: types.Message, state: FSMContext):
         start_args = message.get_args()
 
         # Debug uchun
-        logging.debug(f"Start command received with args: {start_args}")
+        logging.debug("Start command received with args: %s", start_args)
 
         # Deep link parametrlari mavjud bo'lsa
         if start_args:
             # Parametrlarni ajratish
             args = start_args.split('_')
-            logging.debug(f"Split args: {args}")
+            logging.debug("Split args: %s", args)
 
             # Quiz deep link strukturasini tekshirish
             if len(args) >= 8 and args[1] == "quiz" and args[4] == "number" and args[6] == "time":
@@ -43,14 +44,14 @@ async def cmd_start(message: types.Message, state: FSMContext):
                 quiz_time = args[7]
 
                 # Debug uchun
-                logging.debug(f"Parsed quiz parameters: owner_id={owner_id}, quiz_id={quiz_id}, "
-                              f"unique_id={unique_id}, quiz_number={quiz_number}, quiz_time={quiz_time}")
+                logging.debug("Parsed quiz parameters: owner_id=%s, quiz_id=%s, unique_id=%s, quiz_number=%s, "
+                              "quiz_time=%s", owner_id, quiz_id, unique_id, quiz_number, quiz_time)
 
                 # Yaroqliliik tekshirish
                 current_time = datetime.now()
-                created_at = db.get_created_at_by_unique_id(unique_id)
+                created_at = await adb.get_created_at_by_unique_id(unique_id)
 
-                logging.debug(f"Created at time for unique_id {unique_id}: {created_at}")
+                logging.debug("Created at time for unique_id %s: %s", unique_id, created_at)
 
                 if created_at:
                     # 'MM-DD-YYYY HH:MM' formatidagi vaqtni parse qilish
@@ -60,11 +61,11 @@ async def cmd_start(message: types.Message, state: FSMContext):
                             await message.answer("Bu havola muddati tugagan.")
                             return
                     except ValueError as e:
-                        logging.error(f"Error parsing created_at time: {e}")
+                        logging.error("Error parsing created_at time: %s", e)
                         await message.answer("Xatolik yuz berdi. Vaqt formatini o'qishda muammo.")
                         return
                 else:
-                    logging.warning(f"No created_at time found for unique_id {unique_id}")
+                    logging.warning("No created_at time found for unique_id %s", unique_id)
                     await message.answer("Xatolik yuz berdi. Ma'lumotlarni olishda xatolik.")
                     return
 
@@ -84,16 +85,16 @@ async def cmd_start(message: types.Message, state: FSMContext):
                 await message.answer("Ismingizni kiriting!")
                 return
             else:
-                logging.warning(f"Invalid deeplink structure: {args}")
+                logging.warning("Invalid deeplink structure: %s", args)
                 await message.answer("Bu havola noto'g'ri.")
                 return
 
         # Oddiy start komandasi (deeplink bo'lmasa)
-        user_exists = db.get_user_by_chat_id(user_id)
+        user_exists = await adb.get_user_by_chat_id(user_id)
 
         if not user_exists:
             # Yangi foydalanuvchi
-            db.add_user(chat_id=user_id)
+            await adb.add_user(chat_id=user_id)
             await UserStates.IN_LANG.set()
 
             keyboard_lang = types.ReplyKeyboardMarkup(resize_keyboard=True)
@@ -103,9 +104,10 @@ async def cmd_start(message: types.Message, state: FSMContext):
             await message.answer(texts.WELCOME_TEXT)
             await message.answer(texts.CHOOSE_LANG, reply_markup=keyboard_lang)
         else:
-            # Mavjud foydalanuvchi
+            # Mavjud foydalanuvchi (avval botni bloklagan bo'lsa, broadcast ro'yxatiga qaytariladi)
+            await adb.unblock_user(user_id)
             await UserStates.IN_MENU.set()
-            lang_id = db.get_user_language_id(user_id)
+            lang_id = await adb.get_user_language_id(user_id)
 
             keyboard_menu = types.ReplyKeyboardMarkup(resize_keyboard=True)
             keyboard_menu.add(BTN_BOOK[lang_id])
@@ -123,7 +125,7 @@ async def cmd_start(message: types.Message, state: FSMContext):
             await message.answer(text=TEXT_MAIN_MENU[lang_id], reply_markup=keyboard_menu)
             await state.finish()
     except Exception as e:
-        logging.error(f"Error in cmd_start: {e}", exc_info=True)
+        logging.error("Error in cmd_start: %s", e, exc_info=True)
         await message.answer("Xatolik yuz berdi, iltimos keyinroq qayta urinib ko'ring.")
 
 
@@ -137,7 +139,7 @@ async def process_quiz_deeplink(message: types.Message, state: FSMContext, args)
     current_time = datetime.now()
 
     # bot_app_history jadvalidan created_at vaqtini olish
-    created_at = db.get_created_at_by_unique_id(unique_id)
+    created_at = await adb.get_created_at_by_unique_id(unique_id)
 
     if created_at:
         # created_at 'YYYY-MM-DD HH:MM:SS' formatida bo'lsin
@@ -158,13 +160,7 @@ async def process_quiz_deeplink(message: types.Message, state: FSMContext, args)
 async def show_main_menu(message: types.Message, user_id: int):
     """Asosiy menyuni ko'rsatish"""
     # Tilni olish (kesh bilan)
-    lang_id_key = f"user:lang:{user_id}"
-    lang_id = await get_cache(lang_id_key)
-
-    if lang_id is None:
-        lang_id = db.get_user_language_id(user_id)
-        if lang_id is not None:
-            await set_cache(lang_id_key, lang_id, ttl=3600)  # 1 soat keshlaymiz
+    lang_id = await adb.get_user_language_id_cached(user_id)
 
     # Asosiy menyu klaviaturasini yaratish
     keyboard_menu = types.ReplyKeyboardMarkup(resize_keyboard=True)
@@ -191,20 +187,12 @@ async def check_admin(user_id: int) -> bool:
     is_admin = await get_cache(cache_key)
 
     if is_admin is None:
-        # Admin foydalanuvchi ID-larini bir marta olish
-        user_ids = db.get_all_setadmin_user_ids()
-        admin_ids = []
-
-        for id in user_ids:
-            admin_id = db.get_chat_id_by_user_id(id)
-            if admin_id:
-                admin_ids.append(admin_id)
-                # Har bir admin ID-sini keshlaymiz
-                await set_cache(f"is_admin:{admin_id}", True, ttl=3600)  # 1 soat keshlaymiz
+        # Admin foydalanuvchi ID-larini bir marta olish (parallel so'rovlar bitta yuklashni kutadi)
+        admin_ids = await adb.get_admin_chat_ids_cached()
 
         is_admin = user_id in admin_ids
-        if not is_admin:
-            await set_cache(cache_key, False, ttl=3600)  # 1 soat keshlaymiz
+        # Admin qo'shilsa/o'chirilsa kalit admin paneldan darhol tozalanadi
+        await set_cache(cache_key, is_admin, ttl=CACHE_INVALIDATED_TTL)
 
     return is_admin
 
@@ -215,7 +203,7 @@ async def quiz_start_handler(message: types.Message, state: FSMContext):
     Foydalanuvchi ismini kiritganda ishlaydigan handler
     """
     try:
-        logging.info(f"Quiz start handler called with user name: {message.text}")
+        logging.debug("Quiz start handler called with user name: %s", message.text)
         name = message.text
         user_id = message.from_user.id
 
@@ -225,20 +213,18 @@ async def quiz_start_handler(message: types.Message, state: FSMContext):
         owner_id = user_data.get('user_id')
 
         # Debug ma'lumotlari
-        logging.info(f"User data: {user_data}")
-        logging.info(f"Unique ID: {unique_id}, Owner ID: {owner_id}")
+        logging.debug("User data: %s", user_data)
+        logging.debug("Unique ID: %s, Owner ID: %s", unique_id, owner_id)
 
         # Foydalanuvchini bazada yaratish/yangilash
-        user_exists = db.get_user_by_chat_id(user_id)
+        user_exists = await adb.get_user_by_chat_id(user_id)
         if not user_exists:
-            language_id = 1
-            db.add_user(chat_id=user_id)
-            db.update_user_field(user_id, "lang_id", language_id)
-            db.update_user_field(key='first_name', value=name, chat_id=user_id)
-            logging.info(f"Created new user: ID={user_id}, Name={name}")
+            # Til darhol o'qiladi (menyular, savollar), shuning uchun bitta INSERT bilan birga yoziladi
+            await adb.add_user(chat_id=user_id, lang_id=1, first_name=name)
+            logging.info("Created new user: ID=%s, Name=%s", user_id, name)
         else:
-            # Ismni yangilash
-            db.update_user_field(key='first_name', value=name, chat_id=user_id)
+            # Ism qayta o'qilmaydi - xona to'lganda yangilashlar guruhlab yoziladi
+            await write_behind.update_user_field(key='first_name', value=name, chat_id=user_id)
 
         # Davlatni yangilash
         await state.update_data(name=name)
@@ -259,23 +245,23 @@ async def quiz_start_handler(message: types.Message, state: FSMContext):
 
         # Adminga xabar yuborish
         try:
-            await bot.send_message(
-                chat_id=owner_id,
-                text=f"<b>{name}</b> testga qo'shildi! Ishtirokchilar barchasini kutib, testni boshlash tugmasini bosing.",
+            await outbound.send_message(
+                owner_id,
+                f"<b>{name}</b> testga qo'shildi! Ishtirokchilar barchasini kutib, testni boshlash tugmasini bosing.",
                 reply_markup=inline_kb,
                 parse_mode='HTML'
             )
-            logging.info(f"Sent notification to admin ID {owner_id}")
+            logging.debug("Sent notification to admin ID %s", owner_id)
         except Exception as e:
-            logging.error(f"Error sending message to admin: {e}")
+            logging.error("Error sending message to admin: %s", e)
             # Admin topilmasa, foydalanuvchiga boshqa xabar berish
             await message.answer("Testni yaratgan shaxsga xabar yuborishda xatolik yuz berdi.")
 
         # Foydalanuvchiga kutish haqida xabar
         await message.answer("Ro'yxatdan o'tdingiz! Test boshlanganda sizga xabar beriladi, iltimos kuting...")
-        logging.info(f"User {user_id} registered for quiz {unique_id}")
+        logging.debug("User %s registered for quiz %s", user_id, unique_id)
 
     except Exception as e:
-        logging.error(f"Error in quiz start handler: {e}", exc_info=True)
+        logging.error("Error in quiz start handler: %s", e, exc_info=True)
         await message.answer("Xatolik yuz berdi, iltimos keyinroq qayta urinib ko'ring.")
         await state.finish()
\ No newline at end of file
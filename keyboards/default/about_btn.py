@@ -14,7 +14,7 @@ async def setting_menu(message: types.Message):
 
     user_id = message.from_user.id
     lang_id = db.get_user_language_id(user_id)
-    bios = db.fetch_all_setbio_data()
+    bios = await db.fetch_all_setbio_data_cached()
     if lang_id == 1:
         bio = bios[0]
         uz_text = bio[1]
@@ -6,7 +6,6 @@ from loader import dp, db
 async def cmd_start(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
     info = db.get_user_by_chat_id(user_id)
-    print(info[3])
     if info[3] == 1:
         lang = "O'zbek tili"
     else:
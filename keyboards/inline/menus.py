@@ -0,0 +1,87 @@
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from data.config import CACHE_INVALIDATED_TTL
+from handlers.users.texts import TEXT_ALL
+from loader import db, keyboard_cache, get_cache, set_cache
+from utils.callback_codec import encode
+
+# Kategoriya va bellashuv menyularining klaviaturalari. Handler'lar bu yerda
+# ro'yxatdan o'tkazilmaydi, shuning uchun modulni istalgan joydan import qilish mumkin.
+
+
+def _row_label(row, lang_id):
+    """Qatordan (id, nom) ni tanlangan tilda olish"""
+    if isinstance(row, dict):  # Django ORM qo'llanganda
+        return row.get('id'), row.get('name_uz') if lang_id == 1 else row.get('name_ru')
+    # SQLite ga murojaat qilinganda (tuple, Redis dan olinganda list)
+    if lang_id != 1 and len(row) > 2:
+        return row[0], row[2]
+    return row[0], row[1]
+
+
+def _build_keyboard(rows, lang_id, action, back_callback_data=None, back_text=None, is_admin=False):
+    """Qatorlardan inline klaviatura qurish (natija keyboard_cache da saqlanadi)"""
+    keyboard = InlineKeyboardMarkup()
+    for row in rows:
+        row_id, name = _row_label(row, lang_id)
+        if name:
+            # Callback'da faqat amal, id va til: nom 64 baytlik chegaraga ta'sir qilmaydi
+            keyboard.add(InlineKeyboardButton(text=name, callback_data=encode(action, row_id, lang_id)))
+
+    # Admin foydalanuvchilar uchun test o'tkazish tugmasi
+    if is_admin:
+        admin_text = "Test o'tkazish" if lang_id == 1 else "Пройти тест"
+        keyboard.add(InlineKeyboardButton(text=admin_text, callback_data="start_quiz"))
+
+    # Orqaga tugmasi
+    if back_callback_data:
+        keyboard.add(InlineKeyboardButton(text=back_text or TEXT_ALL[lang_id], callback_data=back_callback_data))
+    return keyboard
+
+
+def root_categories_markup(rows, lang_id):
+    return keyboard_cache.get_or_build(
+        ('categories', None, lang_id, False), rows,
+        lambda: _build_keyboard(rows, lang_id, 'category'),
+    )
+
+
+def child_categories_markup(rows, parent_id, lang_id):
+    return keyboard_cache.get_or_build(
+        ('categories', parent_id, lang_id, False), rows,
+        lambda: _build_keyboard(rows, lang_id, 'product', back_callback_data="back_to_root"),
+    )
+
+
+def root_battles_markup(rows, lang_id, is_admin):
+    return keyboard_cache.get_or_build(
+        ('battles', None, lang_id, is_admin), rows,
+        lambda: _build_keyboard(rows, lang_id, 'battle', is_admin=is_admin),
+    )
+
+
+def child_battles_markup(rows, parent_id, lang_id, back_text=None):
+    return keyboard_cache.get_or_build(
+        ('battles', parent_id, lang_id, False, back_text), rows,
+        lambda: _build_keyboard(rows, lang_id, 'test', back_callback_data="back_to_battle", back_text=back_text),
+    )
+
+
+async def is_user_admin(user_id: int) -> bool:
+    """
+    Foydalanuvchi admin ekanligini tekshirish (kesh bilan)
+    """
+    # Keshdan admin ma'lumotlarini olish
+    cache_key = f"is_admin:{user_id}"
+    is_admin = await get_cache(cache_key)
+
+    if is_admin is not None:
+        return is_admin
+
+    # Admin foydalanuvchi ID-larini bir marta olish (parallel so'rovlar bitta yuklashni kutadi)
+    admin_user_ids = await db.get_admin_chat_ids_cached()
+
+    is_admin = user_id in admin_user_ids
+    await set_cache(cache_key, is_admin, ttl=CACHE_INVALIDATED_TTL)
+
+    return is_admin
@@ -8,9 +8,12 @@ import random
 import asyncio
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters.state import State, StatesGroup
-from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import CallbackQuery
 from aiogram.utils.exceptions import RetryAfter
-from loader import db, dp
+from loader import db, dp, question_bank, category_tree, timer_wheel, outbound, callback_router
+from keyboards.inline.menus import child_battles_markup
+from utils.callback_codec import Callback
+from utils.outbound import PRIORITY_QUIZ
 
 sys.stdout.reconfigure(encoding='utf-8')
 
@@ -19,130 +22,89 @@ class QuizState(StatesGroup):
     sending_next_question = State()
     quiz_ended = State()
 
-PRODUCT_PREFIX = 'product_'
-TEST_PREFIX = 'test_'
 NUM_QUESTIONS = 30
 TIMEOUT_DURATION = 20
 
-logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
-@dp.callback_query_handler(lambda callback: callback.data.startswith(PRODUCT_PREFIX))
-async def handle_product_callback(callback: CallbackQuery, state: FSMContext):
+@callback_router.route(action='product')
+async def handle_product_callback(callback: CallbackQuery, state: FSMContext, cb: Callback):
     try:
-        parts = callback.data.split('_')
-        print(f'parts {parts}')
-        category_range = parts[1]
-        print("category range ", category_range)
-        print(category_range)
+        if cb.node_id:
+            # Kategoriya nomi ("1-100" ko'rinishidagi oraliq) va ota kategoriya daraxtdan olinadi
+            node = category_tree.categories.node(cb.node_id)
+            if node is None:
+                await callback.message.answer("Bu kategoriyada hech qanday ma'lumot mavjud emas")
+                return
+            category_range, parent_id = node.name_uz, node.parent_id
+        else:
+            # Eski formatdagi tugma: nom va parent_id callback'ning o'zida
+            category_range, parent_id = cb.args
         start_range, end_range = map(int, category_range.split('-'))
-        parent_id = int(parts[-1])
-    except (ValueError, IndexError) as e:
-        logging.error(f"Xatolik: {e}")
+    except (ValueError, IndexError, TypeError) as e:
+        logger.error("Xatolik: %s", e)
         return
     await start_quiz(callback.message, state, start_range, end_range, parent_id, is_battle=False)
 
 
-@dp.callback_query_handler(lambda c: c.data.startswith(TEST_PREFIX))
-async def handle_battle_callback(callback: types.CallbackQuery, state: FSMContext):
+@callback_router.route(action='test')
+async def handle_battle_callback(callback: types.CallbackQuery, state: FSMContext, cb: Callback):
     try:
-        parts = callback.data.split('_')
-        print("parts: ", parts)
+        parent_id = cb.node_id
 
-        if len(parts) < 2:
-            logging.error(f"Unexpected number of parts in callback data: {len(parts)}")
+        # Nomlar callback'dan emas, daraxtdan olinadi
+        battles = category_tree.battles
+        node = battles.node(parent_id)
+        if node is None:
             await callback.message.answer("Noto'g'ri formatdagi ma'lumot. Iltimos, qayta urinib ko'ring.")
             return
-        if len(parts) == 5:
-            category_id = parts[1]
-            parent_name = parts[2]
-            sub_name = parts[3]
-            name = parts[4]
-
-            # Ma'lumotlar bazasidan to'liq subkategoriya nomini olish
-            full_subcategory = db.get_full_subcategory_name(category_id)
-            # await callback.message.answer(f"parent name: {parent_name}, sub_name:{sub_name}, name: {name}")
-
-        parent_id = int(parts[1])  # Asosan ikkinchi bo'limda bo'lishi kutilmoqda
-
-        # Get the current state data
-        user_data = await state.get_data()
-        current_parent = user_data.get('parent_name', 'Unknown')
-        current_category = user_data.get('category_name', 'Unknown')
-
-        if len(parts) == 3:
-            # Bu subkategoriya tanlovi
-            category_id = parts[1]
-            shortened_name = parts[2]
-
-            # Ma'lumotlar bazasidan to'liq subkategoriya nomini olish
-            full_subcategory = db.get_full_subcategory_name(category_id)
-            category_name_2 = full_subcategory
-
-            # print(f"Parent name: {current_parent}, Category name: {current_category}, Category name 2: {category_name_2}")
-
-            # State'ni yangilash
-            await state.update_data(
-                parent_name=current_parent,
-                category_name=current_category,
-                category_name_2=category_name_2
-            )
-        elif len(parts) == 4:
-            # Bu asosiy kategoriya tanlovi
-            new_category_name = parts[2]
-            parent_name = parts[3]
-
-            # print(f"Parent name: {parent_name}, Category name: {new_category_name}")
+        parent_node = battles.parent(parent_id)
 
-            # State'ni yangilash
+        if parent_node is not None and parent_node.depth == 0:
+            # Ildiz bellashuv ostidagi bo'lim tanlandi
             await state.update_data(
-                parent_name=parent_name,
-                category_name=new_category_name,
+                parent_name=parent_node.name_uz,
+                category_name=node.name_uz,
                 category_name_2=None
             )
         else:
-            logging.error(f"Unexpected number of parts in callback data: {len(parts)}")
-            await callback.message.answer("Noto'g'ri formatdagi ma'lumot. Iltimos, qayta urinib ko'ring.")
-            return
+            # Bu subkategoriya tanlovi: oldingi bosqich nomlari state'da
+            user_data = await state.get_data()
+            await state.update_data(
+                parent_name=user_data.get('parent_name', 'Unknown'),
+                category_name=user_data.get('category_name', 'Unknown'),
+                category_name_2=node.name_uz
+            )
 
         user_id = callback.from_user.id
-        lang_id = db.get_user_language_id(user_id)
-        categories = db.get_battle_by_parent_id(parent_id)
+        lang_id = cb.lang_id or await db.get_user_language_id_cached(user_id) or 1
+        categories = node.children
 
         if categories:
-            # Subkategoriyalar uchun yangi klaviatura yaratish
-            keyboard = InlineKeyboardMarkup()
-            for category in categories:
-                category_id, sub_category_name, _, _, _ = category
-                button_text = f"{sub_category_name}"
-                short_callback_data = f"test_{category_id}_{sub_category_name[:20]}"
-                button = InlineKeyboardButton(text=button_text, callback_data=short_callback_data)
-                keyboard.add(button)
-
-            back_button = InlineKeyboardButton(text=BACK[lang_id], callback_data="back_to_battle")
-            keyboard.add(back_button)
+            # Subkategoriyalar uchun tayyor klaviatura
+            keyboard = child_battles_markup(categories, parent_id, lang_id, back_text=BACK[lang_id])
             await callback.message.edit_text(text=TEXT_ALL[lang_id], reply_markup=keyboard)
         else:
-            # Savollarni olish
-            all_tests = db.get_questions_by_battle_id(parent_id)
-            if not all_tests:
+            # Savollarni xotiradagi bankdan tanlash
+            selected_tests = question_bank.sample_ids(NUM_QUESTIONS, battle_id=parent_id)
+            if not selected_tests:
                 await callback.message.answer("Bu bo'limda hozirda hech qanday ma'lumot mavjud emas")
                 return
 
-            selected_tests = random.sample(all_tests, NUM_QUESTIONS) if len(all_tests) >= NUM_QUESTIONS else all_tests
-
             # Davlatdan hozirgi ma'lumotlarni qayta oling
             user_data = await state.get_data()
             current_parent = user_data.get('parent_name', 'Unknown')
             current_category = user_data.get('category_name', 'Unknown')
             current_category_2 = user_data.get('category_name_2', 'Unknown')
 
-            print(f"Starting quiz - Parent name: {current_parent}, Category name: {current_category}, Category name 2: {current_category_2}")
+            logger.debug("Starting quiz - Parent name: %s, Category name: %s, Category name 2: %s",
+                         current_parent, current_category, current_category_2)
 
             await state.update_data(selected_tests=selected_tests)
             await start_quiz_battle(callback.message, state, 1, len(selected_tests), parent_id, is_battle=True)
 
     except (ValueError, IndexError) as e:
-        logging.error(f"Xatolik: {e}")
+        logger.error("Xatolik: %s", e)
         await callback.message.answer("Xatolik yuz berdi, iltimos qayta urinib ko'ring.")
         return
 
@@ -153,10 +115,11 @@ async def start_quiz_battle(message: types.Message, state: FSMContext, start_ran
     filtered_questions = selected_questions[start_range - 1:end_range]
     random.shuffle(filtered_questions)
     selected_questions = filtered_questions[:NUM_QUESTIONS]
-    await state.update_data(questions=selected_questions, current_question_index=0, answers_list=[], quiz_ended=False, current_task_id=None)
-    await safe_send_message(message, f"Sizga {NUM_QUESTIONS} ta savol beriladi. Har bir savol uchun {TIMEOUT_DURATION} soniya vaqt beriladi")
-    await QuizState.sending_next_question.set()
-    await send_next_question(message, state)
+    # State da faqat savol ID lari saqlanadi, matnlar question_bank dan olinadi
+    await state.update_data(question_ids=selected_questions, selected_tests=None, current_question_index=0, answers_list=[], quiz_ended=False, current_task_id=None)
+    await safe_send_message(message.chat.id, f"Sizga {NUM_QUESTIONS} ta savol beriladi. Har bir savol uchun {TIMEOUT_DURATION} soniya vaqt beriladi")
+    await state.set_state(QuizState.sending_next_question)
+    await send_next_question(message.chat.id, state)
 
 @dp.message_handler(state=QuizState.waiting_for_answer, content_types=types.ContentType.TEXT)
 async def answer_received(message: types.Message, state: FSMContext):
@@ -167,50 +130,49 @@ async def answer_received(message: types.Message, state: FSMContext):
     answer_is_correct = user_answer == true_answer.lower()
     answers_list.append(answer_is_correct)
     await state.update_data(answers_list=answers_list, answered=True)
-    await safe_send_message(message, "Javobingiz to'g'ri!" if answer_is_correct else f"Javobingiz noto'g'ri! To'g'ri javob: {true_answer}")
-    await QuizState.sending_next_question.set()
-    await send_next_question(message, state)
+    await safe_send_message(message.chat.id, "Javobingiz to'g'ri!" if answer_is_correct else f"Javobingiz noto'g'ri! To'g'ri javob: {true_answer}")
+    await state.set_state(QuizState.sending_next_question)
+    await send_next_question(message.chat.id, state)
 
-async def send_next_question(message: types.Message, state: FSMContext):
+async def send_next_question(chat_id: int, state: FSMContext):
     user_data = await state.get_data()
-    questions = user_data.get('questions', [])
+    question_ids = user_data.get('question_ids', [])
     current_question_index = user_data.get('current_question_index', 0)
     quiz_ended = user_data.get('quiz_ended', False)
 
-    if current_question_index < len(questions) and not quiz_ended:
-        question = questions[current_question_index]
-        question_text = question['answer_a']
-        true_answer = question['question']
+    if current_question_index < len(question_ids) and not quiz_ended:
+        question = question_bank.get(question_ids[current_question_index]) or {}
+        question_text = question.get('answer_a')
+        true_answer = question.get('question') or ''
         question_number = current_question_index + 1
-        total_questions = len(questions)
-        await safe_send_message(message, f"{question_number}/{total_questions}\n<b>Savol:</b> {question_text}")
+        total_questions = len(question_ids)
+        await safe_send_message(chat_id, f"{question_number}/{total_questions}\n<b>Savol:</b> {question_text}")
 
         task_id = random.randint(1, 1_000_000)
         await state.update_data(true_answer=true_answer, current_question_index=current_question_index + 1, answered=False, current_task_id=task_id)
-        await QuizState.waiting_for_answer.set()
+        await state.set_state(QuizState.waiting_for_answer)
 
-        timeout_task = asyncio.create_task(check_answer_timeout(message, state, task_id))
-        await state.update_data(timeout_task_id=id(timeout_task))
+        # Bir xil kalit bilan qayta rejalashtirish oldingi savol timeout'ini almashtiradi
+        timer_wheel.schedule(f"battle:{chat_id}", TIMEOUT_DURATION, 'battle_answer',
+                             {'chat_id': chat_id, 'task_id': task_id})
 
     elif not quiz_ended:
-        await QuizState.quiz_ended.set()
-        await end_quiz(message, state)
+        await state.set_state(QuizState.quiz_ended)
+        await end_quiz(chat_id, state)
 
-async def safe_send_message(message: types.Message, text: str, retry_after: int = 5, retry_count: int = 0):
+async def safe_send_message(chat_id: int, text: str):
+    # Tezlik limiti va RetryAfter outbound navbatida boshqariladi
     try:
-        sent_message = await message.answer(text)
-        return sent_message
-    except RetryAfter as e:
-        if retry_count < 5:  # Maksimal qayta urinishlar soni
-            logging.warning(f"Flood control oshdi. {e.timeout} soniyada qayta urinib ko'ring.")
-            await asyncio.sleep(e.timeout + retry_after)
-            return await safe_send_message(message, text, retry_after * 2, retry_count + 1)
-        else:
-            logging.error(f"Maksimal qayta urinishlar oshdi: {text}")
-            return None
-
-async def check_answer_timeout(message: types.Message, state: FSMContext, task_id: int):
-    await asyncio.sleep(TIMEOUT_DURATION)
+        return await outbound.send_message(chat_id, text, priority=PRIORITY_QUIZ)
+    except RetryAfter:
+        logger.error("Maksimal qayta urinishlar oshdi: %s", text)
+        return None
+
+async def check_answer_timeout(key: str, payload: dict):
+    """timer_wheel tomonidan savol vaqti tugaganda chaqiriladi"""
+    chat_id = payload['chat_id']
+    task_id = payload['task_id']
+    state = dp.current_state(chat=chat_id, user=chat_id)
     user_data = await state.get_data()
     if user_data.get('answered') or user_data.get('current_task_id') != task_id:
         return
@@ -225,12 +187,12 @@ async def check_answer_timeout(message: types.Message, state: FSMContext, task_i
     if len(answers_list) < current_question_index:
         answers_list.append(False)
         await state.update_data(answers_list=answers_list)
-        await safe_send_message(message, "Vaqt tugadi! Siz javob bermadingiz.")
-        await QuizState.sending_next_question.set()
-        await send_next_question(message, state)
+        await safe_send_message(chat_id, "Vaqt tugadi! Siz javob bermadingiz.")
+        await state.set_state(QuizState.sending_next_question)
+        await send_next_question(chat_id, state)
 
 
-async def end_quiz(message: types.Message, state: FSMContext):
+async def end_quiz(chat_id: int, state: FSMContext):
     user_data = await state.get_data()
     answers_list = user_data.get('answers_list', [])
     correct_answers_count = sum(answers_list)
@@ -248,43 +210,24 @@ async def end_quiz(message: types.Message, state: FSMContext):
     else:
         result_text = f"Savollar tugadi! Siz {parent_name}, {category_name} dan test topshirdingiz!"
 
-    print(f"Quiz ended - Parent name: {parent_name}, Category name: {category_name}, Category name 2: {category_name_2}")
+    logger.debug("Quiz ended - Parent name: %s, Category name: %s, Category name 2: %s",
+                 parent_name, category_name, category_name_2)
 
-    await safe_send_message(message,
+    await safe_send_message(chat_id,
                             f"{result_text}\nSizning natijalaringiz:\n{result_message}\nSiz {len(answers_list)} ta savoldan {correct_answers_count} taga to'g'ri javob berdingiz.")
     await state.update_data(quiz_ended=True)
-    timeout_task_id = user_data.get('timeout_task_id')
-    if timeout_task_id:
-        loop = asyncio.get_event_loop()
-        for task in asyncio.all_tasks(loop=loop):
-            if id(task) == timeout_task_id:
-                task.cancel()
-                break
+    timer_wheel.cancel(f"battle:{chat_id}")
     await state.finish()
 
 async def start_quiz(message: types.Message, state: FSMContext, start_range: int, end_range: int, parent_id: int, is_battle: bool = False):
-    try:
-        user_id = message.from_user.id
-        lang_id = db.get_user_language_id(user_id)
-        categories = db.get_battle_by_parent_id(parent_id)
-        keyboard = InlineKeyboardMarkup()
-
-        for category in categories:
-            category_id, category_name, _, _, _ = category
-            button_text = f"{category_name}"
-            callback_data = f"test_{category_id}_{category_name}"
-            button = InlineKeyboardButton(text=button_text, callback_data=callback_data)
-            keyboard.add(button)
-        back_button = InlineKeyboardButton(text=BACK[lang_id], callback_data="back_to_battle")
-        keyboard.add(back_button)
-
-        await message.edit_text(text=TEXT_ALL[lang_id], reply_markup=keyboard)
-    except:
-        questions = db.get_questions_by_battle_id(parent_id) if is_battle else db.get_questions_by_category_id(parent_id)
-        filtered_questions = questions[start_range - 1:end_range]
-        random.shuffle(filtered_questions)
-        selected_questions = filtered_questions[:NUM_QUESTIONS]
-        await state.update_data(questions=selected_questions, current_question_index=0, answers_list=[], quiz_ended=False, current_task_id=None)
-        await safe_send_message(message, f"Sizga {NUM_QUESTIONS} ta savol beriladi. Har bir savol uchun {TIMEOUT_DURATION} soniya vaqt beriladi")
-        await QuizState.sending_next_question.set()
-        await send_next_question(message, state)
\ No newline at end of file
+    question_ids = question_bank.ids(battle_id=parent_id) if is_battle else question_bank.ids(category_id=parent_id)
+    filtered_questions = question_ids[start_range - 1:end_range]
+    random.shuffle(filtered_questions)
+    selected_questions = filtered_questions[:NUM_QUESTIONS]
+    await state.update_data(question_ids=selected_questions, current_question_index=0, answers_list=[], quiz_ended=False, current_task_id=None)
+    await safe_send_message(message.chat.id, f"Sizga {NUM_QUESTIONS} ta savol beriladi. Har bir savol uchun {TIMEOUT_DURATION} soniya vaqt beriladi")
+    await state.set_state(QuizState.sending_next_question)
+    await send_next_question(message.chat.id, state)
+
+
+timer_wheel.register('battle_answer', check_answer_timeout)
@@ -1,20 +1,24 @@
 import logging
 import random
 import asyncio
+import time
 import uuid
 import base64
 from aiogram import types
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters.state import State, StatesGroup
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
-from aiogram.utils.exceptions import BotBlocked, RetryAfter, Throttled
+from aiogram.utils.exceptions import BotBlocked, MessageNotModified, RetryAfter, Throttled
 from datetime import datetime
 from handlers.users.texts import BACK, TEXT_QUIZ, TEXT_ALL
-from loader import dp, db, bot
+from data import config
+from loader import dp, adb, bot, question_bank, category_tree, timer_wheel, outbound, callback_router, leaderboard, write_behind
+from utils.outbound import PRIORITY_QUIZ
+from utils.fanout import fan_out
+from utils.leaderboard import Entry
 
-# Debug uchun logger
+# Darajasi LOG_LEVELS orqali sozlanadi (masalan room_handler=DEBUG)
 logger = logging.getLogger('room_handler')
-logger.setLevel(logging.DEBUG)
 
 
 # Viktorinani boshqarish uchun holatlar
@@ -45,7 +49,7 @@ async def create_keyboard_with_categories(categories, lang_id, callback_data_pre
         category_id, category_name, *_ = category
         button_text = category_name if lang_id == 1 else category_name  # Til shartini qo'shish kerak bo'lsa
         callback_data = f"{callback_data_prefix}_{category_id}"
-        logger.debug(f"Category: ID={category_id}, Name='{category_name}', Callback='{callback_data}'")
+        logger.debug("Category: ID=%s, Name='%s', Callback='%s'", category_id, category_name, callback_data)
         button = InlineKeyboardButton(text=button_text, callback_data=callback_data)
         keyboard.add(button)
     back_button = InlineKeyboardButton(text=BACK[lang_id], callback_data="back_to_battle")
@@ -53,18 +57,18 @@ async def create_keyboard_with_categories(categories, lang_id, callback_data_pre
     return keyboard
 
 
-@dp.callback_query_handler(text="start_quiz")
+@callback_router.route(exact='start_quiz')
 async def start_quiz(callback_query: types.CallbackQuery, state: FSMContext):
     """
     Viktorina boshlanishini boshqarish.
     """
     try:
         await callback_query.answer()
-        logger.debug(f"Start quiz callback received from user {callback_query.from_user.id}")
+        logger.debug("Start quiz callback received from user %s", callback_query.from_user.id)
 
         user_id = callback_query.from_user.id
-        lang_id = db.get_user_language_id(user_id)
-        battles = db.get_root_battle()
+        lang_id = await adb.get_user_language_id(user_id)
+        battles = category_tree.battles.roots()
 
         if not battles:
             logger.warning("No battles found for quiz")
@@ -76,81 +80,81 @@ async def start_quiz(callback_query: types.CallbackQuery, state: FSMContext):
         await RoomQuizStates.selecting_category.set()
         logger.debug("Displaying categories for quiz")
     except Exception as e:
-        logger.error(f"Error starting quiz: {e}", exc_info=True)
+        logger.error("Error starting quiz: %s", e, exc_info=True)
         await callback_query.message.answer("Xatolik yuz berdi, iltimos keyinroq qayta urinib ko'ring.")
 
 
-@dp.callback_query_handler(lambda callback: callback.data.startswith('select_'),
-                           state=RoomQuizStates.selecting_category)
+@callback_router.route(prefix='select_', state=RoomQuizStates.selecting_category)
 async def handle_category_callback(callback: CallbackQuery, state: FSMContext):
     """
     Kategoriya tanlashni boshqarish.
     """
     try:
-        logger.debug(f"Category selected for quiz: {callback.data}")
+        logger.debug("Category selected for quiz: %s", callback.data)
         parts = callback.data.split('_')
         parent_id = int(parts[-1])
-        categories = db.get_battle_by_parent_id(parent_id)
-        lang_id = db.get_user_language_id(callback.from_user.id)
+        categories = category_tree.battles.children(parent_id)
+        lang_id = await adb.get_user_language_id(callback.from_user.id)
 
         if not categories:
-            logger.warning(f"No subcategories found for parent ID {parent_id}")
+            logger.warning("No subcategories found for parent ID %s", parent_id)
             await callback.message.answer("Ushbu kategoriyada bellashuvlar topilmadi!")
             return
 
         keyboard = await create_keyboard_with_categories(categories, lang_id, "quiz_battle")
         await callback.message.edit_text(TEXT_QUIZ[lang_id], reply_markup=keyboard)
         await RoomQuizStates.selecting_battle.set()
-        logger.debug(f"Displaying subcategories for parent ID {parent_id}")
+        logger.debug("Displaying subcategories for parent ID %s", parent_id)
     except (ValueError, IndexError) as e:
-        logger.error(f"Category parsing error: {e}", exc_info=True)
+        logger.error("Category parsing error: %s", e, exc_info=True)
         await callback.message.answer("Ma'lumotlarni qayta ishlashda xatolik yuz berdi!")
     except Exception as e:
-        logger.error(f"Error handling category selection: {e}", exc_info=True)
+        logger.error("Error handling category selection: %s", e, exc_info=True)
         await callback.message.answer("Xatolik yuz berdi, iltimos keyinroq qayta urinib ko'ring.")
 
 
-@dp.callback_query_handler(lambda c: c.data.startswith('quiz_battle_'), state=RoomQuizStates.selecting_battle)
+@callback_router.route(prefix='quiz_battle_', state=RoomQuizStates.selecting_battle)
 async def handle_select_battle(callback_query: types.CallbackQuery, state: FSMContext):
     """
     Jang tanlashni boshqarish.
     """
     try:
-        logger.debug(f"Battle selected for quiz: {callback_query.data}")
+        logger.debug("Battle selected for quiz: %s", callback_query.data)
         await callback_query.answer()
         parts = callback_query.data.split('_')
         quiz_id = int(parts[-1])
 
-        # Bazadan ma'lumotlarni olish
-        all_tests = db.get_questions_by_battle_id(quiz_id)
-        categories = db.get_battle_by_parent_id(quiz_id)
+        # Bo'lim bargmi yoki shoxmi - daraxtdan (bazaga murojaat qilinmaydi)
+        node = category_tree.battles.node(quiz_id)
+        has_tests = node is not None and node.has_tests
+        categories = node.children if node is not None else ()
 
-        if not all_tests and not categories:
-            logger.warning(f"No tests or subcategories found for battle ID {quiz_id}")
+        if not has_tests and not categories:
+            logger.warning("No tests or subcategories found for battle ID %s", quiz_id)
             await callback_query.message.answer("Bu bo'limda hozirda hech qanday ma'lumot mavjud emas")
             return
 
         # Agar subkategoriyalar topilsa, ularni ko'rsatish
         user_id = callback_query.from_user.id
-        lang_id = db.get_user_language_id(user_id)
+        lang_id = await adb.get_user_language_id(user_id)
 
-        if not all_tests:
+        if not has_tests:
             keyboard = await create_keyboard_with_categories(categories, lang_id, 'quiz_battle_')
             await callback_query.message.edit_text(text=TEXT_ALL[lang_id], reply_markup=keyboard)
-            logger.debug(f"Showing subcategories for battle ID {quiz_id}")
+            logger.debug("Showing subcategories for battle ID %s", quiz_id)
             return
 
         # Savollar topilgan bo'lsa
-        logger.debug(f"Found {len(all_tests)} questions for battle ID {quiz_id}")
+        logger.debug("Found %s questions for battle ID %s", question_bank.count(battle_id=quiz_id), quiz_id)
         await state.update_data(quiz_id=quiz_id)
-        await bot.send_message(callback_query.from_user.id, "Savollar sonini kiriting:")
+        await outbound.send_message(callback_query.from_user.id, "Savollar sonini kiriting:")
         await RoomQuizStates.quiz_number.set()
-        logger.debug(f"Asking for number of questions")
+        logger.debug("Asking for number of questions")
     except (ValueError, IndexError) as e:
-        logger.error(f"Battle selection error: {e}", exc_info=True)
+        logger.error("Battle selection error: %s", e, exc_info=True)
         await callback_query.message.answer("Ma'lumotlarni qayta ishlashda xatolik yuz berdi!")
     except Exception as e:
-        logger.error(f"Error handling battle selection: {e}", exc_info=True)
+        logger.error("Error handling battle selection: %s", e, exc_info=True)
         await callback_query.message.answer("Xatolik yuz berdi, iltimos keyinroq qayta urinib ko'ring.")
 
 
@@ -160,7 +164,7 @@ async def process_quiz_number(message: types.Message, state: FSMContext):
     Savollar sonini qayta ishlash.
     """
     try:
-        logger.debug(f"Received quiz number: {message.text}")
+        logger.debug("Received quiz number: %s", message.text)
         if not message.text.isdigit():
             await message.answer("Iltimos, son kiriting.")
             return
@@ -173,9 +177,9 @@ async def process_quiz_number(message: types.Message, state: FSMContext):
         await state.update_data(quiz_number=quiz_number)
         await message.answer("Savollarni vaqtini kiriting (sekunda, masalan, 20):")
         await RoomQuizStates.quiz_time.set()
-        logger.debug(f"Quiz number set to {quiz_number}, asking for time")
+        logger.debug("Quiz number set to %s, asking for time", quiz_number)
     except Exception as e:
-        logger.error(f"Error processing quiz number: {e}", exc_info=True)
+        logger.error("Error processing quiz number: %s", e, exc_info=True)
         await message.answer("Xatolik yuz berdi, iltimos keyinroq qayta urinib ko'ring.")
 
 
@@ -185,7 +189,7 @@ async def process_quiz_time(message: types.Message, state: FSMContext):
     Savollarni vaqtini qayta ishlash.
     """
     try:
-        logger.debug(f"Received quiz time: {message.text}")
+        logger.debug("Received quiz time: %s", message.text)
         if not message.text.isdigit():
             await message.answer("Iltimos, vaqtni sonlarda kiriting.")
             return
@@ -216,13 +220,13 @@ async def process_quiz_time(message: types.Message, state: FSMContext):
         invite_keyboard = InlineKeyboardMarkup().add(InlineKeyboardButton(text="Botga qo'shilish", url=invite_link))
         await message.answer("Botga qo'shilish uchun quyidagi tugmani bosing:", reply_markup=invite_keyboard)
 
-        # Bazaga yozish
-        db.add_history_entry(user_id, quiz_id, unique_id, quiz_number, quiz_time, formatted_time)
+        # Bazaga darhol yoziladi: taklif havolasi bo'yicha kelganlar history qatorini tekshiradi
+        await adb.add_history_entry(user_id, quiz_id, unique_id, quiz_number, quiz_time, formatted_time)
 
         await state.finish()
-        logger.debug(f"Room created: ID={unique_id}, link={invite_link}")
+        logger.debug("Room created: ID=%s, link=%s", unique_id, invite_link)
     except Exception as e:
-        logger.error(f"Error processing quiz time: {e}", exc_info=True)
+        logger.error("Error processing quiz time: %s", e, exc_info=True)
         await message.answer("Xatolik yuz berdi, iltimos keyinroq qayta urinib ko'ring.")
 
 
@@ -232,7 +236,7 @@ async def get_bot_username():
         bot_info = await bot.get_me()
         return bot_info.username
     except Exception as e:
-        logger.error(f"Error getting bot username: {e}", exc_info=True)
+        logger.error("Error getting bot username: %s", e, exc_info=True)
         return "wisdom_lc_vocab_bot"  # Default
 
 
@@ -247,7 +251,7 @@ async def save_room_data(unique_id, quiz_id, quiz_number, quiz_time, owner_id):
         "created_at": datetime.now().isoformat()
     }
     await set_cache(f"room:{unique_id}", room_data, ttl=3600)  # 1 soat saqlanadi
-    logger.debug(f"Saved room data to cache: {room_data}")
+    logger.debug("Saved room data to cache: %s", room_data)
 
 
 async def get_room_data(unique_id):
@@ -257,16 +261,16 @@ async def get_room_data(unique_id):
 
         # Keshdan ma'lumotlarni olish
         room_data = await get_cache(f"room:{unique_id}")
-        logger.debug(f"Retrieved room data from cache for unique_id {unique_id}: {room_data}")
+        logger.debug("Retrieved room data from cache for unique_id %s: %s", unique_id, room_data)
 
         # Agar keshda ma'lumot bo'lmasa, bazadan olishga harakat qilish
         if not room_data:
-            logger.debug(f"No room data in cache for unique_id {unique_id}, trying database")
+            logger.debug("No room data in cache for unique_id %s, trying database", unique_id)
 
             # Bazadan olish
             try:
-                quiz_id = db.get_quiz_number_by_unique_id(unique_id)
-                created_at = db.get_created_at_by_unique_id(unique_id)
+                quiz_id = await adb.get_quiz_number_by_unique_id(unique_id)
+                created_at = await adb.get_created_at_by_unique_id(unique_id)
 
                 if quiz_id and created_at:
                     # Ma'lumotlarni shakllantirish
@@ -281,82 +285,109 @@ async def get_room_data(unique_id):
                     # Keshga saqlash
                     from loader import set_cache
                     await set_cache(f"room:{unique_id}", room_data, ttl=3600)
-                    logger.debug(f"Retrieved and cached room data from database for unique_id {unique_id}: {room_data}")
+                    logger.debug("Retrieved and cached room data from database for unique_id %s: %s",
+                                 unique_id, room_data)
             except Exception as e:
-                logger.error(f"Error getting room data from database: {e}", exc_info=True)
+                logger.error("Error getting room data from database: %s", e, exc_info=True)
 
         return room_data
     except Exception as e:
-        logger.error(f"Error retrieving room data for unique_id {unique_id}: {e}", exc_info=True)
+        logger.error("Error retrieving room data for unique_id %s: %s", unique_id, e, exc_info=True)
         return None
 
 
-async def get_room_participants(unique_id):
-    """Room qatnashchilarini olish"""
-    try:
-        from loader import get_cache
+# Redis bo'lmaganda xona qatnashchilari: unique_id -> (muddat, {user_id: ism}).
+# Lug'atga qo'shish await'siz bajariladi, shuning uchun bir vaqtdagi qo'shilishlar bir-birini o'chirmaydi
+_room_participants = {}
+ROOM_PARTICIPANTS_TTL = 3600
 
-        # Keshdan olish
-        participants = await get_cache(f"room_participants:{unique_id}")
-        logger.debug(f"Got participants from cache: {participants}")
 
-        if not participants:
-            # Agar keshda yo'q bo'lsa, bo'sh ro'yxat qaytarish
-            participants = []
+def _participants_key(unique_id):
+    return f"room_participants:{unique_id}"
+
+
+def _local_participants(unique_id, create=False):
+    now = time.monotonic()
+    entry = _room_participants.get(unique_id)
+    if entry is not None and entry[0] < now:
+        del _room_participants[unique_id]
+        entry = None
+    if entry is None:
+        if not create:
+            return {}
+        for key, (expires_at, _) in list(_room_participants.items()):
+            if expires_at < now:
+                del _room_participants[key]
+        entry = (now + ROOM_PARTICIPANTS_TTL, {})
+        _room_participants[unique_id] = entry
+    return entry[1]
+
 
+async def get_room_participants(unique_id):
+    """Room qatnashchilari: [{"user_id": ..., "name": ...}]"""
+    from loader import redis_connection
+    try:
+        if redis_connection is not None:
+            members = await redis_connection.hgetall(_participants_key(unique_id))
+            participants = [{"user_id": int(user_id), "name": name} for user_id, name in members.items()]
+        else:
+            participants = [{"user_id": user_id, "name": name}
+                            for user_id, name in _local_participants(unique_id).items()]
+        logger.debug("Room %s participants: %s", unique_id, len(participants))
         return participants
     except Exception as e:
-        logger.error(f"Error getting room participants: {e}", exc_info=True)
+        logger.error("Error getting room participants: %s", e, exc_info=True)
         return []
 
 
 async def add_room_participant(unique_id, user_id, name):
     """
-    Room-ga yangi qatnashchi qo'shish
-    """
-    try:
-        from loader import get_cache, set_cache
-
-        # Mavjud qatnashchilarni olish
-        participants = await get_cache(f"room_participants:{unique_id}") or []
-
-        # Agar bu foydalanuvchi allaqachon ro'yxatda bo'lsa, qo'shmaslik
-        for participant in participants:
-            if participant.get('user_id') == user_id:
-                logger.debug(f"User {user_id} already in room {unique_id}")
-                return participants
+    Room-ga yangi qatnashchi qo'shish.
 
-        # Yangi qatnashchini qo'shish
-        participants.append({
-            "user_id": user_id,
-            "name": name
-        })
+    Redis da xona - hash (user_id -> ism), qatnashchi HSETNX bilan qo'shiladi:
+    bir vaqtda qo'shilayotganlar (boshqa worker'larda ham) bir-birini
+    o'chirib yubormaydi, qayta qo'shilgan foydalanuvchining ismi o'zgarmaydi.
 
-        # Yangilangan ro'yxatni saqlash
-        await set_cache(f"room_participants:{unique_id}", participants, ttl=3600)
-        logger.debug(f"Added user {user_id} ({name}) to room {unique_id}")
+    :return: qatnashchi yangi qo'shilgan bo'lsa True.
+    """
+    from loader import redis_connection
+    try:
+        if redis_connection is not None:
+            key = _participants_key(unique_id)
+            pipe = redis_connection.pipeline(transaction=True)
+            pipe.hsetnx(key, user_id, name)
+            pipe.expire(key, ROOM_PARTICIPANTS_TTL)
+            added, _ = await pipe.execute()
+        else:
+            participants = _local_participants(unique_id, create=True)
+            added = user_id not in participants
+            participants.setdefault(user_id, name)
 
-        return participants
+        if added:
+            logger.debug("Added user %s (%s) to room %s", user_id, name, unique_id)
+        else:
+            logger.debug("User %s already in room %s", user_id, unique_id)
+        return bool(added)
     except Exception as e:
-        logger.error(f"Error adding room participant: {e}", exc_info=True)
-        return []
+        logger.error("Error adding room participant: %s", e, exc_info=True)
+        return False
 
 
 # Start room quiz callback handler
 # Alohida callback handler har qanday holatda ham ishlaydi
-@dp.callback_query_handler(lambda query: query.data.startswith('start_room_quiz_'), state="*")
+@callback_router.route(prefix='start_room_quiz_', state='*')
 async def start_room_quiz_callback(callback_query: types.CallbackQuery):
     """
     Admin testni boshlash tugmasini bosganda ishlaydigan handler
     """
-    logger.info(f"START ROOM QUIZ CALLBACK CALLED: {callback_query.data}")
+    logger.debug("START ROOM QUIZ CALLBACK CALLED: %s", callback_query.data)
     try:
         # Javob qaytarish
         await callback_query.answer("Test boshlanmoqda...")
 
         # Unique ID ni olish
         unique_id = callback_query.data.split('_')[-1]
-        logger.info(f"Extracted unique_id: {unique_id}")
+        logger.debug("Extracted unique_id: %s", unique_id)
 
         # Adminga xabar beramiz
         await callback_query.message.edit_text("Test boshlanmoqda, iltimos kuting...")
@@ -372,14 +403,15 @@ async def start_room_quiz_callback(callback_query: types.CallbackQuery):
             quiz_id = room_data.get('quiz_id')
             quiz_number = int(room_data.get('quiz_number', 5))
             quiz_time = int(room_data.get('quiz_time', 20))
-            logger.info(
-                f"Got room data from cache: quiz_id={quiz_id}, quiz_number={quiz_number}, quiz_time={quiz_time}")
+            logger.debug(
+                "Got room data from cache: quiz_id=%s, quiz_number=%s, quiz_time=%s",
+                quiz_id, quiz_number, quiz_time)
 
         # Agar keshda ma'lumotlar bo'lmasa, bazadan olish
         if not quiz_id:
             try:
                 # get_history_by_unique_id metodi bor bo'lsa
-                history_data = db.get_history_by_unique_id(unique_id)
+                history_data = await adb.get_history_by_unique_id(unique_id)
                 if history_data:
                     quiz_id = history_data.get('quiz_id')
                     quiz_number_str = history_data.get('quiz_number')
@@ -388,140 +420,167 @@ async def start_room_quiz_callback(callback_query: types.CallbackQuery):
                     quiz_number = int(quiz_number_str) if quiz_number_str else 5
                     quiz_time = int(quiz_time_str) if quiz_time_str else 20
 
-                    logger.info(
-                        f"Got quiz data from history: quiz_id={quiz_id}, quiz_number={quiz_number}, quiz_time={quiz_time}")
+                    logger.debug(
+                        "Got quiz data from history: quiz_id=%s, quiz_number=%s, quiz_time=%s",
+                        quiz_id, quiz_number, quiz_time)
             except Exception as e:
-                logger.error(f"Error getting history data: {e}")
+                logger.error("Error getting history data: %s", e)
 
         # Agar hali ham quiz_id bo'lmasa, boshqa usullar bilan olish
         if not quiz_id:
             try:
                 # get_quiz_id_by_unique_id metodi bor bo'lsa
-                quiz_id = db.get_quiz_id_by_unique_id(unique_id)
-                logger.info(f"Got quiz_id from database: {quiz_id}")
+                quiz_id = await adb.get_quiz_id_by_unique_id(unique_id)
+                logger.debug("Got quiz_id from database: %s", quiz_id)
 
                 # Quiz number va time ni olish
-                quiz_number_from_db = db.get_quiz_number_by_unique_id(unique_id)
+                quiz_number_from_db = await adb.get_quiz_number_by_unique_id(unique_id)
                 if quiz_number_from_db:
                     quiz_number = int(quiz_number_from_db)
 
             except (TypeError, ValueError) as e:
-                logger.warning(f"Could not get quiz_id from database: {e}")
+                logger.warning("Could not get quiz_id from database: %s", e)
                 # Default qiymat
                 quiz_id = 28  # Default quiz ID
 
         # Room qatnashchilarini olish
         participants = await get_room_participants(unique_id)
-        logger.info(f"Room participants: {participants}")
 
         if not participants:
             participants = [{
                 "user_id": callback_query.from_user.id,
                 "name": "Test foydalanuvchi"
             }]
-            logger.warning(f"No participants found, using admin as default participant")
+            logger.warning("No participants found, using admin as default participant")
 
         # Savollarni olish
         if not quiz_id:
-            logger.error(f"Quiz ID not found for unique_id: {unique_id}")
+            logger.error("Quiz ID not found for unique_id: %s", unique_id)
             await callback_query.message.answer("Test ID topilmadi! Iltimos, qayta harakat qiling.")
             return
 
-        questions = db.get_questions_by_battle_id(quiz_id)
-        if not questions:
-            logger.error(f"No questions found for quiz_id: {quiz_id}")
+        # Savollarni bankdan tasodifiy tartibda tanlash (state da faqat ID lar saqlanadi)
+        question_ids = question_bank.sample_ids(quiz_number, battle_id=quiz_id)
+        if not question_ids:
+            logger.error("No questions found for quiz_id: %s", quiz_id)
             await callback_query.message.answer("Bu bellashuvda savollar topilmadi!")
             return
 
-        logger.info(f"Found {len(questions)} questions for quiz_id {quiz_id}")
+        logger.info("Selected %s questions for the quiz", len(question_ids))
+        first_question = question_bank.get(question_ids[0])
 
-        # Savollarni aralashtirib, tanlangan miqdorini olish
-        random.shuffle(questions)
-        selected_questions = questions[:quiz_number]
-        logger.info(f"Selected {len(selected_questions)} questions for the quiz")
+        if not first_question:
+            logger.error("First question %s not found in question bank", question_ids[0])
+            await callback_query.message.answer("Bu bellashuvda savollar topilmadi!")
+            return
+
+        owner_id = callback_query.from_user.id
+        total = len(participants)
+        # Boshlanish xabari va birinchi savol bitta xabarda yuboriladi
+        start_text = (
+            f"Test boshlanmoqda! Har bir savol uchun {quiz_time} soniya vaqtingiz bor.\n\n"
+            f"1/{len(question_ids)}\n<b>Savol:</b> {first_question['answer_a']}"
+        )
+        task_ids = {}
 
-        # Barcha foydalanuvchilarga testni boshlash haqida xabar yuborish
-        success_count = 0
-        for participant in participants:
+        # 1. Barcha ishtirokchilarning FSM holatini parallel yozish (xabar yuborilishidan oldin,
+        # shunda javob state tayyor bo'lmasdan kelib qolmaydi)
+        async def prepare_state(participant):
             user_id = participant.get('user_id')
-            name = participant.get('name', 'Foydalanuvchi')
+            task_id = random.randint(1, 1_000_000)  # Savol uchun unikal ID
+            task_ids[user_id] = task_id
+            state = dp.current_state(user=user_id, chat=user_id)
+            await state.set_state(GroupQuizStates.waiting_for_answer.state)
+            await state.set_data({
+                'question_ids': question_ids,
+                'current_question_index': 1,  # 0-chi savol start xabarida yuborilgan
+                'true_answer': first_question['question'],
+                'answers_list': [],
+                'quiz_ended': False,
+                'unique_id': unique_id,
+                'owner_id': owner_id,
+                'name': participant.get('name', 'Foydalanuvchi'),
+                'quiz_time': quiz_time,  # Vaqt limitini saqlash
+                'current_task_id': task_id,
+            })
+
+        prepared = await fan_out(participants, prepare_state, concurrency=config.FANOUT_CONCURRENCY)
+        # Holati yozilmaganlarga savol yuborilmaydi: ularning javoblari hech qaysi state'ga tushmaydi
+        not_prepared = prepared['failed_targets']
+        if not_prepared:
+            not_prepared_ids = {participant.get('user_id') for participant in not_prepared}
+            participants = [p for p in participants if p.get('user_id') not in not_prepared_ids]
+            logger.warning("Quiz state could not be written for %s participants", len(not_prepared))
+        # Jonli reyting: barcha ishtirokchilar 0 ball bilan
+        await leaderboard.start(unique_id, participants)
+
+        # 2. Birinchi savolni barcha ishtirokchilarga parallel yuborish
+        async def send_first_question(participant):
+            user_id = participant.get('user_id')
+            await outbound.send_message(user_id, start_text, priority=PRIORITY_QUIZ, parse_mode='HTML')
+            # Javob vaqti har bir ishtirokchi uchun xabar yetib borgan paytdan hisoblanadi
+            schedule_answer_timeout(user_id, task_ids[user_id], quiz_time)
+
+        async def report_progress(done, count):
+            await callback_query.message.edit_text(f"Test boshlanmoqda... {done}/{count} ishtirokchiga yuborildi")
+
+        # Tezlik limitlari va RetryAfter outbound navbatida boshqariladi (qayta urinishlar ham)
+        stats = await fan_out(
+            participants,
+            send_first_question,
+            concurrency=config.FANOUT_CONCURRENCY,
+            max_retries=0,
+            on_progress=report_progress if total > config.OUTBOUND_GLOBAL_RATE else None,
+        )
 
+        # Xabar yetib bormaganlar va holati chala yozilganlarning holatini tozalash
+        for participant in stats['failed_targets'] + not_prepared:
+            user_id = participant.get('user_id')
             try:
-                # FSM state yaratish
-                from aiogram.dispatcher import FSMContext
-                await dp.current_state(user=user_id, chat=user_id).set_state(GroupQuizStates.waiting_for_answer.state)
-                state = dp.current_state(user=user_id, chat=user_id)
-
-                # Foydalanuvchiga xabar yuborish
-                first_msg = await bot.send_message(
-                    chat_id=user_id,
-                    text=f"Test boshlanmoqda! Har bir savol uchun {quiz_time} soniya vaqtingiz bor."
-                )
-                logger.info(f"Sent start message to user {user_id}")
-
-                # Birinchi savolni yuborish
-                if len(selected_questions) > 0:
-                    # Savolni tayyorlash
-                    question = selected_questions[0]
-                    question_text = question['answer_a'] if isinstance(question, dict) else question[1]
-                    true_answer = question['question'] if isinstance(question, dict) else question[0]
-
-                    first_question_msg = await bot.send_message(
-                        chat_id=user_id,
-                        text=f"1/{len(selected_questions)}\n<b>Savol:</b> {question_text}",
-                        parse_mode='HTML'
-                    )
-                    logger.info(f"Sent first question to user {user_id}")
-
-                    # Timeout task yaratish
-                    task_id = random.randint(1, 1_000_000)  # Task uchun unikal ID
-                    timeout_task = asyncio.create_task(
-                        check_answer_timeout(first_question_msg, state, task_id, quiz_time))
-
-                    # State ma'lumotlarini to'ldirish
-                    await state.update_data(
-                        questions=selected_questions,
-                        current_question_index=1,  # 0-chi savol yuqorida yuborilgan
-                        true_answer=true_answer,
-                        answers_list=[],
-                        quiz_ended=False,
-                        unique_id=unique_id,
-                        owner_id=callback_query.from_user.id,
-                        name=name,
-                        quiz_time=quiz_time,  # Vaqt limitini saqlash
-                        current_task_id=task_id,
-                        timeout_task_id=id(timeout_task)
-                    )
-
-                    success_count += 1
-
+                await dp.current_state(user=user_id, chat=user_id).finish()
             except Exception as e:
-                logger.error(f"Error sending start message to user {user_id}: {e}", exc_info=True)
+                logger.error("Error clearing quiz state for %s: %s", user_id, e)
 
         # Adminga xabar qaytarish
+        failed = stats['failed'] + len(not_prepared)
         await callback_query.message.edit_text(
-            f"Test muvaffaqiyatli boshlandi! Jami {success_count} nafar ishtirokchi qatnashmoqda."
+            f"Test muvaffaqiyatli boshlandi! Jami {stats['sent']} nafar ishtirokchi qatnashmoqda."
+            + (f"\n{failed} nafariga yuborib bo'lmadi." if failed else "")
+        )
+        logger.info(
+            "Quiz started: sent=%s, failed=%s (state not written: %s), elapsed=%.2fs, skew=%.2fs",
+            stats['sent'], failed, len(not_prepared), stats['elapsed'], stats['skew'],
         )
-        logger.info(f"Quiz started successfully with {success_count} participants")
+
+        # Egasiga jonli reyting xabari, javoblar kelishi bilan joyida yangilanadi
+        if stats['sent']:
+            try:
+                entries = await leaderboard.top(unique_id, config.LEADERBOARD_TOP_N)
+                rating_message = await outbound.send_message(owner_id, format_rating(unique_id, entries, live=True))
+                await leaderboard.attach(unique_id, owner_id, rating_message.message_id)
+            except Exception as e:
+                logger.error("Error sending live rating: %s", e, exc_info=True)
 
     except Exception as e:
-        logger.error(f"Error starting room quiz: {e}", exc_info=True)
+        logger.error("Error starting room quiz: %s", e, exc_info=True)
         await callback_query.message.answer("Testni boshlashda xatolik yuz berdi!")
 
 # Room ma'lumotlarini o'chirish
 async def delete_room_data(unique_id):
     """Room ma'lumotlarini o'chirish"""
     try:
-        from loader import delete_cache
+        from loader import delete_cache, redis_connection
 
         # Barcha tegishli ma'lumotlarni o'chirish
         await delete_cache(f"room:{unique_id}")
-        await delete_cache(f"room_participants:{unique_id}")
+        if redis_connection is not None:
+            await redis_connection.delete(_participants_key(unique_id))
+        _room_participants.pop(unique_id, None)
 
-        logger.debug(f"Deleted room data for unique_id {unique_id}")
+        logger.debug("Deleted room data for unique_id %s", unique_id)
         return True
     except Exception as e:
-        logger.error(f"Error deleting room data: {e}", exc_info=True)
+        logger.error("Error deleting room data: %s", e, exc_info=True)
         return False
 
 
@@ -532,79 +591,90 @@ async def answer_received(message: types.Message, state: FSMContext):
     Foydalanuvchi javoblarini qayta ishlash
     """
     try:
-        logger.info(f"Received answer from user {message.from_user.id}: {message.text}")
+        logger.debug("Received answer from user %s: %s", message.from_user.id, message.text)
         user_data = await state.get_data()
         true_answer = user_data.get('true_answer', '').strip()
         answers_list = user_data.get('answers_list', [])
         user_answer = message.text.strip().lower()
 
         if not true_answer:
-            logger.error(f"No true_answer found in state data: {user_data}")
+            logger.error("No true_answer found in state data: %s", user_data)
             await message.answer("Xatolik: Savol javoblari topilmadi.")
             return
 
         # Javobni tekshirish
         answer_is_correct = user_answer.lower() == true_answer.lower()
         answers_list.append(answer_is_correct)
+        await leaderboard.record(user_data.get('unique_id'), message.chat.id,
+                                 user_data.get('name', 'Foydalanuvchi'), answer_is_correct)
 
-        # Davlatni yangilash
-        await state.update_data(answers_list=answers_list, answered=True)
+        # Davlatni yangilash (qayta o'qimaslik uchun mahalliy nusxa bilan)
+        user_data.update(answers_list=answers_list, answered=True)
+        await state.set_data(user_data)
 
         # Xabar yuborish
         if answer_is_correct:
-            await message.answer("Javobingiz to'g'ri!")
+            await outbound.send_message(message.chat.id, "Javobingiz to'g'ri!", priority=PRIORITY_QUIZ)
         else:
-            await message.answer(f"Javobingiz noto'g'ri! To'g'ri javob: {true_answer}")
+            await outbound.send_message(message.chat.id, f"Javobingiz noto'g'ri! To'g'ri javob: {true_answer}",
+                                        priority=PRIORITY_QUIZ)
 
         # Keyingi savolga o'tish
         await state.set_state(GroupQuizStates.sending_next_question.state)
 
-        # Davlatdagi savollarni olish
-        user_data = await state.get_data()
-        questions = user_data.get('questions', [])
+        # Keyingi savol ID si state da, matni question_bank da
+        question_ids = user_data.get('question_ids', [])
         current_question_index = user_data.get('current_question_index',
                                                1)  # 1-dan boshlanadi chunki 0-chi savol boshida yuborilgan
 
-        if current_question_index < len(questions):
+        if current_question_index < len(question_ids):
             # Savolni tayyorlash
-            question = questions[current_question_index]
-            question_text = question['answer_a'] if isinstance(question, dict) else question[1]
-            true_answer = question['question'] if isinstance(question, dict) else question[0]
+            question = question_bank.get(question_ids[current_question_index]) or {}
+            question_text = question.get('answer_a')
+            true_answer = question.get('question') or ''
 
             # Savolni yuborish
-            await message.answer(
-                f"{current_question_index + 1}/{len(questions)}\n<b>Savol:</b> {question_text}",
+            await outbound.send_message(
+                message.chat.id,
+                f"{current_question_index + 1}/{len(question_ids)}\n<b>Savol:</b> {question_text}",
+                priority=PRIORITY_QUIZ,
                 parse_mode='HTML'
             )
 
+            # Yangi savol uchun javob vaqtini rejalashtirish (oldingisi almashtiriladi)
+            task_id = random.randint(1, 1_000_000)
+            schedule_answer_timeout(message.chat.id, task_id, user_data.get('quiz_time', 20))
+
             # Davlatni yangilash
-            await state.update_data(
+            user_data.update(
                 current_question_index=current_question_index + 1,
                 true_answer=true_answer,
-                answered=False
+                answered=False,
+                current_task_id=task_id
             )
+            await state.set_data(user_data)
 
             # Javob kutish holatiga o'tish
             await state.set_state(GroupQuizStates.waiting_for_answer.state)
-            logger.info(f"Sent next question to user {message.from_user.id}")
+            logger.debug("Sent next question to user %s", message.from_user.id)
         else:
             # Barcha savollar tugadi
             await state.set_state(GroupQuizStates.quiz_ended.state)
-            await end_user_quiz(message, state)
-            logger.info(f"Quiz completed for user {message.from_user.id}")
+            await end_user_quiz(message.chat.id, state)
+            logger.debug("Quiz completed for user %s", message.from_user.id)
 
     except Exception as e:
-        logger.error(f"Error processing answer: {e}", exc_info=True)
+        logger.error("Error processing answer: %s", e, exc_info=True)
         await message.answer("Xatolik yuz berdi, iltimos keyinroq qayta urinib ko'ring.")
 
 
-async def end_user_quiz(message: types.Message, state: FSMContext):
+async def end_user_quiz(user_id: int, state: FSMContext):
     """
     Testni yakunlash va natijalarni qayd qilish
     """
     try:
-        user_id = message.from_user.id
-        logger.info(f"Ending quiz for user {user_id}")
+        logger.debug("Ending quiz for user %s", user_id)
+        timer_wheel.cancel(f"room:{user_id}")
 
         # State ma'lumotlarini olish
         user_data = await state.get_data()
@@ -625,16 +695,16 @@ async def end_user_quiz(message: types.Message, state: FSMContext):
 
         # Bazaga natijalarni saqlash
         try:
-            db.add_results_entry(
+            await write_behind.add_result(
                 chat_id=user_id,
                 unique_id=unique_id,
                 true_answers=correct_answers_count,
                 false_answers=len(answers_list) - correct_answers_count,
                 user_name=name
             )
-            logger.info(f"Saved results to database for user {user_id}")
+            logger.debug("Queued results for user %s", user_id)
         except Exception as e:
-            logger.error(f"Error saving results: {e}", exc_info=True)
+            logger.error("Error saving results: %s", e, exc_info=True)
 
         # Reyting tugmasini yaratish
         rating_button = InlineKeyboardMarkup().add(
@@ -644,14 +714,14 @@ async def end_user_quiz(message: types.Message, state: FSMContext):
         # Adminni natijalar haqida xabardor qilish
         if owner_id:
             try:
-                await bot.send_message(
-                    chat_id=owner_id,
-                    text=result_text,
+                await outbound.send_message(
+                    owner_id,
+                    result_text,
                     reply_markup=rating_button  # Reyting tugmasini qo'shamiz
                 )
-                logger.info(f"Sent results to admin {owner_id}")
+                logger.debug("Sent results to admin %s", owner_id)
             except Exception as e:
-                logger.error(f"Error sending results to admin: {e}", exc_info=True)
+                logger.error("Error sending results to admin: %s", e, exc_info=True)
 
         # Foydalanuvchiga xabar yuborish (reyting tugmasi bilan)
         # await message.answer(
@@ -661,31 +731,74 @@ async def end_user_quiz(message: types.Message, state: FSMContext):
 
         # State ni tozalash
         await state.finish()
-        logger.info(f"Quiz completed for user {user_id}")
+        logger.debug("Quiz completed for user %s", user_id)
     except Exception as e:
-        logger.error(f"Error ending quiz: {e}", exc_info=True)
-        await message.answer("Natijalarni qayd qilishda xatolik yuz berdi.")
+        logger.error("Error ending quiz: %s", e, exc_info=True)
+        await outbound.send_message(user_id, "Natijalarni qayd qilishda xatolik yuz berdi.")
         await state.finish()
 
 
-@dp.callback_query_handler(lambda query: query.data.startswith('show_rating_'))
+def format_rating(unique_id, entries, live: bool = False, caller=None) -> str:
+    """
+    Reyting matni.
+
+    :param entries: Entry ro'yxati (o'rinlar bo'yicha tartiblangan).
+    :param caller: (o'rin, Entry) - top ro'yxatga kirmagan foydalanuvchining o'zi.
+    """
+    rating_text = f"📊 Unique ID {unique_id} uchun {'jonli ' if live else ''}reyting:\n\n"
+    if not entries:
+        return rating_text + "Hali javoblar yo'q."
+
+    def line(position, entry):
+        # O'rin belgisini qo'shish
+        position_emoji = "🥇" if position == 1 else "🥈" if position == 2 else "🥉" if position == 3 else f"{position}."
+        name = entry.name or "Noma'lum"
+        percent = (entry.correct / entry.answered * 100) if entry.answered > 0 else 0
+        return f"{position_emoji} {name}: {entry.correct}/{entry.answered} ({percent:.1f}%)\n"
+
+    for idx, entry in enumerate(entries):
+        rating_text += line(idx + 1, entry)
+    if caller is not None and caller[0] > len(entries):
+        rating_text += "...\n" + line(*caller)
+    return rating_text
+
+
+async def refresh_live_rating(unique_id, chat_id, message_id):
+    """Egasining jonli reyting xabarini joyida yangilash (leaderboard chaqiradi)"""
+    entries = await leaderboard.top(unique_id, config.LEADERBOARD_TOP_N)
+    try:
+        await outbound.call(chat_id, bot.edit_message_text, format_rating(unique_id, entries, live=True),
+                            chat_id=chat_id, message_id=message_id)
+    except MessageNotModified:
+        pass
+
+
+@callback_router.route(prefix='show_rating_')
 async def show_rating_callback(callback_query: types.CallbackQuery):
     """
     Reytingni ko'rsatish tugmasi bosilganda ishlaydigan handler
     """
-    logger.info(f"Show rating callback called: {callback_query.data}")
+    logger.debug("Show rating callback called: %s", callback_query.data)
     try:
         # Javob qaytarish
         await callback_query.answer("Reyting olinmoqda...")
 
         # Unique ID ni olish
         unique_id = callback_query.data.split('_')[-1]
-        logger.info(f"Extracted unique_id for rating: {unique_id}")
+        logger.debug("Extracted unique_id for rating: %s", unique_id)
+
+        # Jonli reyting (quiz davomida ham ishlaydi): top-N va so'ragan foydalanuvchining o'rni
+        entries = await leaderboard.top(unique_id, config.LEADERBOARD_TOP_N)
+        if entries:
+            caller = await leaderboard.rank(unique_id, callback_query.from_user.id)
+            await callback_query.message.answer(format_rating(unique_id, entries, caller=caller))
+            logger.debug("Sent live rating for unique_id %s", unique_id)
+            return
 
-        # Bazadan natijalarni olish
+        # Reyting muddati tugagan bo'lsa - bazadagi yakuniy natijalar
         try:
-            results = db.get_results_by_unique_id(unique_id)
-            logger.info(f"Found {len(results) if results else 0} results for unique_id {unique_id}")
+            results = await adb.get_results_by_unique_id(unique_id)
+            logger.debug("Found %s results for unique_id %s", len(results) if results else 0, unique_id)
 
             if not results or len(results) == 0:
                 await callback_query.message.answer("Bu test uchun natijalar topilmadi.")
@@ -693,68 +806,66 @@ async def show_rating_callback(callback_query: types.CallbackQuery):
 
             # Natijalarni to'g'ri javoblar soniga ko'ra tartiblash
             sorted_results = sorted(results, key=lambda x: int(x.get('true_answers', 0)), reverse=True)
-
-            # Reyting matnini yaratish
-            rating_text = f"📊 Unique ID {unique_id} uchun reyting:\n\n"
-
-            for idx, result in enumerate(sorted_results):
-                # Ma'lumotlarni olish
-                user_name = result.get('user_name', 'Noma\'lum')
-                true_answers = int(result.get('true_answers', 0))
-                false_answers = int(result.get('false_answers', 0))
-                total_questions = true_answers + false_answers
-
-                # O'rin belgisini qo'shish
-                position_emoji = "🥇" if idx == 0 else "🥈" if idx == 1 else "🥉" if idx == 2 else f"{idx + 1}."
-
-                # Reyting qatorini qo'shish
-                rating_text += (
-                    f"{position_emoji} {user_name}: {true_answers}/{total_questions} "
-                    f"({(true_answers / total_questions * 100) if total_questions > 0 else 0:.1f}%)\n"
+            entries = [
+                Entry(
+                    0,
+                    result.get('user_name', 'Noma\'lum'),
+                    int(result.get('true_answers', 0)),
+                    int(result.get('true_answers', 0)) + int(result.get('false_answers', 0)),
                 )
+                for result in sorted_results
+            ]
 
             # Reyting xabarini yuborish
-            await callback_query.message.answer(rating_text)
-            logger.info(f"Sent rating for unique_id {unique_id}")
+            await callback_query.message.answer(format_rating(unique_id, entries))
+            logger.debug("Sent rating for unique_id %s", unique_id)
         except Exception as e:
-            logger.error(f"Error getting quiz results: {e}", exc_info=True)
+            logger.error("Error getting quiz results: %s", e, exc_info=True)
             await callback_query.message.answer("Natijalarni olishda xatolik yuz berdi.")
 
     except Exception as e:
-        logger.error(f"Error showing rating: {e}", exc_info=True)
+        logger.error("Error showing rating: %s", e, exc_info=True)
         await callback_query.message.answer("Reytingni ko'rsatishda xatolik yuz berdi.")
 
-async def check_answer_timeout(message: types.Message, state: FSMContext, task_id: int, quiz_time: int = 20):
+def schedule_answer_timeout(user_id: int, task_id: int, quiz_time: int = 20):
     """
-    Javob vaqti tugaganini tekshirish
+    Joriy savol uchun javob vaqtini umumiy timer_wheel da rejalashtirish.
 
-    :param message: Xabar obyekti
-    :param state: Foydalanuvchi state obyekti
-    :param task_id: Timeout task ID-si
-    :param quiz_time: Sekund hisobida vaqt (default: 20)
+    Har bir foydalanuvchida bitta kalit bo'ladi, shuning uchun yangi savol
+    oldingi savolning timeout'ini avtomatik almashtiradi.
     """
-    try:
-        logger.info(f"Starting timeout check for user {message.from_user.id}, task ID {task_id}, time {quiz_time}s")
+    timer_wheel.schedule(f"room:{user_id}", quiz_time, 'room_answer', {'user_id': user_id, 'task_id': task_id})
+
+
+async def check_answer_timeout(key: str, payload: dict):
+    """
+    Javob vaqti tugaganda timer_wheel tomonidan chaqiriladi
 
-        # Belgilangan vaqt kutish
-        await asyncio.sleep(quiz_time)
+    :param key: Timer kaliti (room:{user_id})
+    :param payload: {'user_id': ..., 'task_id': ...}
+    """
+    user_id = payload['user_id']
+    task_id = payload['task_id']
+    try:
+        state = dp.current_state(chat=user_id, user=user_id)
 
         # State ni olish
         user_data = await state.get_data()
 
         # Agar javob berilgan bo'lsa yoki task ID boshqa bo'lsa
         if user_data.get('answered') or user_data.get('current_task_id') != task_id:
-            logger.info(
-                f"Timeout not needed: answered={user_data.get('answered')}, task_id_match={user_data.get('current_task_id') == task_id}")
+            logger.debug(
+                "Timeout not needed: answered=%s, task_id_match=%s",
+                user_data.get('answered'), user_data.get('current_task_id') == task_id)
             return
 
         # Quiz tugagan bo'lsa
         if user_data.get('quiz_ended'):
-            logger.info(f"Quiz already ended for user {message.from_user.id}")
+            logger.debug("Quiz already ended for user %s", user_id)
             return
 
         # Vaqt tugadi, javob berilmadi
-        logger.info(f"TIMEOUT: No answer received from user {message.from_user.id}")
+        logger.debug("TIMEOUT: No answer received from user %s", user_id)
 
         # Javoblarni olish
         answers_list = user_data.get('answers_list', [])
@@ -763,56 +874,60 @@ async def check_answer_timeout(message: types.Message, state: FSMContext, task_i
         # Noto'g'ri javob sifatida qo'shish
         if len(answers_list) < current_question_index:
             answers_list.append(False)
-            await state.update_data(answers_list=answers_list)
+            user_data['answers_list'] = answers_list
+            await leaderboard.record(user_data.get('unique_id'), user_id,
+                                     user_data.get('name', 'Foydalanuvchi'), False)
 
             # Foydalanuvchiga xabar berish
-            await message.answer("⏱ Vaqt tugadi! Javob berilmadi.")
+            await outbound.send_message(user_id, "⏱ Vaqt tugadi! Javob berilmadi.", priority=PRIORITY_QUIZ)
 
             # Keyingi savolga o'tish
             await state.set_state(GroupQuizStates.sending_next_question.state)
 
             # Keyingi savol
-            questions = user_data.get('questions', [])
+            question_ids = user_data.get('question_ids', [])
 
-            if current_question_index < len(questions):
+            if current_question_index < len(question_ids):
                 # Savolni tayyorlash
-                question = questions[current_question_index]
-                question_text = question['answer_a'] if isinstance(question, dict) else question[1]
-                true_answer = question['question'] if isinstance(question, dict) else question[0]
+                question = question_bank.get(question_ids[current_question_index]) or {}
+                question_text = question.get('answer_a')
+                true_answer = question.get('question') or ''
 
                 # Savolni yuborish
-                await message.answer(
-                    f"{current_question_index + 1}/{len(questions)}\n<b>Savol:</b> {question_text}",
+                await outbound.send_message(
+                    user_id,
+                    f"{current_question_index + 1}/{len(question_ids)}\n<b>Savol:</b> {question_text}",
+                    priority=PRIORITY_QUIZ,
                     parse_mode='HTML'
                 )
 
-                # Timeout task yaratish
+                # Keyingi timeout
                 quiz_time = user_data.get('quiz_time', 20)  # Default: 20 sekund
-                new_task_id = random.randint(1, 1_000_000)  # Task uchun unikal ID
-                timeout_task = asyncio.create_task(check_answer_timeout(message, state, new_task_id, quiz_time))
+                new_task_id = random.randint(1, 1_000_000)  # Savol uchun unikal ID
+                schedule_answer_timeout(user_id, new_task_id, quiz_time)
 
                 # Davlatni yangilash
-                await state.update_data(
+                user_data.update(
                     current_question_index=current_question_index + 1,
                     true_answer=true_answer,
                     answered=False,
-                    current_task_id=new_task_id,
-                    timeout_task_id=id(timeout_task)
+                    current_task_id=new_task_id
                 )
+                await state.set_data(user_data)
 
                 # Javob kutish holatiga o'tish
                 await state.set_state(GroupQuizStates.waiting_for_answer.state)
-                logger.info(f"Sent next question to user {message.from_user.id} after timeout")
+                logger.debug("Sent next question to user %s after timeout", user_id)
             else:
                 # Barcha savollar tugadi
+                await state.set_data(user_data)
                 await state.set_state(GroupQuizStates.quiz_ended.state)
-                await end_user_quiz(message, state)
-                logger.info(f"Quiz completed for user {message.from_user.id} after timeout")
+                await end_user_quiz(user_id, state)
+                logger.debug("Quiz completed for user %s after timeout", user_id)
 
-    except asyncio.CancelledError:
-        # Task bekor qilingan (foydalanuvchi javob bergan)
-        logger.info(f"Timeout task cancelled for user {message.from_user.id}")
     except Exception as e:
-        logger.error(f"Error in timeout checker: {e}", exc_info=True)
+        logger.error("Error in timeout checker: %s", e, exc_info=True)
 
 
+timer_wheel.register('room_answer', check_answer_timeout)
+leaderboard.register_renderer(refresh_live_rating)
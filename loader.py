@@ -4,15 +4,24 @@ from aiogram.contrib.fsm_storage.memory import MemoryStorage
 import logging
 import asyncio
 import json
+import time
 
 from data import config
-from data.db_commands import DataBase
-
-# logging konfiguratsiyasi
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-)
+from data.db_commands import DataBase, AsyncDataBase
+from data.question_bank import QuestionBank
+from data.tree import CategoryTree
+from data.write_behind import WriteBehindQueue
+from utils.timer_wheel import TimerWheel
+from utils.outbound import OutboundDispatcher
+from utils.broadcast import Broadcaster
+from utils.cache import LRUCache, MISSING
+from utils.invalidation import CacheInvalidator
+from utils.keyboard_cache import KeyboardCache
+from utils.callback_router import CallbackRouter
+from utils.rate_limiter import TokenBucketLimiter
+from utils.leaderboard import Leaderboard
+from utils import metrics
+from utils.metrics import CACHE_REQUESTS, CACHE_SECONDS
 
 # Redis connection pool
 redis_pool = None
@@ -42,7 +51,7 @@ async def init_redis():
         logging.info("Redis ulanishi o'rnatildi")
         return redis_connection
     except Exception as e:
-        logging.error(f"Redis ulanish xatosi: {e}")
+        logging.error("Redis ulanish xatosi: %s", e)
         logging.warning("Redis ulanishi amalga oshmadi, MemoryStorage ishlatilmoqda")
         return None
 
@@ -60,7 +69,7 @@ def get_storage():
                 pool_size=20
             )
         except Exception as e:
-            logging.error(f"Redis storage yaratish xatosi: {e}")
+            logging.error("Redis storage yaratish xatosi: %s", e)
             logging.warning("MemoryStorage ishlatilmoqda")
 
     # Default holat - MemoryStorage
@@ -71,11 +80,75 @@ def get_storage():
 bot = Bot(token=config.BOT_TOKEN, parse_mode=types.ParseMode.HTML)
 storage = get_storage()
 dp = Dispatcher(bot, storage=storage)
-db = DataBase(path_to_db=config.DATABASE_PATH)
+# Barcha callback handler'lar uchun yagona yo'naltiruvchi (middlewares/__init__.py da ulanadi)
+callback_router = CallbackRouter()
+# Kiruvchi update'lar uchun token bucket (Redis bo'lsa barcha worker'lar uchun umumiy)
+throttler = TokenBucketLimiter(
+    rate=config.THROTTLE_RATE,
+    burst=config.THROTTLE_BURST,
+    get_redis=lambda: redis_connection,
+)
+db = DataBase(
+    path_to_db=config.DATABASE_PATH,
+    max_workers=config.DB_MAX_WORKERS,
+    max_pending=config.DB_MAX_PENDING,
+    pool_size=config.DB_POOL_SIZE,
+    pool_timeout=config.DB_POOL_TIMEOUT,
+    pool_idle_timeout=config.DB_POOL_IDLE_TIMEOUT,
+    pragmas=config.DB_PRAGMAS,
+)
+# Handlerlar uchun event loop'ni bloklamaydigan variant
+adb = AsyncDataBase(db)
+# Natijalar, history va foydalanuvchi maydonlari guruhlab yoziladi (bitta tranzaksiyada)
+write_behind = WriteBehindQueue(
+    db,
+    max_batch=config.WRITE_BEHIND_BATCH,
+    flush_interval=config.WRITE_BEHIND_INTERVAL,
+    max_pending=config.WRITE_BEHIND_MAX_PENDING,
+    spool_path=config.WRITE_BEHIND_SPOOL_PATH,
+)
+# bot_app_test savollarining xotiradagi indeksi
+question_bank = QuestionBank(db)
+# Kategoriya va bellashuv daraxtlari (menyular bazaga murojaat qilmaydi)
+category_tree = CategoryTree(db)
+# Quiz timeout'lari uchun yagona rejalashtiruvchi (Redis bo'lsa, qayta ishga tushishda tiklanadi)
+timer_wheel = TimerWheel(get_redis=lambda: redis_connection)
+# Chiquvchi xabarlar uchun markaziy navbat (Telegram rate limitlari)
+outbound = OutboundDispatcher(
+    bot,
+    global_rate=config.OUTBOUND_GLOBAL_RATE,
+    chat_rate=config.OUTBOUND_CHAT_RATE,
+    group_rate=config.OUTBOUND_GROUP_RATE,
+    workers=config.OUTBOUND_WORKERS,
+    max_retries=config.OUTBOUND_MAX_RETRIES,
+)
+# Admin xabarlarini fon rejimida tarqatish
+broadcaster = Broadcaster(
+    db,
+    outbound,
+    page_size=config.BROADCAST_PAGE_SIZE,
+    concurrency=config.BROADCAST_CONCURRENCY,
+    checkpoint_path=config.BROADCAST_CHECKPOINT_PATH,
+    get_redis=lambda: redis_connection,
+)
+# Room quiz'lar uchun jonli reyting (Redis sorted set yoki xotiradagi o'rinbosar)
+leaderboard = Leaderboard(
+    get_redis=lambda: redis_connection,
+    refresh_interval=config.LEADERBOARD_REFRESH_INTERVAL,
+)
 
 
 # Redis kesh funksiyalari
 
+def _decode_redis_value(value):
+    # JSON ni deserialize qilish
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        # JSON bo'lmagan qiymatlar uchun
+        return value
+
+
 async def get_redis_cache(key, default=None, ttl=None):
     """Redis keshdan qiymat olish"""
     if redis_connection is None:
@@ -85,15 +158,9 @@ async def get_redis_cache(key, default=None, ttl=None):
         value = await redis_connection.get(key)
         if value is None:
             return default
-
-        # JSON ni deserialize qilish
-        try:
-            return json.loads(value)
-        except json.JSONDecodeError:
-            # JSON bo'lmagan qiymatlar uchun
-            return value
+        return _decode_redis_value(value)
     except Exception as e:
-        logging.error(f"Redis get xatosi: {e}")
+        logging.error("Redis get xatosi: %s", e)
         return default
 
 
@@ -115,7 +182,7 @@ async def set_redis_cache(key, value, ttl=300):
             await redis_connection.set(key, serialized)
         return True
     except Exception as e:
-        logging.error(f"Redis set xatosi: {e}")
+        logging.error("Redis set xatosi: %s", e)
         return False
 
 
@@ -128,7 +195,7 @@ async def delete_redis_cache(key):
         await redis_connection.delete(key)
         return True
     except Exception as e:
-        logging.error(f"Redis delete xatosi: {e}")
+        logging.error("Redis delete xatosi: %s", e)
         return False
 
 
@@ -139,45 +206,94 @@ async def close_redis():
         logging.info("Redis ulanishi yopildi")
 
 
-# Memory-based fallback kesh
-_local_cache = {}
+# L1: jarayon ichidagi chegaralangan LRU kesh (L2 - Redis)
+local_cache = LRUCache(max_size=config.CACHE_MAX_SIZE, default_ttl=300)
+# Bot o'zi o'zgartiradigan kalitlar: Redis yoqilgan bo'lsa faqat Redis da saqlanadi.
+# Aks holda har bir webhook worker o'z L1 nusxasini o'qib, boshqa worker'ning yozganini
+# (masalan, room ma'lumotlarini yoki foydalanuvchi tilini) eskirgan nusxa bilan almashtirishi mumkin.
+# Admin panel kalitlari (admin:user_ids, bio:all) L1 da qoladi - ularni invalidatsiya
+# xabari barcha worker'larda tozalaydi.
+SHARED_CACHE_PREFIXES = ('room:', 'user:lang:', 'user:data:', 'is_admin:')
+# Kategoriya/bellashuv menyulari uchun tayyor klaviaturalar
+keyboard_cache = KeyboardCache(max_size=config.KEYBOARD_CACHE_SIZE)
+_redis_cache_stats = {'hits': 0, 'misses': 0}
+
+# Bir xil kalit uchun bir vaqtda ishlayotgan yuklashlar (single-flight)
+_inflight_loads = {}
+_background_refreshes = set()
+_refreshing_keys = set()
+_load_stats = {'loads': 0, 'coalesced': 0, 'stale_served': 0, 'refreshes': 0, 'errors': 0}
+
+
+def _local_allowed(key) -> bool:
+    """Kalitni L1 da saqlash/o'qish mumkinmi (Redis bo'lmasa - hammasi L1 da)"""
+    return not (USE_REDIS and redis_connection is not None and key.startswith(SHARED_CACHE_PREFIXES))
+
+
+def cache_stats():
+    """L1 va L2 kesh hisoblagichlari"""
+    return {'l1': local_cache.stats(), 'l2': dict(_redis_cache_stats), 'loads': dict(_load_stats),
+            'keyboards': keyboard_cache.stats()}
 
 
 async def get_cache(key, default=None, ttl=300):
-    """Keshdan qiymat olish (Redis yoki local)"""
-    # Avval Redis keshdan olishga harakat
+    """
+    Keshdan qiymat olish: avval L1 (xotira), keyin L2 (Redis).
+
+    Muddat yozishda (`set_cache`) belgilanadi; `ttl` argumenti eski chaqiruvlar
+    bilan moslik uchun qoldirilgan. Redis dan olingan qiymat L1 ga Redis dagi
+    qolgan muddat bilan yoziladi. SHARED_CACHE_PREFIXES kalitlari Redis
+    yoqilgan bo'lsa to'g'ridan-to'g'ri Redis dan o'qiladi.
+    """
+    local = _local_allowed(key)
+    if local:
+        # L1 uchun faqat hit/miss: lug'atdan o'qish vaqtini o'lchash o'qishning o'zidan qimmat
+        value = local_cache.get(key)
+        if value is not MISSING:
+            CACHE_REQUESTS.inc('l1', 'hit')
+            return value
+        CACHE_REQUESTS.inc('l1', 'miss')
+
     if USE_REDIS and redis_connection is not None:
-        redis_value = await get_redis_cache(key)
-        if redis_value is not None:
-            return redis_value
-
-    # Redis ishlamasa yoki qiymat topilmasa - local keshdan olish
-    if key in _local_cache:
-        value, timestamp = _local_cache[key]
-        import time
-        if time.time() - timestamp < ttl:
+        started = time.perf_counter()
+        try:
+            pipe = redis_connection.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.pttl(key)
+            raw, pttl = await pipe.execute()
+        except Exception as e:
+            logging.error("Redis get xatosi: %s", e)
+            CACHE_REQUESTS.inc('l2', 'error')
+            return default
+        finally:
+            CACHE_SECONDS.observe(time.perf_counter() - started, 'l2', 'get')
+
+        if raw is not None:
+            _redis_cache_stats['hits'] += 1
+            CACHE_REQUESTS.inc('l2', 'hit')
+            value = _decode_redis_value(raw)
+            if not local:
+                return value
+            if pttl and pttl > 0:
+                local_cache.set(key, value, pttl / 1000)
+            elif pttl == -1:
+                # Redis da muddatsiz saqlangan - L1 da standart muddat
+                local_cache.set(key, value)
             return value
+        _redis_cache_stats['misses'] += 1
+        CACHE_REQUESTS.inc('l2', 'miss')
 
     return default
 
 
 async def set_cache(key, value, ttl=300):
-    """Keshga qiymat saqlash (Redis yoki local)"""
-    # Avval Redis keshga saqlashga harakat
+    """Keshga qiymat saqlash (L1 va Redis bir xil muddat bilan)"""
     if USE_REDIS and redis_connection is not None:
-        await set_redis_cache(key, value, ttl)
-
-    # Qo'shimcha ravishda local keshga saqlash
-    import time
-    _local_cache[key] = (value, time.time())
+        with CACHE_SECONDS.time('l2', 'set'):
+            await set_redis_cache(key, value, ttl)
 
-    # Eskirgan qiymatlarni tozalash (local kesh uchun)
-    async def _cleanup():
-        await asyncio.sleep(ttl)
-        if key in _local_cache and _local_cache[key][1] + ttl <= time.time():
-            del _local_cache[key]
-
-    asyncio.create_task(_cleanup())
+    if _local_allowed(key):
+        local_cache.set(key, value, ttl)
     return value
 
 
@@ -188,7 +304,104 @@ async def delete_cache(key):
         await delete_redis_cache(key)
 
     # Local keshdan o'chirish
-    if key in _local_cache:
-        del _local_cache[key]
+    local_cache.delete(key)
+
+    return True
+
 
-    return True
\ No newline at end of file
+async def _load_and_cache(key, loader, ttl, stale_ttl, cache_empty):
+    """Kalit uchun `loader()` ni bitta nusxada bajarish; parallel so'rovlar natijani kutadi"""
+    future = _inflight_loads.get(key)
+    if future is not None:
+        _load_stats['coalesced'] += 1
+        return await asyncio.shield(future)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight_loads[key] = future
+    try:
+        _load_stats['loads'] += 1
+        value = await loader()
+        if value or (cache_empty and value is not None):
+            if stale_ttl:
+                # Eskirgan qiymatni ham qaytarish uchun "yangi" muddati qiymat bilan birga saqlanadi
+                envelope = {'value': value, 'fresh_until': time.time() + ttl}
+                await set_cache(key, envelope, ttl=ttl + stale_ttl)
+            else:
+                await set_cache(key, value, ttl=ttl)
+        future.set_result(value)
+        return value
+    except Exception as e:
+        _load_stats['errors'] += 1
+        future.set_exception(e)
+        # Kutayotgan bo'lmasa "exception was never retrieved" ogohlantirishi chiqmasligi uchun
+        future.exception()
+        raise
+    finally:
+        _inflight_loads.pop(key, None)
+
+
+async def _refresh_in_background(key, loader, ttl, stale_ttl, cache_empty):
+    try:
+        await _load_and_cache(key, loader, ttl, stale_ttl, cache_empty)
+    except Exception as e:
+        logging.error("Keshni fonda yangilashda xato (%s): %s", key, e)
+    finally:
+        _refreshing_keys.discard(key)
+
+
+async def get_or_set_cache(key, loader, ttl=300, stale_ttl=0, cache_empty=False):
+    """
+    Keshdan olish, bo'lmasa `loader()` korutinasi orqali yuklab keshga yozish.
+
+    - bir vaqtda kelgan bir xil kalitli so'rovlar bitta `loader()` natijasini
+      kutadi (single-flight), bazaga bitta so'rov ketadi;
+    - `stale_ttl` > 0 bo'lsa, `ttl` tugagandan keyin yana `stale_ttl` soniya
+      eski qiymat qaytariladi va fonda bitta yangilash ishga tushadi
+      (stale-while-revalidate). Bunday kalitlarni faqat shu funksiya orqali o'qish kerak;
+    - bo'sh natija (`[]`, `None`) `cache_empty=True` bo'lmasa keshlanmaydi.
+    """
+    cached = await get_cache(key, MISSING)
+    if cached is not MISSING:
+        if not stale_ttl:
+            return cached
+        if time.time() >= cached['fresh_until']:
+            _load_stats['stale_served'] += 1
+            if key not in _refreshing_keys and key not in _inflight_loads:
+                _refreshing_keys.add(key)
+                _load_stats['refreshes'] += 1
+                task = asyncio.create_task(_refresh_in_background(key, loader, ttl, stale_ttl, cache_empty))
+                _background_refreshes.add(task)
+                task.add_done_callback(_background_refreshes.discard)
+        return cached['value']
+
+    return await _load_and_cache(key, loader, ttl, stale_ttl, cache_empty)
+
+
+async def _reload_questions(battle_id=None, category_id=None):
+    await db.run_async(question_bank.invalidate, battle_id, category_id)
+
+
+# Admin paneldagi o'zgarishlar bo'yicha keshni tozalash (back/bot_app/signals.py xabarlari)
+cache_invalidator = CacheInvalidator(
+    evict=delete_cache,
+    reload_questions=_reload_questions,
+    reload_tree=category_tree.reload,
+    channel=config.CACHE_INVALIDATION_CHANNEL,
+    spool_path=config.CACHE_INVALIDATION_SPOOL,
+    poll_interval=config.CACHE_INVALIDATION_POLL_INTERVAL,
+    get_redis=lambda: redis_connection,
+)
+
+# Holat metrikalari (/metrics): qiymatlar faqat scrape paytida hisoblanadi
+metrics.gauge('bot_timer_wheel_pending', "Kutilayotgan quiz timeout'lari", timer_wheel.pending)
+metrics.gauge(
+    'bot_quiz_sessions_active', "Javob kutilayotgan quiz sessiyalari (timeout turi bo'yicha)",
+    lambda: {(kind,): count for kind, count in timer_wheel.pending_by_kind().items()}, ['kind'],
+)
+metrics.gauge(
+    'bot_outbound_queued', "Navbatdagi chiquvchi xabarlar (ustuvorlik bo'yicha)",
+    lambda: {(priority,): count for priority, count in outbound.stats()['queued'].items()}, ['priority'],
+)
+metrics.gauge('bot_write_behind_pending', "Bazaga yozilishini kutayotgan natijalar", lambda: write_behind.stats()['pending'])
+metrics.gauge('bot_local_cache_entries', "L1 keshdagi yozuvlar soni", lambda: len(local_cache))
+metrics_server = metrics.MetricsServer(config.METRICS_HOST, config.METRICS_PORT)
@@ -1,8 +1,13 @@
 from aiogram import Dispatcher
 
-from loader import dp
+from loader import dp, callback_router, throttler
+from .metrics import MetricsMiddleware
 from .throttling import ThrottlingMiddleware
 
 
 if __name__ == "middlewares":
-    dp.middleware.setup(ThrottlingMiddleware())
+    # Router'dan oldin: callback handler'lari pre-process bosqichida chaqiriladi
+    dp.middleware.setup(ThrottlingMiddleware(throttler, router=callback_router))
+    # Throttling'dan keyin: rad etilgan update'lar handler vaqtiga qo'shilmaydi
+    dp.middleware.setup(MetricsMiddleware())
+    dp.middleware.setup(callback_router)
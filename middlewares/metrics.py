@@ -0,0 +1,51 @@
+import sys
+import time
+
+from aiogram import types
+from aiogram.dispatcher.handler import CancelHandler, SkipHandler, current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from utils.metrics import HANDLER_ERRORS, HANDLER_SECONDS
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Per-handler latency and error counts for messages and callback queries.
+
+    Timing starts in the process stage (after filters, so only the handler
+    that actually runs is measured) and ends in post-processing, which aiogram
+    runs in a ``finally`` block. Callbacks dispatched by the callback router
+    never reach the process stage; the router records those itself.
+
+    Set up after ThrottlingMiddleware so throttled updates are not counted.
+    """
+
+    @staticmethod
+    def _start(data: dict):
+        handler = current_handler.get()
+        if handler is not None:
+            data['_metrics'] = (handler.__name__, time.perf_counter())
+
+    @staticmethod
+    def _finish(data: dict):
+        started = data.pop('_metrics', None)
+        if started is None:
+            return
+        name, started = started
+        HANDLER_SECONDS.observe(time.perf_counter() - started, name)
+        # post_process runs while the handler's exception is propagating
+        error = sys.exc_info()[1]
+        if isinstance(error, Exception) and not isinstance(error, (CancelHandler, SkipHandler)):
+            HANDLER_ERRORS.inc(name)
+
+    async def on_process_message(self, message: types.Message, data: dict):
+        self._start(data)
+
+    async def on_post_process_message(self, message: types.Message, results: list, data: dict):
+        self._finish(data)
+
+    async def on_process_callback_query(self, callback: types.CallbackQuery, data: dict):
+        self._start(data)
+
+    async def on_post_process_callback_query(self, callback: types.CallbackQuery, results: list, data: dict):
+        self._finish(data)
@@ -1,37 +1,65 @@
-import asyncio
-
-from aiogram import types, Dispatcher
-from aiogram.dispatcher import DEFAULT_RATE_LIMIT
+from aiogram import types
 from aiogram.dispatcher.handler import CancelHandler, current_handler
 from aiogram.dispatcher.middlewares import BaseMiddleware
-from aiogram.utils.exceptions import Throttled
+
+from utils.rate_limiter import Decision, TokenBucketLimiter
 
 
 class ThrottlingMiddleware(BaseMiddleware):
     """
-    Simple middleware
+    Per-user token bucket throttling for messages and callback queries.
+
+    Each update costs one call to the limiter (a single Lua script when Redis
+    is enabled). Limits are configured per handler with the ``rate_limit``
+    decorator from utils/misc/throttling.py.
+
+    Callback handlers registered in the callback router run during
+    pre-processing, so callback queries are throttled there and this
+    middleware has to be set up before the router.
     """
 
-    def __init__(self, limit=DEFAULT_RATE_LIMIT, key_prefix='antiflood_'):
-        self.rate_limit = limit
+    def __init__(self, limiter: TokenBucketLimiter, router=None, key_prefix='antiflood_'):
+        self.limiter = limiter
+        self.router = router
         self.prefix = key_prefix
         super(ThrottlingMiddleware, self).__init__()
 
+    def _limits(self, handler, default_key):
+        if handler is None:
+            return f"{self.prefix}{default_key}", None, None
+        rate = getattr(handler, "throttling_rate", None)
+        if rate is None:
+            limit = getattr(handler, "throttling_rate_limit", None)
+            rate = 1 / limit if limit else None
+        key = getattr(handler, "throttling_key", f"{self.prefix}{handler.__name__}")
+        return key, rate, getattr(handler, "throttling_burst", None)
+
+    async def _throttle(self, user: types.User, handler, default_key) -> Decision:
+        key, rate, burst = self._limits(handler, default_key)
+        user_id = user.id if user else 0
+        return await self.limiter.hit(f"{key}:{user_id}", rate=rate, burst=burst)
+
     async def on_process_message(self, message: types.Message, data: dict):
-        handler = current_handler.get()
-        dispatcher = Dispatcher.get_current()
-        if handler:
-            limit = getattr(handler, "throttling_rate_limit", self.rate_limit)
-            key = getattr(handler, "throttling_key", f"{self.prefix}_{handler.__name__}")
-        else:
-            limit = self.rate_limit
-            key = f"{self.prefix}_message"
-        try:
-            await dispatcher.throttle(key, rate=limit)
-        except Throttled as t:
-            await self.message_throttled(message, t)
+        decision = await self._throttle(message.from_user, current_handler.get(), 'message')
+        if not decision.allowed:
+            await self.message_throttled(message, decision)
+            raise CancelHandler()
+
+    async def on_pre_process_callback_query(self, callback: types.CallbackQuery, data: dict):
+        handler = None
+        if self.router is not None:
+            routes, _ = self.router.resolve(callback.data or '')
+            if routes:
+                handler = routes[0].handler
+        decision = await self._throttle(callback.from_user, handler, 'callback')
+        if not decision.allowed:
+            await self.callback_throttled(callback, decision)
             raise CancelHandler()
 
-    async def message_throttled(self, message: types.Message, throttled: Throttled):
-        if throttled.exceeded_count <= 2:
+    async def message_throttled(self, message: types.Message, decision: Decision):
+        if decision.exceeded <= 2:
             await message.reply("Too many requests!")
+
+    async def callback_throttled(self, callback: types.CallbackQuery, decision: Decision):
+        if decision.exceeded <= 2:
+            await callback.answer("Too many requests!")
@@ -0,0 +1,63 @@
+import base64
+import unittest
+
+from utils.callback_codec import ACTIONS, PREFIX, Callback, decode, encode
+
+
+def _compact(raw: bytes) -> str:
+    return PREFIX + base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+class EncodeDecodeTests(unittest.TestCase):
+    def test_round_trip(self):
+        for action in ACTIONS:
+            for node_id in (0, 1, 127, 128, 16383, 16384, 2 ** 31):
+                for lang_id in (0, 1, 2):
+                    with self.subTest(action=action, node_id=node_id, lang_id=lang_id):
+                        self.assertEqual(decode(encode(action, node_id, lang_id)), Callback(action, node_id, lang_id))
+
+    def test_encoded_data_is_short(self):
+        data = encode('battle', 2 ** 31, 2)
+        self.assertTrue(data.startswith(PREFIX))
+        # Telegram allows at most 64 bytes of callback_data
+        self.assertLess(len(data.encode('utf-8')), 64)
+        self.assertNotIn('=', data)
+
+    def test_unknown_action_cannot_be_encoded(self):
+        with self.assertRaises(KeyError):
+            encode('unknown', 1)
+
+
+class LegacyTests(unittest.TestCase):
+    def test_legacy_strings(self):
+        self.assertEqual(decode('battle_12_Unit_1_Lesson'), Callback('battle', 12))
+        self.assertEqual(decode('category_7'), Callback('category', 7))
+        self.assertEqual(decode('test_28_Unit1_Lesson'), Callback('test', 28))
+
+    def test_legacy_product_name_with_underscores(self):
+        self.assertEqual(decode('product_1_100_parent_id_5'), Callback('product', 0, 0, ('1_100', 5)))
+        self.assertEqual(decode('product_a_parent_id_b_parent_id_9'), Callback('product', 0, 0, ('a_parent_id_b', 9)))
+
+    def test_unrelated_strings(self):
+        for data in ('', 'back_to_root', 'start_quiz', 'battle_', 'product_1-100', 'select_3'):
+            with self.subTest(data=data):
+                self.assertIsNone(decode(data))
+
+
+class BadPayloadTests(unittest.TestCase):
+    def test_bad_or_truncated_payloads(self):
+        valid = encode('test', 300, 1)
+        cases = {
+            'prefix only': PREFIX,
+            'not base64': PREFIX + '!!!',
+            'truncated varint': _compact(bytes((1, ACTIONS['test'], 1, 0x80))),
+            'missing id': _compact(bytes((1, ACTIONS['test'], 1))),
+            'unknown version': _compact(bytes((99, ACTIONS['test'], 1, 5))),
+            'unknown action': _compact(bytes((1, 200, 1, 5))),
+            'cut in half': valid[:3],
+            'legacy id not a number': 'battle_abc',
+            'legacy parent id not a number': 'product_1-100_parent_id_x',
+        }
+        for name, data in cases.items():
+            with self.subTest(name):
+                self.assertIsNone(decode(data))
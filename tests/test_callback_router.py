@@ -0,0 +1,135 @@
+import unittest
+
+from aiogram import Bot, Dispatcher, types
+from aiogram.contrib.fsm_storage.memory import MemoryStorage
+from aiogram.dispatcher.filters.state import State, StatesGroup
+from aiogram.dispatcher.handler import CancelHandler
+
+from utils.callback_codec import Callback, encode
+from utils.callback_router import CallbackRouter, RouteConflict
+
+
+class QuizStates(StatesGroup):
+    waiting = State()
+    finished = State()
+
+
+async def handler(callback):
+    pass
+
+
+async def other_handler(callback):
+    pass
+
+
+class RegistrationTests(unittest.TestCase):
+    def setUp(self):
+        self.router = CallbackRouter()
+
+    def test_same_key_and_state_conflicts(self):
+        self.router.route(exact='back_to_root')(handler)
+        with self.assertRaises(RouteConflict):
+            self.router.route(exact='back_to_root')(other_handler)
+
+    def test_any_state_overlaps_everything(self):
+        self.router.route(prefix='start_room_quiz_', state=QuizStates.waiting)(handler)
+        with self.assertRaises(RouteConflict):
+            self.router.route(prefix='start_room_quiz_', state='*')(other_handler)
+
+    def test_disjoint_states_do_not_conflict(self):
+        self.router.route(action='battle')(handler)
+        self.router.route(action='battle', state=QuizStates.waiting)(other_handler)
+        self.router.route(action='battle', state=QuizStates.finished)(handler)
+
+    def test_prefix_cannot_shadow_codec_callbacks(self):
+        for prefix in ('~', 'battle_', 'bat', 'test_x'):
+            with self.subTest(prefix=prefix), self.assertRaises(RouteConflict):
+                self.router.route(prefix=prefix)(handler)
+
+    def test_exactly_one_key_is_required(self):
+        with self.assertRaises(ValueError):
+            self.router.route(exact='a', prefix='b')
+        with self.assertRaises(ValueError):
+            self.router.route()
+        with self.assertRaises(ValueError):
+            self.router.route(action='unknown')(handler)
+
+
+class ResolveTests(unittest.TestCase):
+    def setUp(self):
+        self.router = CallbackRouter()
+        self.router.route(exact='select_all')(handler)
+        self.router.route(prefix='select_')(other_handler)
+        self.router.route(prefix='select_room_')(handler)
+        self.router.route(action='category')(handler)
+
+    def _handlers(self, data):
+        routes, _ = self.router.resolve(data)
+        return [route.name for route in routes]
+
+    def test_exact_wins_over_prefix(self):
+        self.assertEqual(self._handlers('select_all'), ['exact:select_all'])
+        self.assertEqual(self._handlers('select_allx'), ['prefix:select_'])
+
+    def test_longest_prefix_wins(self):
+        self.assertEqual(self._handlers('select_room_5'), ['prefix:select_room_'])
+        self.assertEqual(self._handlers('select_5'), ['prefix:select_'])
+        self.assertEqual(self._handlers('select_roo'), ['prefix:select_'])
+
+    def test_codec_callbacks_resolve_by_action(self):
+        routes, cb = self.router.resolve(encode('category', 42, 2))
+        self.assertEqual([route.name for route in routes], ['action:category'])
+        self.assertEqual(cb, Callback('category', 42, 2))
+        routes, cb = self.router.resolve('category_42_Name')
+        self.assertEqual((routes[0].name, cb), ('action:category', Callback('category', 42)))
+
+    def test_unmatched(self):
+        self.assertEqual(self._handlers('unknown'), [])
+        self.assertEqual(self._handlers(encode('battle', 1)), [])
+        self.assertEqual(self._handlers(''), [])
+
+
+class DispatchTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.bot = Bot('123456:TEST-TOKEN')
+        self.dp = Dispatcher(self.bot, storage=MemoryStorage())
+        Bot.set_current(self.bot)
+        Dispatcher.set_current(self.dp)
+        user = types.User(id=7, is_bot=False, first_name='U')
+        types.User.set_current(user)
+        types.Chat.set_current(types.Chat(id=7, type='private'))
+        self.router = CallbackRouter()
+        self.calls = []
+
+    async def asyncTearDown(self):
+        await self.dp.storage.close()
+        await (await self.bot.get_session()).close()
+
+    def _callback(self, data):
+        return types.CallbackQuery(id='1', data=data, chat_instance='7', **{'from': {'id': 7, 'is_bot': False,
+                                                                                     'first_name': 'U'}})
+
+    async def test_routes_by_state_and_passes_arguments(self):
+        @self.router.route(action='test', state=QuizStates.waiting)
+        async def waiting(callback, state, cb):
+            self.calls.append(('waiting', cb.node_id, await state.get_state()))
+
+        @self.router.route(action='test')
+        async def idle(callback):
+            self.calls.append(('idle',))
+
+        with self.assertRaises(CancelHandler):
+            await self.router.on_pre_process_callback_query(self._callback(encode('test', 3)), {})
+        await self.dp.current_state(chat=7, user=7).set_state(QuizStates.waiting)
+        with self.assertRaises(CancelHandler):
+            await self.router.on_pre_process_callback_query(self._callback(encode('test', 4)), {})
+
+        self.assertEqual(self.calls, [('idle',), ('waiting', 4, QuizStates.waiting.state)])
+        self.assertEqual((self.router.unmatched, self.router.state_mismatch), (0, 0))
+
+    async def test_state_mismatch_falls_through_to_aiogram(self):
+        self.router.route(exact='finish', state=QuizStates.finished)(handler)
+        # No CancelHandler: aiogram's own handlers still get the update
+        await self.router.on_pre_process_callback_query(self._callback('finish'), {})
+        await self.router.on_pre_process_callback_query(self._callback('nothing'), {})
+        self.assertEqual((self.router.state_mismatch, self.router.unmatched), (1, 1))
@@ -0,0 +1,118 @@
+import unittest
+from unittest import mock
+
+import fakeredis.aioredis
+
+from utils.rate_limiter import Decision, TokenBucketLimiter
+
+
+class Clock:
+    """Stands in for the `time` module of utils.rate_limiter"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+class BrokenRedis:
+    def register_script(self, script):
+        async def call(keys, args):
+            raise ConnectionError("redis is down")
+        return call
+
+
+class BucketBehaviour:
+    """Shared by the local and Redis-backed limiters"""
+
+    def make_limiter(self, **kwargs):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch('utils.rate_limiter.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.limiter = self.make_limiter(rate=2, burst=3)
+
+    async def hits(self, count, key='quiz:1'):
+        return [await self.limiter.hit(key) for _ in range(count)]
+
+    async def test_burst_then_throttled(self):
+        decisions = await self.hits(5)
+        self.assertEqual([d.allowed for d in decisions], [True, True, True, False, False])
+        self.assertEqual([d.exceeded for d in decisions], [0, 0, 0, 1, 2])
+        self.assertAlmostEqual(decisions[-1].retry_after, 0.5)
+        self.assertEqual((self.limiter.allowed, self.limiter.throttled), (3, 2))
+
+    async def test_refill_at_rate(self):
+        await self.hits(3)
+        self.clock.now += 0.25
+        self.assertFalse((await self.limiter.hit('quiz:1')).allowed)
+        self.clock.now += 0.25
+        self.assertEqual(await self.limiter.hit('quiz:1'), Decision(True))
+        self.assertFalse((await self.limiter.hit('quiz:1')).allowed)
+
+    async def test_refill_is_capped_at_burst(self):
+        await self.hits(3)
+        self.clock.now += 60
+        decisions = await self.hits(4)
+        self.assertEqual([d.allowed for d in decisions], [True, True, True, False])
+
+    async def test_keys_are_independent(self):
+        await self.hits(3, key='quiz:1')
+        self.assertFalse((await self.limiter.hit('quiz:1')).allowed)
+        self.assertTrue((await self.limiter.hit('quiz:2')).allowed)
+
+    async def test_per_call_rate_and_burst(self):
+        decisions = [await self.limiter.hit('start:1', rate=1, burst=1) for _ in range(2)]
+        self.assertEqual([d.allowed for d in decisions], [True, False])
+        self.assertAlmostEqual(decisions[1].retry_after, 1.0)
+
+
+class LocalBucketTests(BucketBehaviour, unittest.IsolatedAsyncioTestCase):
+    def make_limiter(self, **kwargs):
+        return TokenBucketLimiter(**kwargs)
+
+    async def test_idle_buckets_are_pruned(self):
+        self.limiter.max_local_keys = 2
+        await self.limiter.hit('a')
+        await self.limiter.hit('b')
+        self.clock.now += 120
+        await self.limiter.hit('c')
+        self.assertEqual(set(self.limiter._local), {'c'})
+
+
+class RedisBucketTests(BucketBehaviour, unittest.IsolatedAsyncioTestCase):
+    def make_limiter(self, **kwargs):
+        self.redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        return TokenBucketLimiter(get_redis=lambda: self.redis, **kwargs)
+
+    async def asyncTearDown(self):
+        await self.redis.aclose()
+
+    async def test_state_is_shared_through_redis(self):
+        await self.hits(3)
+        other_worker = TokenBucketLimiter(rate=2, burst=3, get_redis=lambda: self.redis)
+        self.assertFalse((await other_worker.hit('quiz:1')).allowed)
+        self.assertEqual(self.limiter.stats()['local_keys'], 0)
+        self.assertGreater(await self.redis.pttl('throttle:quiz:1'), 0)
+
+
+class FallbackTests(unittest.IsolatedAsyncioTestCase):
+    async def test_redis_error_falls_back_to_local_bucket(self):
+        limiter = TokenBucketLimiter(rate=1, burst=2, get_redis=BrokenRedis)
+        decisions = [await limiter.hit('quiz:1') for _ in range(3)]
+        self.assertEqual([d.allowed for d in decisions], [True, True, False])
+        self.assertEqual(limiter.stats()['redis_errors'], 3)
+        self.assertEqual(limiter.stats()['local_keys'], 1)
+
+    async def test_without_redis(self):
+        limiter = TokenBucketLimiter(rate=1, burst=1, get_redis=lambda: None)
+        self.assertTrue((await limiter.hit('quiz:1')).allowed)
+        self.assertFalse((await limiter.hit('quiz:1')).allowed)
+        self.assertEqual(limiter.stats()['redis_errors'], 0)
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+import fakeredis.aioredis
+
+from utils.timer_wheel import TimerWheel
+
+
+class Clock:
+    """Stands in for the `time` module of utils.timer_wheel"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+class WheelTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch('utils.timer_wheel.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_wheel(self, **kwargs):
+        return TimerWheel(tick=0.5, slots=16, **kwargs)
+
+    def due_at(self, wheel, seconds):
+        """Keys that fire once `seconds` have passed since the start"""
+        return [key for key, _, _ in wheel._collect_due(1000.0 + seconds)]
+
+
+class ScheduleTests(WheelTestCase):
+    def test_fires_after_delay(self):
+        wheel = self.make_wheel()
+        wheel.schedule('room:1', 2, 'room_answer', {'chat_id': 1})
+        self.assertEqual(self.due_at(wheel, 1.5), [])
+        self.assertEqual(wheel._collect_due(1003.0), [('room:1', 'room_answer', {'chat_id': 1})])
+        self.assertEqual(wheel.pending(), 0)
+
+    def test_reschedule_replaces_previous_timer(self):
+        wheel = self.make_wheel()
+        wheel.schedule('room:1', 2, 'room_answer', {'question': 1})
+        wheel.schedule('room:1', 5, 'room_answer', {'question': 2})
+        self.assertEqual(wheel.pending(), 1)
+        self.assertEqual(self.due_at(wheel, 3), [])
+        self.assertEqual(wheel._collect_due(1006.0), [('room:1', 'room_answer', {'question': 2})])
+
+    def test_reschedule_earlier(self):
+        wheel = self.make_wheel()
+        wheel.schedule('room:1', 5, 'room_answer')
+        wheel.schedule('room:1', 1, 'room_answer')
+        self.assertEqual(self.due_at(wheel, 2), ['room:1'])
+        self.assertEqual(self.due_at(wheel, 6), [])
+
+    def test_delay_longer_than_one_turn(self):
+        wheel = self.make_wheel()
+        # 16 slots of 0.5 s: the timer passes its slot once before it is due
+        wheel.schedule('quiz:1', 20, 'quiz_answer')
+        self.assertEqual(self.due_at(wheel, 10), [])
+        self.assertEqual(self.due_at(wheel, 21), ['quiz:1'])
+
+    def test_cancel(self):
+        wheel = self.make_wheel()
+        wheel.schedule('room:1', 2, 'room_answer')
+        wheel.schedule('room:2', 2, 'room_answer')
+        self.assertTrue(wheel.cancel('room:1'))
+        self.assertFalse(wheel.cancel('room:1'))
+        self.assertFalse(wheel.cancel('missing'))
+        self.assertEqual(self.due_at(wheel, 3), ['room:2'])
+
+    def test_pending_by_kind(self):
+        wheel = self.make_wheel()
+        wheel.schedule('room:1', 2, 'room_answer')
+        wheel.schedule('room:2', 9, 'room_answer')
+        wheel.schedule('quiz:1', 2, 'quiz_answer')
+        self.assertEqual(wheel.pending_by_kind(), {'room_answer': 2, 'quiz_answer': 1})
+
+    async def test_callback_errors_are_contained(self):
+        wheel = self.make_wheel()
+        calls = []
+
+        async def failing(key, payload):
+            raise RuntimeError("telegram is down")
+
+        async def recording(key, payload):
+            calls.append((key, payload))
+
+        wheel.register('failing', failing)
+        wheel.register('recording', recording)
+        await wheel._fire_batch([('a', 'failing', {}), ('b', 'recording', {'n': 1}), ('c', 'unknown', {})])
+        self.assertEqual(calls, [('b', {'n': 1})])
+
+
+class RestoreTests(WheelTestCase):
+    async def asyncSetUp(self):
+        self.redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+    async def asyncTearDown(self):
+        await self.redis.aclose()
+
+    def make_wheel(self, **kwargs):
+        return super().make_wheel(get_redis=lambda: self.redis, **kwargs)
+
+    async def test_persist_and_restore(self):
+        wheel = self.make_wheel()
+        wheel.schedule('room:1', 2, 'room_answer', {'chat_id': 1})
+        wheel.schedule('room:2', 8, 'room_answer', {'chat_id': 2})
+        wheel.schedule('room:3', 8, 'room_answer')
+        wheel.cancel('room:3')
+        await wheel._persist()
+        self.assertEqual(set(await self.redis.hkeys(wheel.redis_key)), {'room:1', 'room:2'})
+
+        # The bot restarts 4 seconds later: room:1 is overdue, room:2 keeps its deadline
+        self.clock.now += 4
+        restored = self.make_wheel()
+        self.assertEqual(await restored.restore(), 2)
+        self.assertEqual(restored._collect_due(1005.0), [('room:1', 'room_answer', {'chat_id': 1})])
+        self.assertEqual(self.due_at(restored, 7), [])
+        self.assertEqual(self.due_at(restored, 9), ['room:2'])
+
+        await restored._persist()
+        self.assertEqual(await self.redis.hlen(wheel.redis_key), 0)
+
+    async def test_broken_entries_are_skipped(self):
+        await self.redis.hset('quiz:timers', mapping={
+            'room:1': json.dumps({'deadline': 1001.0, 'kind': 'room_answer', 'payload': {}}),
+            'room:2': 'not json',
+            'room:3': json.dumps({'kind': 'room_answer'}),
+        })
+        wheel = self.make_wheel()
+        await wheel.restore()
+        self.assertEqual(wheel.pending(), 1)
+
+    async def test_without_redis(self):
+        wheel = TimerWheel(get_redis=lambda: None)
+        wheel.schedule('room:1', 2, 'room_answer')
+        self.assertEqual(await wheel.restore(), 0)
+        await wheel._persist()
+        self.assertEqual(wheel.pending(), 1)
+
+
+class RunTests(unittest.IsolatedAsyncioTestCase):
+    async def test_background_task_fires_and_stops(self):
+        wheel = TimerWheel(tick=0.01, slots=8)
+        fired = asyncio.Event()
+
+        async def on_timeout(key, payload):
+            fired.set()
+
+        wheel.register('room_answer', on_timeout)
+        wheel.start()
+        try:
+            wheel.schedule('room:1', 0.02, 'room_answer')
+            wheel.schedule('room:2', 0.02, 'room_answer')
+            wheel.cancel('room:2')
+            await asyncio.wait_for(fired.wait(), timeout=1)
+        finally:
+            await wheel.stop()
+        self.assertEqual(wheel.stats()['fired'], 1)
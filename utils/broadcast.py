@@ -0,0 +1,200 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+from utils.fanout import fan_out
+from utils.outbound import PRIORITY_BROADCAST
+
+logger = logging.getLogger('broadcast')
+
+
+class Broadcaster:
+    """
+    Admin xabarini barcha foydalanuvchilarga fon rejimida tarqatish.
+
+    - foydalanuvchilar `page_size` talik sahifalarda (id bo'yicha keyset) o'qiladi,
+      butun jadval xotiraga yuklanmaydi;
+    - har bir sahifa outbound navbati orqali parallel yuboriladi (broadcast ustuvorligi);
+    - xabar `copy_message` bilan yuboriladi, shuning uchun matn ham, media ham ketadi;
+    - botni bloklagan foydalanuvchilar `is_blocked` deb belgilanadi;
+    - har bir sahifadan keyin holat (checkpoint) saqlanadi: Redis bo'lsa Redis da,
+      aks holda `checkpoint_path` faylida. Bot qayta ishga tushganda `resume()`
+      tugallanmagan tarqatishni oxirgi saqlangan joydan davom ettiradi.
+
+    Bir vaqtda faqat bitta tarqatish ishlaydi.
+    """
+
+    REDIS_KEY = 'broadcast:job'
+
+    def __init__(self, database, outbound, page_size: int = 500, concurrency: int = 30,
+                 progress_interval: float = 5.0, checkpoint_path: str = 'data/broadcast_job.json', get_redis=None):
+        self.database = database
+        self.outbound = outbound
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.progress_interval = progress_interval
+        self.checkpoint_path = checkpoint_path
+        self._get_redis = get_redis
+        self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def _redis(self):
+        return self._get_redis() if self._get_redis else None
+
+    async def _load_checkpoint(self):
+        redis = self._redis()
+        try:
+            if redis is not None:
+                raw = await redis.get(self.REDIS_KEY)
+            elif os.path.exists(self.checkpoint_path):
+                with open(self.checkpoint_path, encoding='utf-8') as f:
+                    raw = f.read()
+            else:
+                raw = None
+            return json.loads(raw) if raw else None
+        except Exception as e:
+            logger.error("Broadcast checkpoint'ini o'qishda xato: %s", e)
+            return None
+
+    async def _save_checkpoint(self, job):
+        raw = json.dumps(job)
+        redis = self._redis()
+        try:
+            if redis is not None:
+                await redis.set(self.REDIS_KEY, raw)
+            else:
+                tmp_path = f"{self.checkpoint_path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(raw)
+                os.replace(tmp_path, self.checkpoint_path)
+        except Exception as e:
+            logger.error("Broadcast checkpoint'ini saqlashda xato: %s", e)
+
+    async def _clear_checkpoint(self):
+        redis = self._redis()
+        try:
+            if redis is not None:
+                await redis.delete(self.REDIS_KEY)
+            elif os.path.exists(self.checkpoint_path):
+                os.remove(self.checkpoint_path)
+        except Exception as e:
+            logger.error("Broadcast checkpoint'ini o'chirishda xato: %s", e)
+
+    async def start(self, admin_id: int, from_chat_id: int, message_id: int) -> bool:
+        """
+        Yangi tarqatishni boshlash.
+
+        :return: False agar boshqa tarqatish hali tugamagan bo'lsa.
+        """
+        if self.running:
+            return False
+
+        total = await self.database.run_async(self.database.count_broadcast_users)
+        progress = await self.outbound.send_message(admin_id, f"Xabar tarqatilmoqda... 0/{total}")
+        job = {
+            'admin_id': admin_id,
+            'from_chat_id': from_chat_id,
+            'message_id': message_id,
+            'progress_message_id': progress.message_id if progress else None,
+            'last_id': 0,
+            'total': total,
+            'sent': 0,
+            'failed': 0,
+            'blocked': 0,
+            'elapsed': 0.0,
+        }
+        await self._save_checkpoint(job)
+        self._task = asyncio.create_task(self._run(job))
+        return True
+
+    async def resume(self) -> bool:
+        """Bot qayta ishga tushganda tugallanmagan tarqatishni davom ettirish"""
+        if self.running:
+            return False
+        job = await self._load_checkpoint()
+        if not job:
+            return False
+        logger.info("Broadcast davom ettirilmoqda: %s/%s, last_id=%s",
+                    job['sent'] + job['failed'], job['total'], job['last_id'])
+        self._task = asyncio.create_task(self._run(job))
+        return True
+
+    async def _report(self, job, text):
+        admin_id = job['admin_id']
+        try:
+            if job.get('progress_message_id'):
+                await self.outbound.call(admin_id, self.outbound.bot.edit_message_text, text,
+                                         chat_id=admin_id, message_id=job['progress_message_id'])
+            else:
+                await self.outbound.send_message(admin_id, text)
+        except Exception as e:
+            logger.debug("Broadcast progress xabarini yangilab bo'lmadi: %s", e)
+
+    async def _run(self, job):
+        started = time.monotonic() - job.get('elapsed', 0.0)
+        last_report = 0.0
+
+        async def send(row):
+            await self.outbound.copy_message(row[1], job['from_chat_id'], job['message_id'],
+                                             priority=PRIORITY_BROADCAST)
+
+        try:
+            while True:
+                page = await self.database.run_async(self.database.get_broadcast_page, job['last_id'], self.page_size)
+                if not page:
+                    break
+
+                # RetryAfter ni outbound qayta urinadi; fan_out uning oxirgi xatosini qayta yubormaydi
+                stats = await fan_out(page, send, concurrency=self.concurrency, max_retries=0)
+                job['sent'] += stats['sent']
+                job['failed'] += stats['failed']
+                job['blocked'] += stats['blocked']
+
+                if stats['blocked_targets']:
+                    blocked_chat_ids = [row[1] for row in stats['blocked_targets']]
+                    await self.database.run_async(self.database.mark_users_blocked, blocked_chat_ids)
+
+                # Sahifa to'liq yuborilgandan keyingina checkpoint suriladi
+                job['last_id'] = page[-1][0]
+                job['elapsed'] = time.monotonic() - started
+                await self._save_checkpoint(job)
+
+                if time.monotonic() - last_report >= self.progress_interval:
+                    last_report = time.monotonic()
+                    done = job['sent'] + job['failed']
+                    await self._report(job, f"Xabar tarqatilmoqda... {done}/{job['total']}")
+
+            elapsed = time.monotonic() - started
+            rate = job['sent'] / elapsed if elapsed else 0.0
+            await self._clear_checkpoint()
+            await self._report(job, f"Xabar tarqatildi: {job['sent'] + job['failed']}/{job['total']}")
+            await self.outbound.send_message(
+                job['admin_id'],
+                "Habaringiz barcha userlarga bordi!\n"
+                f"Yuborildi: {job['sent']}\n"
+                f"Yuborilmadi: {job['failed']} (shundan botni bloklagan: {job['blocked']})\n"
+                f"Vaqt: {elapsed:.1f} s ({rate:.1f} xabar/s)"
+            )
+            logger.info("Broadcast tugadi: %s", job)
+        except asyncio.CancelledError:
+            # Checkpoint saqlanib qoladi, keyingi ishga tushishda davom etadi
+            logger.info("Broadcast to'xtatildi, last_id=%s", job['last_id'])
+            raise
+        except Exception as e:
+            logger.error("Broadcast xatosi: %s", e, exc_info=True)
+            await self._report(job, f"Xabar tarqatish to'xtadi: {e}")
+
+    async def stop(self):
+        """Joriy tarqatishni to'xtatish (checkpoint saqlanadi)"""
+        if self.running:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
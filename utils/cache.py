@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger('cache')
+
+# Keshda yo'q qiymatni None/False dan ajratish uchun
+MISSING = object()
+
+
+class LRUCache:
+    """
+    Jarayon ichidagi chegaralangan kesh (L1).
+
+    - `max_size` dan ortiq yozuv bo'lsa, eng uzoq ishlatilmagani chiqariladi (LRU);
+    - har bir yozuvning muddati yozilayotganda belgilanadi (`ttl` soniya);
+    - muddati o'tgan yozuv o'qilganda o'chiriladi, qolganlarini bitta fon
+      sweeper vaqti-vaqti bilan tozalaydi (har bir yozuv uchun task yaratilmaydi);
+    - hit/miss/eviction hisoblagichlari `stats()` orqali.
+    """
+
+    def __init__(self, max_size: int = 10000, default_ttl: float = 300):
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        # key -> (value, expires_at); oxirgi ishlatilgani oxirida
+        self._data = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key) is not MISSING
+
+    def get(self, key, default=MISSING):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl: float = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key) -> bool:
+        return self._data.pop(key, None) is not None
+
+    def delete_prefix(self, prefix: str) -> int:
+        """`prefix` bilan boshlanadigan barcha kalitlarni o'chirish"""
+        keys = [key for key in self._data if isinstance(key, str) and key.startswith(prefix)]
+        for key in keys:
+            del self._data[key]
+        return len(keys)
+
+    def clear(self):
+        self._data.clear()
+
+    def sweep(self) -> int:
+        """Muddati o'tgan barcha yozuvlarni o'chirish"""
+        now = time.monotonic()
+        expired = [key for key, (_, expires_at) in self._data.items() if expires_at <= now]
+        for key in expired:
+            del self._data[key]
+        self.expirations += len(expired)
+        return len(expired)
+
+    async def run_sweeper(self, interval: float = 60.0):
+        """Muddati o'tgan yozuvlarni fon rejimida tozalab turish"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                removed = self.sweep()
+                if removed:
+                    logger.debug("L1 keshdan %s ta eskirgan yozuv o'chirildi", removed)
+            except Exception as e:
+                logger.error("Kesh sweeper xatosi: %s", e)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
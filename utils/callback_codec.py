@@ -0,0 +1,105 @@
+import base64
+import functools
+import logging
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger('callback_codec')
+
+# Yangi formatdagi callback_data shu belgi bilan boshlanadi (eski satrlar harf bilan boshlanadi)
+PREFIX = '~'
+VERSION = 1
+
+# Amal nomi <-> bir baytlik kod. Kodlar o'zgartirilmaydi, faqat yangilari qo'shiladi
+# (chatlarda qolgan eski tugmalar ham ishlashi kerak)
+ACTIONS = {
+    'category': 1,
+    'product': 2,
+    'battle': 3,
+    'test': 4,
+}
+_ACTION_NAMES = {code: name for name, code in ACTIONS.items()}
+# Avvalgi formatdagi satrlar prefikslari (chatlarda qolgan eski tugmalar)
+LEGACY_PREFIXES = ('category_', 'product_', 'battle_', 'test_')
+
+
+class Callback(NamedTuple):
+    """Dekodlangan callback: amal, daraxt tugunining id si va til"""
+    action: str
+    node_id: int
+    lang_id: int = 0
+    # Faqat eski formatdagi satrlardan olingan qo'shimcha qiymatlar
+    args: tuple = ()
+
+
+def _write_varint(value: int, out: bytearray):
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def _read_varint(data: bytes, pos: int):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode(action: str, node_id: int, lang_id: int = 0) -> str:
+    """
+    Callback'ni ixcham satrga aylantirish: `~` + base64url(versiya, amal, til, varint id).
+
+    Nomlar callback'ga yozilmaydi - handler ularni id bo'yicha daraxtdan oladi,
+    shuning uchun satr har doim 64 baytdan ancha qisqa (odatda 7-8 belgi).
+    """
+    raw = bytearray((VERSION, ACTIONS[action], lang_id))
+    _write_varint(node_id, raw)
+    return PREFIX + base64.urlsafe_b64encode(bytes(raw)).rstrip(b'=').decode('ascii')
+
+
+def _decode_compact(data: str) -> Optional[Callback]:
+    payload = data[len(PREFIX):]
+    raw = base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4))
+    if raw[0] != VERSION:
+        logger.warning("Callback versiyasi qo'llab-quvvatlanmaydi: %s", raw[0])
+        return None
+    action = _ACTION_NAMES.get(raw[1])
+    if action is None:
+        return None
+    node_id, _ = _read_varint(raw, 3)
+    return Callback(action, node_id, raw[2])
+
+
+def _decode_legacy(data: str) -> Optional[Callback]:
+    """Avvalgi `battle_{id}_{nom}` kabi satrlar (chatlarda qolgan eski tugmalar uchun)"""
+    if data.startswith('product_') and '_parent_id_' in data:
+        # product_{nom}_parent_id_{parent_id}: nomda "_" bo'lishi mumkin
+        name, parent_id = data[len('product_'):].rsplit('_parent_id_', 1)
+        return Callback('product', 0, 0, (name, int(parent_id)))
+
+    action, _, rest = data.partition('_')
+    if action not in ('category', 'battle', 'test') or not rest:
+        return None
+    return Callback(action, int(rest.split('_', 1)[0]))
+
+
+@functools.lru_cache(maxsize=4096)
+def decode(data: str) -> Optional[Callback]:
+    """callback_data ni dekodlash; tanish bo'lmagan yoki buzilgan satr uchun None"""
+    if not data:
+        return None
+    try:
+        if data.startswith(PREFIX):
+            return _decode_compact(data)
+        return _decode_legacy(data)
+    except (ValueError, IndexError):
+        logger.warning("Callback ma'lumotini dekodlab bo'lmadi: %r", data)
+        return None
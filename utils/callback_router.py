@@ -0,0 +1,222 @@
+import inspect
+import logging
+import time
+
+from aiogram import Dispatcher, types
+from aiogram.dispatcher.filters.state import State, StatesGroup
+from aiogram.dispatcher.handler import CancelHandler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from utils.callback_codec import ACTIONS, LEGACY_PREFIXES, PREFIX, decode
+from utils.metrics import HANDLER_ERRORS, HANDLER_SECONDS
+
+logger = logging.getLogger('callback_router')
+
+
+class RouteConflict(ValueError):
+    """Bir xil callback uchun bir-biriga to'qnashadigan ikki handler ro'yxatdan o'tkazildi"""
+
+
+class _Route:
+    __slots__ = ('name', 'kind', 'key', 'handler', 'states', 'kwargs', 'hits', 'errors', 'seconds')
+
+    def __init__(self, kind, key, handler, states):
+        self.name = f"{kind}:{key}"
+        self.kind = kind
+        self.key = key
+        self.handler = handler
+        # None - faqat holatsiz foydalanuvchilar, '*' - istalgan holat, aks holda holat nomlari to'plami
+        self.states = states
+        parameters = inspect.signature(handler).parameters
+        self.kwargs = {name for name in ('state', 'cb') if name in parameters}
+        self.hits = 0
+        self.errors = 0
+        self.seconds = 0.0
+
+    def accepts(self, current_state) -> bool:
+        if self.states == '*':
+            return True
+        if self.states is None:
+            return current_state is None
+        return current_state in self.states
+
+    def overlaps(self, other) -> bool:
+        if self.states == '*' or other.states == '*':
+            return True
+        if self.states is None or other.states is None:
+            return self.states is other.states
+        return bool(self.states & other.states)
+
+
+def _normalize_states(state):
+    if state is None or state == '*':
+        return state
+    if not isinstance(state, (list, tuple, set)):
+        state = [state]
+    names = set()
+    for item in state:
+        if inspect.isclass(item) and issubclass(item, StatesGroup):
+            names.update(item.all_states_names)
+        elif isinstance(item, State):
+            names.add(item.state)
+        else:
+            names.add(item)
+    return frozenset(names)
+
+
+class CallbackRouter(BaseMiddleware):
+    """
+    Callback so'rovlarini bitta joyda yo'naltirish.
+
+    aiogram har bir callback uchun `lambda c: c.data.startswith(...)` filtrlarini
+    ketma-ket tekshiradi. Router esa callback_data ni bir marta ko'rib chiqadi:
+
+    - `exact` - aniq satr (`back_to_root`) lug'atdan olinadi;
+    - `action` - ixcham callback (utils/callback_codec.py) bir marta dekodlanadi
+      va amal bo'yicha lug'atdan olinadi;
+    - `prefix` - prefikslar daraxti (trie) bo'yicha eng uzun mos prefiks, O(len(prefix)).
+
+    Topilgan handler foydalanuvchi holati (FSM) mos kelsa chaqiriladi va
+    aiogram'ning filtrlari tekshirilmaydi. Bir xil kalit va kesishadigan holat
+    bilan ikkinchi marta ro'yxatdan o'tkazish `RouteConflict` xatosini beradi
+    (modul import qilinganda, ya'ni ishga tushishda). Har bir yo'nalish uchun
+    chaqiruvlar, xatolar va sarflangan vaqt hisoblanadi (`stats()`).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._exact = {}
+        self._actions = {}
+        self._trie = {}
+        self._routes = []
+        self.unmatched = 0
+        self.state_mismatch = 0
+
+    # Ro'yxatdan o'tkazish
+
+    def route(self, *, exact: str = None, action: str = None, prefix: str = None, state=None):
+        """
+        Handler'ni ro'yxatdan o'tkazuvchi dekorator.
+
+            @callback_router.route(action='battle')
+            async def handle_battle(callback, state, cb): ...
+
+        Handler `callback` dan tashqari `state` (FSMContext) va `cb` (dekodlangan
+        Callback) argumentlarini so'rashi mumkin.
+
+        :param state: aiogram'dagi kabi: None - holatsiz, '*' - istalgan, State/StatesGroup yoki ro'yxat.
+        """
+        if sum(value is not None for value in (exact, action, prefix)) != 1:
+            raise ValueError("exact, action yoki prefix dan bittasi berilishi kerak")
+
+        def decorator(handler):
+            if exact is not None:
+                self._add(self._exact, _Route('exact', exact, handler, _normalize_states(state)))
+            elif action is not None:
+                if action not in ACTIONS:
+                    raise ValueError(f"Noma'lum callback amali: {action}")
+                self._add(self._actions, _Route('action', action, handler, _normalize_states(state)))
+            else:
+                self._add_prefix(_Route('prefix', prefix, handler, _normalize_states(state)))
+            return handler
+
+        return decorator
+
+    def _add(self, table, route):
+        candidates = table.setdefault(route.key, [])
+        for other in candidates:
+            if route.overlaps(other):
+                raise RouteConflict(
+                    f"'{route.name}' ikki marta ro'yxatdan o'tkazildi: "
+                    f"{other.handler.__module__}.{other.handler.__name__} va "
+                    f"{route.handler.__module__}.{route.handler.__name__}"
+                )
+        candidates.append(route)
+        self._routes.append(route)
+
+    def _add_prefix(self, route):
+        prefix = route.key
+        # Ixcham va eski formatdagi callback'lar action jadvaliga tegishli
+        for reserved in (PREFIX, *LEGACY_PREFIXES):
+            if prefix.startswith(reserved) or reserved.startswith(prefix):
+                raise RouteConflict(f"'{route.name}' prefiksi callback kodek prefiksi '{reserved}' bilan to'qnashadi")
+        for other in self._routes:
+            if other.kind == 'prefix' and other.key != prefix and \
+                    (other.key.startswith(prefix) or prefix.startswith(other.key)):
+                logger.warning("'%s' va '%s' prefikslari ustma-ust tushadi, eng uzun prefiks ustun bo'ladi",
+                               route.name, other.name)
+
+        node = self._trie
+        for char in prefix:
+            node = node.setdefault(char, {})
+        self._add(node.setdefault(None, {}), route)
+
+    # Yo'naltirish
+
+    def _match_prefix(self, data: str):
+        node = self._trie
+        matched = None
+        for char in data:
+            node = node.get(char)
+            if node is None:
+                break
+            if None in node:
+                matched = node[None]
+        if matched is None:
+            return []
+        # Trie tugunidagi jadval: {prefix: [route, ...]}
+        return next(iter(matched.values()))
+
+    def resolve(self, data: str):
+        """callback_data uchun nomzod yo'nalishlar va dekodlangan Callback"""
+        routes = self._exact.get(data)
+        if routes:
+            return routes, None
+        cb = decode(data)
+        if cb is not None:
+            return self._actions.get(cb.action, []), cb
+        return self._match_prefix(data), None
+
+    async def on_pre_process_callback_query(self, callback: types.CallbackQuery, data: dict):
+        routes, cb = self.resolve(callback.data or '')
+        if not routes:
+            self.unmatched += 1
+            return
+
+        state = Dispatcher.get_current().current_state()
+        current_state = await state.get_state()
+        route = next((route for route in routes if route.accepts(current_state)), None)
+        if route is None:
+            self.state_mismatch += 1
+            return
+
+        kwargs = {}
+        if 'state' in route.kwargs:
+            kwargs['state'] = state
+        if 'cb' in route.kwargs:
+            kwargs['cb'] = cb
+
+        route.hits += 1
+        started = time.perf_counter()
+        try:
+            await route.handler(callback, **kwargs)
+        except Exception:
+            route.errors += 1
+            HANDLER_ERRORS.inc(route.handler.__name__)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            route.seconds += elapsed
+            HANDLER_SECONDS.observe(elapsed, route.handler.__name__)
+        # aiogram'ning filtrlar bo'yicha ketma-ket qidiruvi kerak emas
+        raise CancelHandler()
+
+    def stats(self) -> dict:
+        return {
+            'routes': {
+                route.name: {'hits': route.hits, 'errors': route.errors, 'seconds': round(route.seconds, 3)}
+                for route in self._routes
+            },
+            'unmatched': self.unmatched,
+            'state_mismatch': self.state_mismatch,
+        }
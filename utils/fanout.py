@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import time
+
+from aiogram.utils.exceptions import BotBlocked, ChatNotFound, RetryAfter, UserDeactivated
+
+logger = logging.getLogger('fanout')
+
+
+class TokenBucket:
+    """
+    Asinxron token bucket: sekundiga `rate` ta so'rov, `capacity` tagacha portlash.
+
+    Telegram RetryAfter qaytarsa `pause()` chaqiriladi va bucket'dan foydalanuvchi
+    barcha korutinlar ko'rsatilgan vaqt davomida kutadi.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """Kutmasdan token olish: 0 - olindi, aks holda keyingi token paydo bo'lishigacha soniyalar"""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        self._refill(now)
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return 0.0
+        return (tokens - self._tokens) / self.rate
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+
+async def fan_out(targets, send, rate: float = None, concurrency: int = 30, max_retries: int = 3,
+                  on_progress=None, progress_interval: float = 1.0) -> dict:
+    """
+    `send(target)` korutinasini barcha `targets` uchun parallel bajarish.
+
+    - bir vaqtda `concurrency` tadan ko'p so'rov bajarilmaydi;
+    - `rate` berilsa, umumiy tezlik sekundiga `rate` ta so'rov bilan cheklanadi;
+    - RetryAfter kelsa, barcha jo'natmalar to'xtab turadi va so'rov qayta yuboriladi
+      (`max_retries` martagacha). `send` outbound orqali yuborsa, u RetryAfter ni o'zi
+      qayta urinadi - `max_retries=0` bilan uning oxirgi RetryAfter i xato hisoblanadi;
+    - bloklagan/o'chirilgan foydalanuvchilar qayta urinilmaydi;
+    - `on_progress(done, total)` ko'pi bilan `progress_interval` soniyada bir marta chaqiriladi.
+
+    :return: {'sent', 'failed', 'blocked', 'elapsed', 'skew', 'failed_targets', 'blocked_targets'} statistikasi.
+    """
+    targets = list(targets)
+    total = len(targets)
+    bucket = TokenBucket(rate) if rate else None
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.monotonic()
+    stats = {'sent': 0, 'failed': 0, 'blocked': 0, 'failed_targets': [], 'blocked_targets': []}
+    delivered_at = []
+    last_progress = 0.0
+
+    async def report(force=False):
+        nonlocal last_progress
+        if on_progress is None:
+            return
+        now = time.monotonic()
+        if not force and now - last_progress < progress_interval:
+            return
+        last_progress = now
+        try:
+            await on_progress(stats['sent'] + stats['failed'], total)
+        except Exception as e:
+            logger.debug("Progress xabarini yangilab bo'lmadi: %s", e)
+
+    async def deliver(target):
+        async with semaphore:
+            for attempt in range(max_retries + 1):
+                if bucket is not None:
+                    await bucket.acquire()
+                try:
+                    await send(target)
+                    stats['sent'] += 1
+                    delivered_at.append(time.monotonic())
+                    break
+                except RetryAfter as e:
+                    if attempt == max_retries:
+                        # Qayta urinish qolmagan - kutish faqat semaphore o'rnini band qiladi
+                        logger.warning("Flood control: %s soniya, yuborilmadi (%s)", e.timeout, target)
+                        continue
+                    logger.warning("Flood control: %s soniya kutamiz", e.timeout)
+                    if bucket is not None:
+                        bucket.pause(e.timeout)
+                    else:
+                        await asyncio.sleep(e.timeout)
+                except (BotBlocked, ChatNotFound, UserDeactivated) as e:
+                    stats['blocked'] += 1
+                    stats['failed'] += 1
+                    stats['failed_targets'].append(target)
+                    stats['blocked_targets'].append(target)
+                    logger.info("Yuborib bo'lmadi (%s): %s", target, e)
+                    break
+                except Exception as e:
+                    logger.error("Yuborishda xato (%s): %s", target, e, exc_info=True)
+                    stats['failed'] += 1
+                    stats['failed_targets'].append(target)
+                    break
+            else:
+                stats['failed'] += 1
+                stats['failed_targets'].append(target)
+        await report()
+
+    await asyncio.gather(*(deliver(target) for target in targets))
+    await report(force=True)
+
+    stats['elapsed'] = time.monotonic() - started
+    # Birinchi va oxirgi ishtirokchiga yetib borish orasidagi farq
+    stats['skew'] = (max(delivered_at) - min(delivered_at)) if delivered_at else 0.0
+    return stats
@@ -0,0 +1,195 @@
+import asyncio
+import json
+import logging
+import os
+
+logger = logging.getLogger('invalidation')
+
+
+def event_keys(event: dict) -> set:
+    """Admin paneldan kelgan xabar bo'yicha o'chirilishi kerak bo'lgan kesh kalitlari"""
+    model = event.get('model')
+    keys = set()
+
+    if model == 'setadmin':
+        keys.add("admin:user_ids")
+        keys.update(f"is_admin:{chat_id}" for chat_id in event.get('chat_ids', []))
+    elif model == 'setbio':
+        keys.add("bio:all")
+
+    return keys
+
+
+class CacheInvalidator:
+    """
+    Admin paneldagi o'zgarishlar haqidagi xabarlarni olib, tegishli keshni tozalash.
+
+    - xabarlarni back/bot_app/signals.py yuboradi: Redis bo'lsa pub/sub kanali
+      orqali, aks holda spool faylga yozib;
+    - kategoriya, bellashuv yoki savol o'zgarsa, daraxt (data/tree.py) bir marta qayta yuklanadi;
+    - har bir xabar bo'yicha faqat tegishli kalitlar o'chiriladi (`event_keys`),
+      savollar o'zgarsa savollar bankidagi guruhlar qayta yuklanadi;
+    - bir vaqtda kelgan xabarlar (masalan, Excel dan yuzlab savol) bitta
+      to'plam qilib qayta ishlanadi;
+    - o'chirishdan oldin boshlangan yuklash eski qiymatni keshga qaytarib
+      yozmasligi uchun kalitlar `settle_delay` soniyadan keyin yana bir marta o'chiriladi.
+    """
+
+    def __init__(self, evict, reload_questions, reload_tree=None, channel: str = 'bot:invalidate',
+                 spool_path: str = 'back/cache_invalidation.jsonl', poll_interval: float = 2.0,
+                 settle_delay: float = 2.0, get_redis=None):
+        self.evict = evict
+        self.reload_questions = reload_questions
+        self.reload_tree = reload_tree
+        self.channel = channel
+        self.spool_path = spool_path
+        self.poll_interval = poll_interval
+        self.settle_delay = settle_delay
+        self._get_redis = get_redis
+        self._task = None
+        self._pending = set()
+
+        self.events = 0
+        self.evicted = 0
+        self.errors = 0
+
+    def _redis(self):
+        return self._get_redis() if self._get_redis else None
+
+    def stats(self) -> dict:
+        return {'events': self.events, 'evicted': self.evicted, 'errors': self.errors}
+
+    async def apply(self, events):
+        """Xabarlar to'plamini qayta ishlash"""
+        keys = set()
+        battle_ids = set()
+        category_ids = set()
+        tree_changed = False
+        for event in events:
+            self.events += 1
+            keys |= event_keys(event)
+            if event.get('model') in ('category', 'battle', 'test'):
+                tree_changed = True
+            if event.get('model') == 'test':
+                battle_ids.update(event.get('battle_ids', []))
+                category_ids.update(event.get('category_ids', []))
+
+        await self._evict(keys)
+        if keys:
+            logger.info("Admin o'zgarishlari bo'yicha kesh tozalandi: %s", sorted(keys))
+            task = asyncio.create_task(self._evict_again(keys))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+        if tree_changed and self.reload_tree is not None:
+            try:
+                await self.reload_tree()
+            except Exception as e:
+                self.errors += 1
+                logger.error("Kategoriyalar daraxtini qayta yuklab bo'lmadi: %s", e)
+
+        for battle_id in battle_ids:
+            await self.reload_questions(battle_id=battle_id)
+        for category_id in category_ids:
+            await self.reload_questions(category_id=category_id)
+        if battle_ids or category_ids:
+            logger.info("Savollar qayta yuklandi: battle=%s, category=%s", sorted(battle_ids), sorted(category_ids))
+
+    async def _evict(self, keys):
+        for key in keys:
+            try:
+                await self.evict(key)
+                self.evicted += 1
+            except Exception as e:
+                self.errors += 1
+                logger.error("Kesh kalitini o'chirib bo'lmadi (%s): %s", key, e)
+
+    async def _evict_again(self, keys):
+        await asyncio.sleep(self.settle_delay)
+        await self._evict(keys)
+
+    @staticmethod
+    def _parse(raw):
+        try:
+            return json.loads(raw)
+        except (TypeError, ValueError):
+            logger.warning("Noto'g'ri invalidatsiya xabari: %r", raw)
+            return None
+
+    async def _listen_redis(self, redis):
+        pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(self.channel)
+        logger.info("Kesh invalidatsiyasi: Redis kanali '%s' tinglanmoqda", self.channel)
+        try:
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=self.poll_interval)
+                batch = []
+                while message is not None:
+                    event = self._parse(message.get('data'))
+                    if event:
+                        batch.append(event)
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=0)
+                if batch:
+                    await self.apply(batch)
+        finally:
+            try:
+                await pubsub.unsubscribe(self.channel)
+                await pubsub.close()
+            except Exception:
+                pass
+
+    def _read_spool(self, offset):
+        """Spool fayldagi `offset` dan keyingi to'liq qatorlar va yangi offset"""
+        if not os.path.exists(self.spool_path):
+            return [], 0
+        if os.path.getsize(self.spool_path) < offset:
+            # Django tomoni faylni boshidan yozgan
+            offset = 0
+        with open(self.spool_path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        lines = data[:end].decode('utf-8').splitlines()
+        return lines, offset + end
+
+    async def _listen_spool(self):
+        logger.info("Kesh invalidatsiyasi: '%s' fayli kuzatilmoqda", self.spool_path)
+        # Ishga tushishdan oldingi xabarlar kerak emas: L1 bo'sh, Redis esa yo'q
+        _, offset = await asyncio.to_thread(self._read_spool, 0)
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            lines, offset = await asyncio.to_thread(self._read_spool, offset)
+            batch = [event for event in map(self._parse, lines) if event]
+            if batch:
+                await self.apply(batch)
+
+    async def _run(self):
+        while True:
+            try:
+                redis = self._redis()
+                if redis is not None:
+                    await self._listen_redis(redis)
+                else:
+                    await self._listen_spool()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.error("Kesh invalidatsiyasi xatosi, qayta ulanamiz: %s", e)
+                await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        tasks = [task for task in (self._task, *self._pending) if task is not None]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._pending.clear()
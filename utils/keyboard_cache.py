@@ -0,0 +1,45 @@
+import json
+
+from utils.cache import LRUCache, MISSING
+
+
+class KeyboardCache:
+    """
+    Tayyor (JSON ko'rinishidagi) inline klaviaturalar keshi.
+
+    Kategoriya/bellashuv menyusi bir tilda gaplashadigan barcha foydalanuvchilar
+    uchun bir xil, shuning uchun klaviatura (menu, parent, lang, is_admin, ...)
+    kaliti bo'yicha bir marta quriladi va `reply_markup` sifatida tayyor JSON
+    satr beriladi (aiogram satrni qayta serializatsiya qilmaydi).
+
+    Har bir yozuv qaysi qatorlar ro'yxatidan qurilganini eslab qoladi: kesh
+    (`get_or_set_cache`) yangi ro'yxat qaytarsa - admin paneldagi o'zgarish yoki
+    muddat tugashi - klaviatura qayta quriladi. Alohida invalidatsiya kerak emas.
+    """
+
+    def __init__(self, max_size: int = 2048, ttl: float = 24 * 3600):
+        self._cache = LRUCache(max_size=max_size, default_ttl=ttl)
+        self.builds = 0
+
+    def get_or_build(self, key: tuple, rows, build) -> str:
+        """
+        `rows` dan qurilgan klaviaturani olish, bo'lmasa `build()` bilan qurish.
+
+        :param key: (menu, parent_id, lang_id, is_admin, ...) kortej.
+        :param rows: klaviatura qurilgan qatorlar ro'yxati (keshdagi obyekt).
+        :param build: InlineKeyboardMarkup qaytaruvchi funksiya.
+        """
+        entry = self._cache.get(key)
+        if entry is not MISSING and entry[0] is rows:
+            return entry[1]
+
+        markup = json.dumps(build().to_python())
+        self._cache.set(key, (rows, markup))
+        self.builds += 1
+        return markup
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return dict(self._cache.stats(), builds=self.builds)
@@ -0,0 +1,298 @@
+import asyncio
+import bisect
+import logging
+import time
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger('leaderboard')
+
+
+class Entry(NamedTuple):
+    """Reytingdagi bitta ishtirokchi"""
+    user_id: int
+    name: str
+    correct: int
+    answered: int
+
+
+class _MemoryBoard:
+    """
+    Redis bo'lmaganda bitta xona uchun ZSET o'rnini bosuvchi tuzilma.
+
+    `_order` - (-ball, a'zo) bo'yicha saralangan ro'yxat: o'rin va top-N
+    `bisect` bilan O(log n) da topiladi (yangilashda ro'yxat siljiydi).
+    """
+
+    __slots__ = ('scores', 'answered', 'names', 'view', 'expires_at', '_order')
+
+    def __init__(self):
+        self.scores = {}
+        self.answered = {}
+        self.names = {}
+        self.view = None
+        self.expires_at = 0.0
+        self._order = []
+
+    def set_score(self, member, score):
+        old = self.scores.get(member)
+        if old is not None:
+            del self._order[bisect.bisect_left(self._order, (-old, member))]
+        self.scores[member] = score
+        bisect.insort(self._order, (-score, member))
+
+    def rank(self, member):
+        score = self.scores.get(member)
+        if score is None:
+            return None
+        return bisect.bisect_left(self._order, (-score, member))
+
+    def top(self, limit):
+        return [member for _, member in self._order[:limit]]
+
+
+class Leaderboard:
+    """
+    Room quiz uchun jonli reyting.
+
+    Har bir xona (unique_id) - Redis sorted set (a'zo - user_id, ball - to'g'ri
+    javoblar soni manfiy ishora bilan: ZRANGE o'sish tartibida, teng ballda
+    a'zo bo'yicha - xotiradagi variant bilan bir xil), javoblar soni va
+    ismlar alohida hash'larda. Har bir javob
+    bitta MULTI/EXEC bilan yoziladi, top-N va foydalanuvchi o'rni O(log n) da
+    olinadi. Redis bo'lmasa - jarayon ichidagi `_MemoryBoard`.
+
+    Xona egasining reyting xabari (`attach`) javoblar kelganda joyida
+    yangilanadi, lekin xona uchun `refresh_interval` soniyada bir martadan
+    ko'p emas (Redis bo'lsa, barcha worker'lar uchun umumiy cheklov).
+    Xabarni tahrirlash `register_renderer` orqali beriladi:
+
+        leaderboard.register_renderer(refresh_live_rating)  # async (room, chat_id, message_id)
+    """
+
+    def __init__(self, get_redis=None, key_prefix: str = 'leaderboard:', ttl: int = 3600,
+                 refresh_interval: float = 3.0):
+        self._get_redis = get_redis
+        self.key_prefix = key_prefix
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+
+        self._boards = {}
+        self._renderer = None
+        self._refreshing = {}
+
+        self.recorded = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    def _redis(self):
+        return self._get_redis() if self._get_redis else None
+
+    def _keys(self, room):
+        base = f"{self.key_prefix}{room}"
+        return base, f"{base}:answered", f"{base}:names", f"{base}:view"
+
+    def _board(self, room, create: bool = False) -> Optional[_MemoryBoard]:
+        now = time.monotonic()
+        board = self._boards.get(room)
+        if board is not None and board.expires_at < now:
+            del self._boards[room]
+            board = None
+        if board is None and create:
+            if len(self._boards) > 1000:
+                for key, other in list(self._boards.items()):
+                    if other.expires_at < now:
+                        del self._boards[key]
+            board = self._boards[room] = _MemoryBoard()
+        if board is not None:
+            board.expires_at = now + self.ttl
+        return board
+
+    def register_renderer(self, renderer):
+        """Egasining reyting xabarini yangilovchi `async renderer(room, chat_id, message_id)`"""
+        self._renderer = renderer
+
+    # Yozish
+
+    async def start(self, room, participants):
+        """Xonani boshidan boshlash: barcha ishtirokchilar 0 ball bilan"""
+        redis = self._redis()
+        if redis is not None:
+            zkey, akey, nkey, vkey = self._keys(room)
+            pipe = redis.pipeline(transaction=True)
+            pipe.delete(zkey, akey, nkey, vkey)
+            if participants:
+                pipe.zadd(zkey, {str(p['user_id']): 0 for p in participants})
+                pipe.hset(akey, mapping={str(p['user_id']): 0 for p in participants})
+                pipe.hset(nkey, mapping={str(p['user_id']): p.get('name', '') for p in participants})
+                for key in (zkey, akey, nkey):
+                    pipe.expire(key, self.ttl)
+            try:
+                await pipe.execute()
+            except Exception as e:
+                self.errors += 1
+                logger.error("Reytingni boshlab bo'lmadi (%s): %s", room, e)
+            return
+
+        self._boards.pop(room, None)
+        board = self._board(room, create=True)
+        for participant in participants:
+            member = str(participant['user_id'])
+            board.set_score(member, 0)
+            board.answered[member] = 0
+            board.names[member] = participant.get('name', '')
+
+    async def record(self, room, user_id, name, correct: bool):
+        """Ishtirokchining bitta javobini qayd qilish va egasining xabarini yangilashni rejalashtirish"""
+        member = str(user_id)
+        redis = self._redis()
+        if redis is not None:
+            zkey, akey, nkey, _ = self._keys(room)
+            pipe = redis.pipeline(transaction=True)
+            pipe.zincrby(zkey, -1 if correct else 0, member)
+            pipe.hincrby(akey, member, 1)
+            pipe.hset(nkey, member, name)
+            for key in (zkey, akey, nkey):
+                pipe.expire(key, self.ttl)
+            try:
+                await pipe.execute()
+            except Exception as e:
+                # Reyting xatosi quiz'ni to'xtatmasligi kerak
+                self.errors += 1
+                logger.error("Javobni reytingga yozib bo'lmadi (%s): %s", room, e)
+                return
+        else:
+            board = self._board(room, create=True)
+            board.set_score(member, board.scores.get(member, 0) + (1 if correct else 0))
+            board.answered[member] = board.answered.get(member, 0) + 1
+            board.names[member] = name
+
+        self.recorded += 1
+        self._schedule_refresh(room)
+
+    async def attach(self, room, chat_id, message_id):
+        """Jonli yangilanadigan reyting xabarini xonaga bog'lash"""
+        redis = self._redis()
+        if redis is not None:
+            await redis.set(self._keys(room)[3], f"{chat_id}:{message_id}", ex=self.ttl)
+        else:
+            self._board(room, create=True).view = (chat_id, message_id)
+
+    # O'qish
+
+    async def top(self, room, limit: int = 10) -> list:
+        """Eng yaxshi `limit` ta ishtirokchi"""
+        redis = self._redis()
+        if redis is not None:
+            zkey, akey, nkey, _ = self._keys(room)
+            rows = await redis.zrange(zkey, 0, limit - 1, withscores=True)
+            if not rows:
+                return []
+            members = [member for member, _ in rows]
+            pipe = redis.pipeline(transaction=False)
+            pipe.hmget(akey, members)
+            pipe.hmget(nkey, members)
+            answered, names = await pipe.execute()
+            return [
+                Entry(int(member), names[i] or '', -int(score), int(answered[i] or 0))
+                for i, (member, score) in enumerate(rows)
+            ]
+
+        board = self._board(room)
+        if board is None:
+            return []
+        return [self._memory_entry(board, member) for member in board.top(limit)]
+
+    async def rank(self, room, user_id):
+        """(o'rin, Entry) - o'rin 1 dan boshlanadi; xonada bo'lmasa None"""
+        member = str(user_id)
+        redis = self._redis()
+        if redis is not None:
+            zkey, akey, nkey, _ = self._keys(room)
+            pipe = redis.pipeline(transaction=False)
+            pipe.zrank(zkey, member)
+            pipe.zscore(zkey, member)
+            pipe.hget(akey, member)
+            pipe.hget(nkey, member)
+            position, score, answered, name = await pipe.execute()
+            if position is None:
+                return None
+            return position + 1, Entry(int(user_id), name or '', -int(score), int(answered or 0))
+
+        board = self._board(room)
+        position = board.rank(member) if board is not None else None
+        if position is None:
+            return None
+        return position + 1, self._memory_entry(board, member)
+
+    @staticmethod
+    def _memory_entry(board, member):
+        return Entry(int(member), board.names.get(member, ''), board.scores[member], board.answered.get(member, 0))
+
+    # Egasining xabarini yangilash
+
+    async def _view(self, room):
+        redis = self._redis()
+        if redis is not None:
+            value = await redis.get(self._keys(room)[3])
+            if not value:
+                return None
+            chat_id, message_id = value.split(':')
+            return int(chat_id), int(message_id)
+        board = self._board(room)
+        return board.view if board is not None else None
+
+    async def _acquire_refresh(self, room) -> bool:
+        redis = self._redis()
+        if redis is None:
+            return True
+        key = f"{self.key_prefix}{room}:refresh"
+        return bool(await redis.set(key, 1, nx=True, px=int(self.refresh_interval * 1000)))
+
+    def _schedule_refresh(self, room):
+        if self._renderer is None or room in self._refreshing:
+            return
+        task = asyncio.create_task(self._refresh_later(room))
+        self._refreshing[room] = task
+
+    async def _refresh_later(self, room, attempts: int = 3):
+        # Kutish davomida kelgan javoblar bitta tahrirga jamlanadi
+        try:
+            for _ in range(attempts):
+                await asyncio.sleep(self.refresh_interval)
+                view = await self._view(room)
+                if view is None:
+                    return
+                # Boshqa worker shu oraliqda yangilagan bo'lsa, keyingi oraliqni kutamiz
+                if await self._acquire_refresh(room):
+                    # Tahrir paytida kelgan javoblar yangi yangilashni rejalashtiradi
+                    self._refreshing.pop(room, None)
+                    await self._renderer(room, *view)
+                    self.refreshes += 1
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.errors += 1
+            logger.error("Reyting xabarini yangilab bo'lmadi (%s): %s", room, e)
+        finally:
+            if self._refreshing.get(room) is asyncio.current_task():
+                del self._refreshing[room]
+
+    async def stop(self):
+        tasks = list(self._refreshing.values())
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._refreshing.clear()
+
+    def stats(self) -> dict:
+        return {
+            'recorded': self.recorded,
+            'refreshes': self.refreshes,
+            'errors': self.errors,
+            'rooms': len(self._boards),
+        }
@@ -0,0 +1,296 @@
+import bisect
+import logging
+import threading
+import time
+
+from aiohttp import web
+
+logger = logging.getLogger('metrics')
+
+# Soniyalar uchun standart oraliqlar (SQLite so'rovi ~0.1 ms dan Telegram so'rovi ~ soniyalargacha)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra='') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Faqat o'sadigan hisoblagich: `counter.inc('label', ...)`.
+
+    Event loop'dan yoziladigan metrikalarga lock kerak emas; thread pool'dan
+    yoziladiganlari (`threaded=True`) yo'qolgan qo'shishlarsiz lock bilan yoziladi.
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=(), threaded=False):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock() if threaded else None
+
+    def inc(self, *labels, amount=1):
+        if self._lock is None:
+            self._values[labels] = self._values.get(labels, 0) + amount
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def totals(self) -> dict:
+        """{labels: qiymat} - benchmark va testlar uchun"""
+        return dict(self._values)
+
+    def render(self):
+        for labels, value in list(self._values.items()):
+            yield f"{self.name}_total{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram:
+    """
+    Qiymatlar taqsimoti (kechikishlar): `histogram.observe(soniya, 'label', ...)`.
+
+    Har bir yozuv - oraliqni bisect bilan topish va uchta qo'shish (lock haqida
+    Counter'ga qarang); kumulyativ qiymatlar faqat scrape paytida hisoblanadi.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, threaded=False):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [oraliqlar bo'yicha sonlar (+Inf bilan), yig'indi, soni]
+        self._values = {}
+        self._lock = threading.Lock() if threaded else None
+
+    def _add(self, value, labels):
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def observe(self, value, *labels):
+        if self._lock is None:
+            self._add(value, labels)
+            return
+        with self._lock:
+            self._add(value, labels)
+
+    def time(self, *labels):
+        """`with histogram.time('label'):` - blok bajarilish vaqtini yozish"""
+        return _Timer(self, labels)
+
+    def count(self, *labels):
+        state = self._values.get(labels)
+        return state[2] if state else 0
+
+    def totals(self) -> dict:
+        """{labels: (soni, yig'indi)} - benchmark va testlar uchun"""
+        return {labels: (state[2], state[1]) for labels, state in list(self._values.items())}
+
+    def render(self):
+        for labels, (counts, total, count) in list(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                extra = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, extra)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {count}"
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class Gauge:
+    """
+    Joriy holat (navbat uzunligi, faol sessiyalar). Qiymat faqat scrape paytida
+    `collect()` orqali olinadi, shuning uchun hech kim so'ramasa hech narsa hisoblanmaydi.
+
+    `collect()` son yoki {(label, ...): son} lug'atini qaytaradi.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, collect, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self):
+        values = self.collect()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metrika ikki marta ro'yxatdan o'tkazildi: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text format (0.0.4)"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            try:
+                samples = list(metric.render())
+            except Exception as e:
+                logger.error("%s metrikasini yig'ib bo'lmadi: %s", metric.name, e)
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=(), threaded=False) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames, threaded))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, threaded=False) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets, threaded))
+
+
+def gauge(name, documentation, collect, labelnames=()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, collect, labelnames))
+
+
+# Bot metrikalari. Yozish arzon (lug'atda qo'shish), matn faqat /metrics so'ralganda tuziladi.
+
+HANDLER_SECONDS = histogram(
+    'bot_handler_seconds', "Update handler'ining bajarilish vaqti", ['handler'],
+)
+HANDLER_ERRORS = counter(
+    'bot_handler_errors', "Xato bilan tugagan handler chaqiruvlari", ['handler'],
+)
+DB_QUERY_SECONDS = histogram(
+    'bot_db_query_seconds', "SQL so'rov vaqti: DataBase.execute (ulanish kutish bilan) va write-behind to'plamlari",
+    ['statement'],
+    threaded=True,
+)
+DB_QUERY_ERRORS = counter(
+    'bot_db_query_errors', "Xato bergan SQL so'rovlar", ['statement'], threaded=True,
+)
+CACHE_REQUESTS = counter(
+    'bot_cache_requests', "get_cache natijalari qatlam bo'yicha (l1/l2, hit/miss)", ['layer', 'result'],
+)
+CACHE_SECONDS = histogram(
+    'bot_cache_seconds', "Redis (L2) kesh amallari vaqti", ['layer', 'operation'],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5),
+)
+OUTBOUND_SECONDS = histogram(
+    'bot_outbound_seconds', "Xabar navbatga qo'yilgandan Telegram javobigacha bo'lgan vaqt", ['method'],
+)
+OUTBOUND_FAILURES = counter(
+    'bot_outbound_failures', "Yuborib bo'lmagan xabarlar", ['reason'],
+)
+OUTBOUND_RETRY_AFTER = counter(
+    'bot_outbound_retry_after', "Telegram'dan kelgan RetryAfter (flood control) javoblari",
+)
+
+WRITE_BEHIND_FULL_WAIT_SECONDS = histogram(
+    'bot_write_behind_full_wait_seconds', "Write-behind navbati to'lganda yozuvchining kutgan vaqti (back-pressure)",
+)
+WRITE_BEHIND_RETRIES = counter(
+    'bot_write_behind_retries', "Baza band bo'lgani uchun navbatga qaytarilgan write-behind to'plamlari",
+)
+WRITE_BEHIND_DROPPED = counter(
+    'bot_write_behind_dropped', "Xato sababli tashlab yuborilgan write-behind yozuvlari", threaded=True,
+)
+WRITE_BEHIND_SPOOLED = counter(
+    'bot_write_behind_spooled', "To'xtatishda spool faylga saqlangan write-behind yozuvlari",
+)
+
+
+def statement_label(sql: str, max_length: int = 120) -> str:
+    """SQL matnidan metrika yorlig'i: bo'shliqlar siqiladi, uzun so'rov qisqartiriladi"""
+    label = _statement_labels.get(sql)
+    if label is None:
+        label = ' '.join(sql.split())
+        if len(label) > max_length:
+            label = label[:max_length - 3] + '...'
+        if len(_statement_labels) < 1000:
+            _statement_labels[sql] = label
+    return label
+
+
+_statement_labels = {}
+
+
+# HTTP endpoint
+
+async def _handle_metrics(request):
+    return web.Response(text=REGISTRY.render(), content_type='text/plain', charset='utf-8',
+                        headers={'X-Content-Type-Options': 'nosniff'})
+
+
+class MetricsServer:
+    """`GET /metrics` ni beruvchi alohida (lokal) aiohttp server"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 9101):
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/metrics', _handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, self.host, self.port).start()
+        except OSError as e:
+            logger.error("Metrikalar serverini %s:%s da ochib bo'lmadi: %s", self.host, self.port, e)
+            await self.stop()
+            return
+        logger.info("Metrikalar: http://%s:%s/metrics", self.host, self.port)
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -1,6 +1,192 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
 
-logging.basicConfig(format=u'%(filename)s [LINE:%(lineno)d] #%(levelname)-8s [%(asctime)s]  %(message)s',
-                    level=logging.INFO,
-                    # level=logging.DEBUG,  # Можно заменить на другой уровень логгирования.
-                    )
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+
+# Navbatga formatlanmasdan qo'yiladigan argumentlar (boshqa thread'da o'qish xavfsiz)
+_IMMUTABLE_ARGS = (str, int, float, bool, bytes, type(None))
+# LogRecord'ning standart atributlari: qolganlari `extra=` orqali berilgan maydonlar
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'suppressed'}
+
+_listener = None
+
+
+class TextFormatter(logging.Formatter):
+    """Oddiy matn; rate limit tashlab yuborgan yozuvlar soni oxiriga qo'shiladi"""
+
+    def format(self, record):
+        text = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            text += f" (+{suppressed} ta o'xshash yozuv o'tkazib yuborildi)"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Har bir yozuv - bitta qatorli JSON obyekt (log yig'uvchilar uchun).
+
+    `logger.info("...", extra={'user_id': 1})` dagi maydonlar ham qo'shiladi.
+    """
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                data[key] = value
+        if getattr(record, 'suppressed', 0):
+            data['suppressed'] = record.suppressed
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            data['stack_info'] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Bir xil joydan kelgan debug yozuvlarini cheklash: `interval` soniyada
+    har bir (logger, shablon) uchun ko'pi bilan `limit` ta. Ortiqchalari
+    sanaladi va keyingi o'tkazilgan yozuvda `suppressed` sifatida ko'rsatiladi.
+
+    Shablon %-formatdagi `record.msg`, shuning uchun argumentlari har xil
+    bo'lgan bir xil chaqiruvlar bitta kalitga tushadi.
+    """
+
+    def __init__(self, limit: int = 20, interval: float = 60.0, level: int = logging.DEBUG):
+        super().__init__()
+        self.limit = limit
+        self.interval = interval
+        self.level = level
+        # (logger, shablon) -> [oyna boshlangan vaqt, o'tkazilganlar, tashlab yuborilganlar]
+        self._windows = {}
+
+    def filter(self, record) -> bool:
+        if record.levelno > self.level:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            suppressed = window[2] if window else 0
+            self._windows[key] = [now, 1, 0]
+            if suppressed:
+                record.suppressed = suppressed
+            return True
+        if window[1] < self.limit:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Yozuvni navbatga qo'yadi, formatlash va stderr ga yozish listener thread'ida.
+
+    Standart QueueHandler.prepare() xabarni chaqirgan joyda formatlaydi; bu yerda
+    faqat o'zgaruvchan argumentli (dict, list) yozuvlar darhol formatlanadi -
+    ular keyin o'zgarishi yoki boshqa thread'da o'qilayotganda o'zgarishi mumkin.
+    """
+
+    def prepare(self, record):
+        args = record.args
+        if args:
+            values = args.values() if isinstance(args, dict) else args
+            if not all(isinstance(value, _IMMUTABLE_ARGS) for value in values):
+                record.msg = record.getMessage()
+                record.args = None
+        return record
+
+
+def parse_levels(value: str) -> dict:
+    """"aiogram=WARNING,room_handler=DEBUG" -> {'aiogram': 'WARNING', 'room_handler': 'DEBUG'}"""
+    levels = {}
+    for item in value.split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(level='INFO', module_levels=None, json_format=False, debug_limit=20, debug_interval=60.0,
+                  stream=None):
+    """
+    Root logger'ni navbat orqali yozadigan qilib sozlash.
+
+    Handler'lar faqat yozuvni navbatga qo'yadi; formatlash va yozish
+    QueueListener'ning fon thread'ida, shuning uchun event loop stderr ni
+    kutmaydi. Qayta chaqirilsa oldingi listener to'xtatiladi.
+
+    :param level: root logger darajasi.
+    :param module_levels: {logger nomi: daraja} - alohida modullar uchun.
+    :param json_format: har bir yozuvni JSON qatori sifatida yozish.
+    :param debug_limit: bir joydan `debug_interval` soniyada ko'pi bilan shuncha debug yozuv (0 - cheklovsiz).
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if json_format else TextFormatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    if debug_limit:
+        handler.addFilter(RateLimitFilter(debug_limit, debug_interval))
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+    for name, module_level in (module_levels or {}).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Navbatda qolgan yozuvlarni yozib, listener'ni to'xtatish"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _restart_in_child():
+    """
+    Fork'dan keyin bola jarayonda listener'ni qayta ishga tushirish.
+
+    Listener thread'i fork qilingan jarayonga o'tmaydi: yangisisiz worker'ning
+    yozuvlari navbatda to'planib qoladi va hech qayerga yozilmaydi. Ota
+    jarayon navbatidagi yozuvlarni ota jarayonning o'zi yozadi, shuning uchun
+    bola jarayon yangi bo'sh navbat oladi.
+    """
+    global _listener
+    if _listener is None:
+        return
+    log_queue = queue.SimpleQueue()
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, _QueueHandler):
+            handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, *_listener.handlers,
+                                               respect_handler_level=_listener.respect_handler_level)
+    _listener.start()
+
+
+atexit.register(stop_logging)
+os.register_at_fork(after_in_child=_restart_in_child)
@@ -1,14 +1,23 @@
-def rate_limit(limit: int, key=None):
+def rate_limit(limit: float = None, key=None, burst: float = None, rate: float = None):
     """
     Decorator for configuring rate limit and key in different functions.
 
-    :param limit:
-    :param key:
+    Limits are applied per user with a token bucket (see utils/rate_limiter.py).
+
+    :param limit: minimal interval between calls in seconds (sustained rate = 1 / limit)
+    :param key: throttling key shared by several handlers (default: handler name)
+    :param burst: how many calls may be made in a row before the limit applies
+    :param rate: sustained rate in calls per second (overrides ``limit``)
     :return:
     """
 
     def decorator(func):
-        setattr(func, 'throttling_rate_limit', limit)
+        if limit is not None:
+            setattr(func, 'throttling_rate_limit', limit)
+        if rate is not None:
+            setattr(func, 'throttling_rate', rate)
+        if burst is not None:
+            setattr(func, 'throttling_burst', burst)
         if key:
             setattr(func, 'throttling_key', key)
         return func
@@ -6,9 +6,12 @@ from data.config import ADMINS
 
 
 async def on_startup_notify(dp: Dispatcher):
+    # loader utils paketini import qiladi, shuning uchun bu yerda import qilinadi
+    from loader import outbound
+
     for admin in ADMINS:
         try:
-            await dp.bot.send_message(admin, "Bot ishga tushdi")
+            await outbound.send_message(admin, "Bot ishga tushdi")
 
         except Exception as err:
             logging.exception(err)
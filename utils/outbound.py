@@ -0,0 +1,281 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+from aiogram.utils.exceptions import BotBlocked, ChatNotFound, RetryAfter, UserDeactivated
+
+from utils.fanout import TokenBucket
+from utils.metrics import OUTBOUND_FAILURES, OUTBOUND_RETRY_AFTER, OUTBOUND_SECONDS
+
+logger = logging.getLogger('outbound')
+
+# Navbat ustuvorliklari: kichik qiymat oldin yuboriladi
+PRIORITY_QUIZ = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_BROADCAST = 2
+
+_PRIORITY_NAMES = {PRIORITY_QUIZ: 'quiz', PRIORITY_DEFAULT: 'default', PRIORITY_BROADCAST: 'broadcast'}
+
+
+class _ChatQueue:
+    """Bitta chat uchun navbat: o'z bucket'i va ustuvorlik bo'yicha heap"""
+    __slots__ = ('bucket', 'jobs', 'scheduled', 'busy', 'timer', 'last_used')
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        # (priority, seq, job) - heapq
+        self.jobs = []
+        # Chat `_ready` navbatida yoki bucket to'lishini kutyapti
+        self.scheduled = False
+        # Chatning xabari hozir yuborilmoqda (bitta chatga xabarlar ketma-ket)
+        self.busy = False
+        self.timer = None
+        self.last_used = time.monotonic()
+
+
+class OutboundDispatcher:
+    """
+    Botdan chiqadigan barcha xabarlar uchun markaziy navbat.
+
+    - umumiy token bucket (Telegram ~30 xabar/s limiti);
+    - har bir chat uchun alohida navbat va bucket (shaxsiy chat ~1 xabar/s, guruh ~20 xabar/min);
+    - ustuvorlik bo'yicha navbat: quiz savollari broadcast'dan oldin ketadi;
+    - RetryAfter kelsa, barcha worker'lar bitta umumiy pauzani kutadi;
+    - yetkazish statistikasi `stats()` orqali.
+
+    Worker'lar faqat yuborishga tayyor chatlarni oladi: bucket'i bo'sh chat
+    token paydo bo'lguncha taymerda kutadi, worker esa boshqa chatlarga
+    yuboradi. Shuning uchun bitta chatdagi katta navbat (masalan, room
+    egasiga natijalar) boshqa chatlarni sekinlashtirmaydi. Bitta chatga
+    xabarlar navbatdagi tartibda, ketma-ket yuboriladi.
+
+    Ishlatish:
+
+        await outbound.send_message(chat_id, text, priority=PRIORITY_QUIZ)
+        await outbound.call(chat_id, bot.copy_message, chat_id, from_chat_id, message_id)
+
+    Dispatcher ishga tushirilmagan bo'lsa (`start()` chaqirilmagan), so'rov
+    to'g'ridan-to'g'ri bajariladi.
+    """
+
+    def __init__(self, bot, global_rate: float = 30.0, chat_rate: float = 1.0, chat_burst: float = 3,
+                 group_rate: float = 20 / 60, group_burst: float = 3, workers: int = 30, max_retries: int = 3):
+        self.bot = bot
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.workers = workers
+        self.max_retries = max_retries
+
+        self._global = None
+        # Yuborishga tayyor chatlar: (birinchi xabar ustuvorligi, seq, chat_id)
+        self._ready = None
+        self._workers = []
+        self._seq = itertools.count()
+        # chat_id -> _ChatQueue
+        self._chats = {}
+        # Navbatdagi va yuborilayotgan xabarlar (stop() hammasi tugashini kutadi)
+        self._unfinished = 0
+        self._drained = None
+
+        self._sent = 0
+        self._failed = 0
+        self._blocked = 0
+        self._retries = 0
+        self._retry_after = 0
+        self._retry_after_seconds = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._queued = {priority: 0 for priority in _PRIORITY_NAMES}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def _chat(self, chat_id) -> _ChatQueue:
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            if len(self._chats) > 10000:
+                self._prune_chats(time.monotonic())
+            # Manfiy chat_id - guruh yoki kanal
+            if isinstance(chat_id, int) and chat_id < 0:
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            chat = self._chats[chat_id] = _ChatQueue(bucket)
+        return chat
+
+    def _prune_chats(self, now, idle: float = 60.0):
+        """Uzoq vaqt ishlatilmagan, bo'sh chat navbatlarini o'chirish"""
+        for chat_id, chat in list(self._chats.items()):
+            if not chat.jobs and not chat.busy and not chat.scheduled and now - chat.last_used > idle:
+                del self._chats[chat_id]
+
+    def _schedule(self, chat_id, chat):
+        """Xabari bor, band bo'lmagan chatni tayyorlar navbatiga qo'yish"""
+        if chat.scheduled or chat.busy or not chat.jobs:
+            return
+        chat.scheduled = True
+        self._ready.put_nowait((chat.jobs[0][0], next(self._seq), chat_id))
+
+    def _wake(self, chat_id):
+        """Chat bucket'ida token paydo bo'ldi"""
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            return
+        chat.timer = None
+        chat.scheduled = False
+        self._schedule(chat_id, chat)
+
+    def _finish(self):
+        self._unfinished -= 1
+        if not self._unfinished:
+            self._drained.set()
+
+    async def call(self, chat_id, method, /, *args, priority: int = PRIORITY_DEFAULT, **kwargs):
+        """`method(*args, **kwargs)` ni navbat orqali bajarib, natijasini qaytarish"""
+        if not self.running:
+            return await method(*args, **kwargs)
+
+        future = asyncio.get_running_loop().create_future()
+        chat = self._chat(chat_id)
+        # job: [method, args, kwargs, future, navbatga qo'yilgan vaqt, urinishlar]
+        heapq.heappush(chat.jobs, (priority, next(self._seq), [method, args, kwargs, future, time.monotonic(), 0]))
+        self._queued[priority] = self._queued.get(priority, 0) + 1
+        self._unfinished += 1
+        self._drained.clear()
+        self._schedule(chat_id, chat)
+        return await future
+
+    async def send_message(self, chat_id, text, priority: int = PRIORITY_DEFAULT, **kwargs):
+        return await self.call(chat_id, self.bot.send_message, chat_id, text, priority=priority, **kwargs)
+
+    async def copy_message(self, chat_id, from_chat_id, message_id, priority: int = PRIORITY_DEFAULT, **kwargs):
+        return await self.call(chat_id, self.bot.copy_message, chat_id, from_chat_id, message_id,
+                               priority=priority, **kwargs)
+
+    async def _deliver(self, chat_id, chat, priority, seq, job):
+        method, args, kwargs, future, enqueued, attempt = job
+        try:
+            if future.cancelled():
+                self._finish()
+                return
+            await self._global.acquire()
+            result = await method(*args, **kwargs)
+        except RetryAfter as e:
+            # Bitta pauza barcha jo'natuvchilar uchun; har biri alohida uxlamaydi
+            self._retry_after += 1
+            self._retry_after_seconds += e.timeout
+            OUTBOUND_RETRY_AFTER.inc()
+            self._global.pause(e.timeout)
+            if attempt < self.max_retries:
+                # Xabar chat navbatining boshiga qaytadi (seq o'zgarmaydi), chat token'i qayta olinadi
+                self._retries += 1
+                logger.warning("Flood control: %s soniya pauza (chat %s)", e.timeout, chat_id)
+                job[5] = attempt + 1
+                heapq.heappush(chat.jobs, (priority, seq, job))
+                self._queued[priority] += 1
+                return
+            self._fail(future, e)
+        except asyncio.CancelledError:
+            if not future.done():
+                future.cancel()
+            self._finish()
+            raise
+        except Exception as e:
+            self._fail(future, e)
+        else:
+            latency = time.monotonic() - enqueued
+            self._sent += 1
+            self._latency_total += latency
+            self._latency_max = max(self._latency_max, latency)
+            OUTBOUND_SECONDS.observe(latency, getattr(method, '__name__', 'call'))
+            if not future.done():
+                future.set_result(result)
+        self._finish()
+
+    def _fail(self, future, e):
+        self._failed += 1
+        if isinstance(e, (BotBlocked, ChatNotFound, UserDeactivated)):
+            self._blocked += 1
+        OUTBOUND_FAILURES.inc(type(e).__name__)
+        if not future.done():
+            future.set_exception(e)
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, chat_id = await self._ready.get()
+            chat = self._chats.get(chat_id)
+            if chat is None or not chat.jobs:
+                if chat is not None:
+                    chat.scheduled = False
+                continue
+
+            wait = chat.bucket.try_acquire()
+            if wait:
+                # Chat limiti: worker uxlamaydi, chat token paydo bo'lganda qaytadi
+                chat.timer = loop.call_later(wait, self._wake, chat_id)
+                continue
+
+            chat.scheduled = False
+            chat.busy = True
+            priority, seq, job = heapq.heappop(chat.jobs)
+            self._queued[priority] -= 1
+            try:
+                await self._deliver(chat_id, chat, priority, seq, job)
+            finally:
+                chat.busy = False
+                chat.last_used = time.monotonic()
+                self._schedule(chat_id, chat)
+
+    def stats(self) -> dict:
+        """Yetkazish statistikasi"""
+        return {
+            'sent': self._sent,
+            'failed': self._failed,
+            'blocked': self._blocked,
+            'retries': self._retries,
+            'retry_after': self._retry_after,
+            'retry_after_seconds': self._retry_after_seconds,
+            'latency_avg': self._latency_total / self._sent if self._sent else 0.0,
+            'latency_max': self._latency_max,
+            'queued': {_PRIORITY_NAMES.get(p, str(p)): n for p, n in self._queued.items()},
+            'chats': len(self._chats),
+        }
+
+    def start(self):
+        if self.running:
+            return
+        self._global = TokenBucket(self.global_rate)
+        self._ready = asyncio.PriorityQueue()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info("Outbound dispatcher ishga tushdi (%s worker)", self.workers)
+
+    async def stop(self, timeout: float = 10.0):
+        """Navbatdagi xabarlarni `timeout` soniyagacha yuborib, worker'larni to'xtatish"""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._drained.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Outbound navbatida %s ta xabar yuborilmay qoldi", sum(self._queued.values()))
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        # Yuborilmay qolgan xabarlarni kutayotganlarni bo'shatish
+        for chat in self._chats.values():
+            if chat.timer is not None:
+                chat.timer.cancel()
+            for priority, _, job in chat.jobs:
+                self._queued[priority] -= 1
+                job[3].cancel()
+        self._chats.clear()
+        self._unfinished = 0
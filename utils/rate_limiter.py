@@ -0,0 +1,145 @@
+import logging
+import time
+from typing import NamedTuple
+
+logger = logging.getLogger('rate_limiter')
+
+# Token bucket bitta atomar skriptda: to'ldirish, token olish, rad etishlar
+# sonini hisoblash va kalit muddatini yangilash. Hash maydonlari:
+# t - qolgan tokenlar, ts - oxirgi yangilanish vaqti, x - ketma-ket rad etishlar.
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 't', 'ts', 'x')
+local tokens = tonumber(state[1])
+local updated = tonumber(state[2])
+local exceeded = tonumber(state[3]) or 0
+if tokens == nil then
+    tokens = burst
+    updated = now
+end
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+    exceeded = 0
+else
+    exceeded = exceeded + 1
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'ts', tostring(now), 'x', exceeded)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, exceeded, tostring(retry_after)}
+"""
+
+
+class Decision(NamedTuple):
+    """Token bucket javobi"""
+    allowed: bool
+    # Ketma-ket rad etilgan so'rovlar soni (ruxsat berilganda 0)
+    exceeded: int = 0
+    # Keyingi token qachon paydo bo'lishi (soniya)
+    retry_after: float = 0.0
+
+
+class TokenBucketLimiter:
+    """
+    Kiruvchi update'lar uchun token bucket (foydalanuvchi + handler kaliti bo'yicha).
+
+    Har bir kalit sekundiga `rate` ta so'rovga, `burst` tagacha portlashga ruxsat
+    beradi. Redis bo'lsa, holat Redis hash'ida saqlanadi va har bir update uchun
+    bitta EVALSHA chaqiriladi (barcha worker'lar uchun umumiy limit). Redis
+    bo'lmasa yoki xato bersa - jarayon ichidagi bucket'lar ishlatiladi.
+
+        decision = await throttler.hit(f"{handler_key}:{user_id}", rate=2, burst=5)
+        if not decision.allowed: ...
+    """
+
+    def __init__(self, rate: float = 10.0, burst: float = 1, key_prefix: str = 'throttle:',
+                 max_local_keys: int = 10000, get_redis=None):
+        self.rate = rate
+        self.burst = burst
+        self.key_prefix = key_prefix
+        self.max_local_keys = max_local_keys
+        self._get_redis = get_redis
+
+        self._script = None
+        self._script_owner = None
+        # key -> [tokens, updated, exceeded]
+        self._local = {}
+
+        self.allowed = 0
+        self.throttled = 0
+        self.redis_errors = 0
+
+    def _redis(self):
+        return self._get_redis() if self._get_redis else None
+
+    def _redis_script(self, redis):
+        # Redis ulanishi ishga tushishda yaratiladi, skript unga bog'lanadi
+        if self._script_owner is not redis:
+            self._script = redis.register_script(TOKEN_BUCKET_LUA)
+            self._script_owner = redis
+        return self._script
+
+    async def hit(self, key: str, rate: float = None, burst: float = None) -> Decision:
+        """Kalit bucket'idan bitta token olish"""
+        rate = rate or self.rate
+        burst = max(burst or self.burst, 1)
+
+        decision = None
+        redis = self._redis()
+        if redis is not None:
+            try:
+                allowed, exceeded, retry_after = await self._redis_script(redis)(
+                    keys=[self.key_prefix + key], args=[rate, burst, time.time()],
+                )
+                decision = Decision(bool(int(allowed)), int(exceeded), float(retry_after))
+            except Exception as e:
+                self.redis_errors += 1
+                if self.redis_errors == 1 or self.redis_errors % 1000 == 0:
+                    logger.error("Redis throttling xatosi, jarayon ichidagi limit ishlatiladi: %s", e)
+
+        if decision is None:
+            decision = self._hit_local(key, rate, burst)
+
+        if decision.allowed:
+            self.allowed += 1
+        else:
+            self.throttled += 1
+        return decision
+
+    def _hit_local(self, key, rate, burst) -> Decision:
+        now = time.monotonic()
+        state = self._local.get(key)
+        if state is None:
+            if len(self._local) >= self.max_local_keys:
+                self._prune_local(now)
+            state = self._local[key] = [burst, now, 0]
+
+        tokens = min(burst, state[0] + (now - state[1]) * rate)
+        state[1] = now
+        if tokens >= 1:
+            state[0] = tokens - 1
+            state[2] = 0
+            return Decision(True)
+        state[0] = tokens
+        state[2] += 1
+        return Decision(False, state[2], (1 - tokens) / rate)
+
+    def _prune_local(self, now, idle: float = 60.0):
+        """Uzoq vaqt ishlatilmagan bucket'larni o'chirish"""
+        for key, (_, updated, _) in list(self._local.items()):
+            if now - updated > idle:
+                del self._local[key]
+
+    def stats(self) -> dict:
+        return {
+            'allowed': self.allowed,
+            'throttled': self.throttled,
+            'redis_errors': self.redis_errors,
+            'local_keys': len(self._local),
+        }
@@ -0,0 +1,203 @@
+import asyncio
+import json
+import logging
+import time
+
+
+class TimerWheel:
+    """
+    Barcha quiz timeout'lari uchun yagona rejalashtiruvchi (hashed timer wheel).
+
+    Har bir savol uchun alohida `asyncio.sleep` task yaratish o'rniga timeout
+    kalit (masalan, `room:{chat_id}`) bo'yicha g'ildirak katagiga yoziladi:
+
+        timer_wheel.register('room_answer', on_room_answer_timeout)
+        timer_wheel.schedule(f"room:{chat_id}", 20, 'room_answer', {'chat_id': chat_id})
+        timer_wheel.cancel(f"room:{chat_id}")
+
+    schedule/cancel O(1), bitta fon task har `tick` soniyada vaqti kelgan
+    katakni tekshirib, muddati o'tgan timeout'larni birgalikda ishga tushiradi.
+    Bir kalitga qayta schedule qilish oldingi timeout'ni almashtiradi.
+
+    Redis yoqilgan bo'lsa, rejalashtirilgan timeout'lar `redis_key` hash'ida
+    saqlanadi va bot qayta ishga tushganda `restore()` orqali tiklanadi.
+    """
+
+    def __init__(self, tick: float = 0.5, slots: int = 512, redis_key: str = 'quiz:timers', get_redis=None):
+        self.tick = tick
+        self.slots = slots
+        self.redis_key = redis_key
+        self._get_redis = get_redis
+
+        self._wheel = [dict() for _ in range(slots)]
+        # key -> katak raqami, O(1) cancel uchun
+        self._where = {}
+        self._callbacks = {}
+        self._last_tick = int(time.time() // tick)
+
+        # Redis ga har tick'da bitta pipeline bilan yoziladi
+        self._dirty = {}
+        self._wakeup = None
+        self._task = None
+        # Ishlayotgan _fire_batch task'lari (event loop task'larni faqat kuchsiz havola bilan saqlaydi)
+        self._firing = set()
+        self._fired = 0
+
+    def register(self, kind: str, callback):
+        """Timeout turi uchun `async callback(key, payload)` ro'yxatdan o'tkazish"""
+        self._callbacks[kind] = callback
+
+    def _redis(self):
+        return self._get_redis() if self._get_redis else None
+
+    def _put(self, key, deadline, kind, payload):
+        self._remove(key)
+        tick_no = max(int(deadline // self.tick), self._last_tick + 1)
+        slot = tick_no % self.slots
+        self._wheel[slot][key] = (tick_no, deadline, kind, payload)
+        self._where[key] = slot
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _remove(self, key):
+        slot = self._where.pop(key, None)
+        if slot is not None:
+            self._wheel[slot].pop(key, None)
+            return True
+        return False
+
+    def schedule(self, key: str, delay: float, kind: str, payload: dict = None):
+        """`delay` soniyadan keyin `kind` callback'ini chaqirish"""
+        deadline = time.time() + delay
+        payload = payload or {}
+        self._put(key, deadline, kind, payload)
+        self._dirty[key] = (deadline, kind, payload)
+
+    def cancel(self, key: str) -> bool:
+        """Kalit bo'yicha timeout'ni bekor qilish"""
+        removed = self._remove(key)
+        if removed:
+            self._dirty[key] = None
+        return removed
+
+    def pending(self) -> int:
+        return len(self._where)
+
+    def pending_by_kind(self) -> dict:
+        """Kutilayotgan timeout'lar soni turi bo'yicha (metrikalar uchun, faqat scrape paytida)"""
+        counts = {}
+        for entries in self._wheel:
+            for _, _, kind, _ in entries.values():
+                counts[kind] = counts.get(kind, 0) + 1
+        return counts
+
+    def stats(self) -> dict:
+        return {'pending': len(self._where), 'fired': self._fired, 'slots': self.slots, 'tick': self.tick}
+
+    def _collect_due(self, now):
+        """Tugallangan tick'lardagi muddati o'tgan yozuvlarni g'ildirakdan olish"""
+        due = []
+        # Joriy tick hali tugamagan, shuning uchun faqat undan oldingilarini ko'rib chiqamiz
+        current = int(now // self.tick) - 1
+        if current - self._last_tick > self.slots:
+            # Uzoq bo'sh turgandan keyin har bir katakni bir martadan ko'rish yetarli
+            self._last_tick = current - self.slots
+        while self._last_tick < current:
+            self._last_tick += 1
+            slot = self._wheel[self._last_tick % self.slots]
+            if not slot:
+                continue
+            for key, (tick_no, deadline, kind, payload) in list(slot.items()):
+                if tick_no <= self._last_tick:
+                    del slot[key]
+                    del self._where[key]
+                    self._dirty[key] = None
+                    due.append((key, kind, payload))
+        return due
+
+    async def _fire(self, key, kind, payload):
+        callback = self._callbacks.get(kind)
+        if callback is None:
+            logging.error("Timeout turi ro'yxatdan o'tmagan: %s (%s)", kind, key)
+            return
+        try:
+            await callback(key, payload)
+        except Exception as e:
+            logging.error("Timeout callback xatosi (%s, %s): %s", kind, key, e, exc_info=True)
+
+    async def _persist(self):
+        redis = self._redis()
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        if redis is None:
+            return
+        try:
+            pipe = redis.pipeline(transaction=False)
+            for key, entry in dirty.items():
+                if entry is None:
+                    pipe.hdel(self.redis_key, key)
+                else:
+                    deadline, kind, payload = entry
+                    pipe.hset(self.redis_key, key, json.dumps({'deadline': deadline, 'kind': kind, 'payload': payload}))
+            await pipe.execute()
+        except Exception as e:
+            logging.error("Timeout'larni Redis ga yozishda xato: %s", e)
+
+    async def _run(self):
+        while True:
+            if not self._where and not self._dirty:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            now = time.time()
+            next_tick = (int(now // self.tick) + 1) * self.tick
+            await asyncio.sleep(max(0.0, next_tick - now))
+
+            due = self._collect_due(time.time())
+            if due:
+                self._fired += len(due)
+                # Callback'lar (xabar yuborish) keyingi tick'larni kechiktirmasligi uchun alohida task'da
+                task = asyncio.create_task(self._fire_batch(due))
+                self._firing.add(task)
+                task.add_done_callback(self._firing.discard)
+            await self._persist()
+
+    async def _fire_batch(self, due):
+        await asyncio.gather(*(self._fire(key, kind, payload) for key, kind, payload in due))
+
+    async def restore(self):
+        """Redis da saqlangan timeout'larni g'ildirakka qaytarish"""
+        redis = self._redis()
+        if redis is None:
+            return 0
+        try:
+            stored = await redis.hgetall(self.redis_key)
+        except Exception as e:
+            logging.error("Timeout'larni Redis dan o'qishda xato: %s", e)
+            return 0
+
+        for key, raw in stored.items():
+            try:
+                entry = json.loads(raw)
+                self._put(key, entry['deadline'], entry['kind'], entry['payload'])
+            except (ValueError, KeyError) as e:
+                logging.warning("Noto'g'ri timeout yozuvi %s: %s", key, e)
+        logging.info("Redis dan %s ta timeout tiklandi", len(stored))
+        return len(stored)
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Fon task'ni to'xtatish; kutilayotgan timeout'lar Redis da qoladi"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._persist()
@@ -0,0 +1,153 @@
+import asyncio
+import hmac
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+
+from aiohttp import web
+from aiogram.dispatcher.webhook import WebhookRequestHandler
+from aiogram.utils.executor import Executor
+
+from data import config
+from utils.misc.logging import stop_logging
+
+logger = logging.getLogger('webhook')
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+# Joriy jarayonning worker raqami (polling rejimida va bitta worker bo'lsa 0)
+WORKER_ID = 0
+WORKERS = 1
+
+# Darhol javob berilgan update'larni qayta ishlayotgan task'lar (GC ularni yo'qotib yubormasligi uchun)
+_pending_updates = set()
+
+
+def is_primary_worker() -> bool:
+    """Bir martalik ishlar (set_webhook, broadcast, admin xabari) faqat 0-worker'da bajariladi"""
+    return WORKER_ID == 0
+
+
+class SecretWebhookRequestHandler(WebhookRequestHandler):
+    """
+    Telegram webhook so'rovlarini qabul qiluvchi handler.
+
+    - `X-Telegram-Bot-Api-Secret-Token` sarlavhasi tekshiriladi, mos kelmasa 401;
+    - WEBHOOK_ACK_EARLY yoqilgan bo'lsa, update fon task'ga berilib, Telegram'ga
+      darhol 200 qaytariladi: keyingi update handler tugashini kutmaydi.
+    """
+
+    async def post(self):
+        secret = self.request.headers.get(SECRET_HEADER, '')
+        if not hmac.compare_digest(secret, config.WEBHOOK_SECRET):
+            logger.warning("Webhook so'rovi noto'g'ri secret token bilan: %s", self.request.remote)
+            return web.Response(status=401)
+
+        if not config.WEBHOOK_ACK_EARLY:
+            return await super().post()
+
+        dispatcher = self.get_dispatcher()
+        update = await self.parse_update(dispatcher.bot)
+        task = asyncio.create_task(self._process_in_background(dispatcher, update))
+        _pending_updates.add(task)
+        task.add_done_callback(_pending_updates.discard)
+        return web.Response(text='ok')
+
+    @staticmethod
+    async def _process_in_background(dispatcher, update):
+        try:
+            await dispatcher.updates_handler.notify(update)
+        except Exception as e:
+            logger.error("Update %s ni qayta ishlashda xato: %s", update.update_id, e, exc_info=True)
+
+
+async def set_bot_webhook(dispatcher):
+    """Telegram'da webhook URL va secret token'ni o'rnatish"""
+    url = f"{config.WEBHOOK_HOST.rstrip('/')}{config.WEBHOOK_PATH}"
+    await dispatcher.bot.set_webhook(
+        url,
+        secret_token=config.WEBHOOK_SECRET,
+        max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+    )
+    logger.info("Webhook o'rnatildi: %s", url)
+
+
+def _bind_socket():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((config.WEBAPP_HOST, config.WEBAPP_PORT))
+    sock.listen(1024)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _serve(dispatcher, on_startup, on_shutdown, sock, worker_id, workers):
+    global WORKER_ID, WORKERS
+    WORKER_ID, WORKERS = worker_id, workers
+
+    # Har bir worker o'z event loop'ida ishlaydi
+    asyncio.set_event_loop(asyncio.new_event_loop())
+
+    # Telegram limitlari barcha worker'lar uchun umumiy, shuning uchun ulush bo'linadi;
+    # timeout'lar har bir worker'ning o'z Redis hash'ida saqlanadi
+    from loader import outbound, timer_wheel
+    outbound.global_rate = config.OUTBOUND_GLOBAL_RATE / workers
+    timer_wheel.redis_key = f"{timer_wheel.redis_key}:{worker_id}"
+
+    executor = Executor(dispatcher, skip_updates=False)
+    executor.on_startup(on_startup, polling=False)
+    executor.on_shutdown(on_shutdown, polling=False)
+    executor.set_webhook(webhook_path=config.WEBHOOK_PATH, request_handler=SecretWebhookRequestHandler)
+    logger.info("Webhook worker %s (pid %s) ishga tushdi", worker_id, os.getpid())
+    try:
+        executor.run_app(sock=sock, print=None, handle_signals=True)
+    finally:
+        if workers > 1:
+            # Fork qilingan worker atexit'siz (os._exit) tugaydi: navbatda qolgan yozuvlar shu yerda yoziladi
+            stop_logging()
+
+
+def start_webhook(dispatcher, on_startup, on_shutdown):
+    """
+    Botni webhook rejimida ishga tushirish.
+
+    WEBHOOK_WORKERS > 1 bo'lsa, bitta socket ochilib, undan ulanishlarni
+    qabul qiladigan bir nechta jarayon (fork) ishga tushiriladi. FSM holati
+    jarayonlar orasida umumiy bo'lishi kerak, shuning uchun bu rejim faqat
+    Redis storage bilan ishlaydi.
+    """
+    workers = config.WEBHOOK_WORKERS
+    if workers > 1 and not config.USE_REDIS:
+        logger.error("WEBHOOK_WORKERS > 1 uchun USE_REDIS=true kerak (FSM holati umumiy bo'lishi shart). "
+                     "Bitta worker ishga tushiriladi.")
+        workers = 1
+
+    sock = _bind_socket()
+    logger.info("Webhook server %s:%s%s, %s worker",
+                config.WEBAPP_HOST, config.WEBAPP_PORT, config.WEBHOOK_PATH, workers)
+
+    if workers == 1:
+        _serve(dispatcher, on_startup, on_shutdown, sock, 0, 1)
+        return
+
+    context = multiprocessing.get_context('fork')
+    processes = [
+        context.Process(target=_serve, args=(dispatcher, on_startup, on_shutdown, sock, worker_id, workers),
+                        name=f"webhook-worker-{worker_id}")
+        for worker_id in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    sock.close()
+
+    def _terminate(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, _terminate)
+    signal.signal(signal.SIGINT, _terminate)
+    for process in processes:
+        process.join()